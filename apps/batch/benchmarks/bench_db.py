@@ -0,0 +1,53 @@
+"""
+벤치마크용 일회성 DB 스키마
+BENCH_DATABASE_URL(로컬 Postgres)에 임시 스키마를 만들고 api의 init.sql을 적용한 뒤,
+끝나면 스키마째 삭제한다. 운영 DB URL을 넣지 않도록 주의.
+"""
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+import psycopg2
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), "..", "..", "api", "prisma", "init.sql")
+
+
+def bench_database_url() -> str:
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        raise SystemExit("BENCH_DATABASE_URL 환경변수를 설정하세요. (일회성 로컬 Postgres)")
+    return url
+
+
+@contextmanager
+def throwaway_schema(prefix: str = "bench") -> Iterator[str]:
+    """init.sql이 적용된 임시 스키마를 만들고, 해당 스키마를 쓰는 연결 DSN을 반환한다."""
+    url = bench_database_url()
+    schema = f"{prefix}_{os.getpid()}"
+
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+        cur.execute(f'CREATE SCHEMA "{schema}"')
+        cur.execute(f'SET search_path TO "{schema}", public')
+        with open(INIT_SQL, encoding="utf-8") as f:
+            cur.execute(f.read())
+
+    try:
+        yield schema
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+        admin.close()
+
+
+def connect(schema: str):
+    """임시 스키마를 search_path로 쓰는 연결을 연다."""
+    return psycopg2.connect(bench_database_url(), options=f"-c search_path={schema},public")
+
+
+def truncate(conn, *tables: str):
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE " + ", ".join(f'"{t}"' for t in tables) + " CASCADE")
+    conn.commit()
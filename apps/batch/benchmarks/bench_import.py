@@ -0,0 +1,297 @@
+"""
+임포트 전 구간 벤치마크: 파싱 → 검증 → upsert
+synthetic_export로 만든 입원현황/외래예약 파일(헤더 오프셋, 날짜 형식 혼합, 오류 행 포함)을
+워커와 같은 청크 크기로 파싱·검증하고 일회성 스키마에 upsert하여 단계별 소요 시간과 처리량을 잰다.
+- upsert: 빈 DB에 처음 반영, reupsert: 같은 파일을 한 번 더 반영 (매일 센서스처럼 대부분 그대로인 경우)
+- parse/validate 단계는 파싱한 행 전체를 들고 있는 동안의 최대 메모리 할당(tracemalloc, peakMb)도 잰다
+- 결과는 커밋 해시와 함께 JSON으로 저장하고, --compare로 이전 결과와 비교한다
+  (기준보다 --threshold 이상 느려진 단계가 있으면 종료 코드 1)
+
+실행 (apps/batch에서, 일회성 로컬 Postgres 필요):
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_import --sizes 1000,10000,100000
+    python -m benchmarks.bench_import --sizes 10000 --compare benchmarks/results/<이전 커밋>.json
+    python -m benchmarks.bench_import --no-db   # 파싱·검증만
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable
+
+from psycopg2.extras import execute_values
+
+from benchmarks.bench_db import connect, throwaway_schema, truncate
+from benchmarks.synthetic_export import write_inpatient_xlsx, write_outpatient_xlsx
+from config import BATCH_CHUNK_SIZE, PATIENT_UPSERT_MODE
+from importers.inpatient_importer import upsert_patients, upsert_patients_bulk
+from importers.outpatient_importer import upsert_appointments
+from metrics import peak_rss_mb
+from parsers.inpatient_parser import iter_inpatient_rows
+from parsers.outpatient_parser import iter_outpatient_rows
+from validators.data_validator import validate_outpatient_rows, validate_rows
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+FEEDS: dict[str, dict[str, Any]] = {
+    "inpatient": {
+        "write": write_inpatient_xlsx,
+        "parse": iter_inpatient_rows,
+        "validate": validate_rows,
+        "upsert": upsert_patients_bulk if PATIENT_UPSERT_MODE == "bulk" else upsert_patients,
+        "tables": ("PatientIdentityConflict", "Patient"),
+    },
+    "outpatient": {
+        "write": write_outpatient_xlsx,
+        "parse": iter_outpatient_rows,
+        "validate": validate_outpatient_rows,
+        "upsert": upsert_appointments,
+        "tables": ("Appointment", "Doctor", "Patient"),
+    },
+}
+
+CLINIC_ROOMS = [f"{i}진료실" for i in range(1, 9)]
+
+
+def git_commit() -> dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(("git", *args), capture_output=True, text=True, check=False).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def chunks(rows: list, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def timed(fn: Callable[[], Any]) -> tuple[float, Any]:
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def validate_all(validate: Callable, rows: list, chunk_size: int) -> tuple[list, int]:
+    """워커처럼 청크마다 검증하고 파일 전체 중복 검사용 seen_ids를 공유한다."""
+    seen: set[str] = set()
+    valid: list = []
+    errors = 0
+    for chunk in chunks(rows, chunk_size):
+        chunk_valid, chunk_errors = validate(chunk, seen)
+        valid.extend(chunk_valid)
+        errors += len(chunk_errors)
+    return valid, errors
+
+
+def peak_alloc_mb(spec: dict[str, Any], path: str, chunk_size: int) -> dict[str, float]:
+    """
+    파싱한 행을 모두 들고 있을 때(parse)와 그 상태로 검증할 때(validate)의 최대 할당량.
+    행 레코드 크기가 그대로 드러나도록 시간 측정과 따로 잰다 (tracemalloc이 파싱을 느리게 하므로).
+    """
+    tracemalloc.start()
+    try:
+        rows = list(spec["parse"](path))
+        _, parse_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        validate_all(spec["validate"], rows, chunk_size)
+        _, validate_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"parse": round(parse_peak / 1024 / 1024, 1), "validate": round(validate_peak / 1024 / 1024, 1)}
+
+
+def upsert_all(conn, upsert: Callable, rows: list, import_id: str, chunk_size: int):
+    """워커처럼 청크마다 upsert 후 커밋한다."""
+    for chunk in chunks(rows, chunk_size):
+        upsert(conn, chunk, import_id)
+        conn.commit()
+
+
+def seed_reference(conn):
+    """upsert에 필요한 Import 행과 외래 진료실"""
+    truncate(conn, "Import", "ClinicRoom")
+    with conn.cursor() as cur:
+        cur.execute(
+            """INSERT INTO "Import" ("id", "filePath", "fileHash", "fileType", "status", "createdAt")
+               VALUES ('bench-inpatient', 'inpatient.xlsx', 'bench-inpatient', 'INPATIENT', 'PROCESSING', NOW()),
+                      ('bench-outpatient', 'outpatient.xlsx', 'bench-outpatient', 'OUTPATIENT', 'PROCESSING', NOW())"""
+        )
+        execute_values(
+            cur,
+            'INSERT INTO "ClinicRoom" ("id", "name", "updatedAt") VALUES %s',
+            [(name,) for name in CLINIC_ROOMS],
+            template="(gen_random_uuid(), %s, NOW())",
+        )
+    conn.commit()
+
+
+def bench_feed(
+    feed: str, path: str, n: int, repeat: int, chunk_size: int, conn=None,
+) -> list[dict[str, Any]]:
+    spec = FEEDS[feed]
+    timings: dict[str, list[float]] = {"parse": [], "validate": [], "upsert": [], "reupsert": []}
+    counts: dict[str, int] = {}
+
+    for _ in range(repeat):
+        sec, rows = timed(lambda: list(spec["parse"](path)))
+        timings["parse"].append(sec)
+        sec, (valid, errors) = timed(lambda: validate_all(spec["validate"], rows, chunk_size))
+        timings["validate"].append(sec)
+        counts = {"parsed": len(rows), "valid": len(valid), "errors": errors}
+
+        if conn is not None:
+            truncate(conn, *spec["tables"])
+            for stage in ("upsert", "reupsert"):
+                sec, _ = timed(lambda: upsert_all(conn, spec["upsert"], valid, f"bench-{feed}", chunk_size))
+                timings[stage].append(sec)
+
+    peak_mb = peak_alloc_mb(spec, path, chunk_size)
+
+    results = []
+    for stage, samples in timings.items():
+        if not samples:
+            continue
+        # 반복 측정 중 최솟값이 잡음(GC, 다른 프로세스)의 영향을 가장 덜 받는다.
+        best = min(samples)
+        stage_rows = counts["parsed"] if stage in ("parse", "validate") else counts["valid"]
+        results.append({
+            "feed": feed,
+            "rows": n,
+            "stage": stage,
+            "seconds": round(best, 4),
+            "medianSeconds": round(statistics.median(samples), 4),
+            "rowsPerSec": round(stage_rows / best, 1) if best > 0 else None,
+            "peakMb": peak_mb.get(stage),
+            **counts,
+        })
+    return results
+
+
+def run(
+    sizes: list[int], feeds: list[str], repeat: int, chunk_size: int, use_db: bool,
+    data_dir: str, header_offset: int, bad_ratio: float,
+) -> list[dict[str, Any]]:
+    files: dict[tuple[str, int], str] = {}
+    for feed in feeds:
+        for n in sizes:
+            path = os.path.join(data_dir, f"{feed}_{n}_h{header_offset}_b{bad_ratio}.xlsx")
+            if not os.path.exists(path):
+                FEEDS[feed]["write"](path, n, header_offset=header_offset, mixed_dates=True, bad_row_ratio=bad_ratio)
+            files[(feed, n)] = path
+
+    results: list[dict[str, Any]] = []
+    if not use_db:
+        for (feed, n), path in files.items():
+            results.extend(bench_feed(feed, path, n, repeat, chunk_size))
+        return results
+
+    with throwaway_schema() as schema:
+        conn = connect(schema)
+        try:
+            seed_reference(conn)
+            for (feed, n), path in files.items():
+                results.extend(bench_feed(feed, path, n, repeat, chunk_size, conn))
+        finally:
+            conn.close()
+    return results
+
+
+def compare(baseline: dict[str, Any], results: list[dict[str, Any]], threshold: float) -> bool:
+    """
+    기준 결과와 단계별 시간·최대 메모리를 비교해 출력한다. 기준보다 threshold 이상 느려진 단계가 있으면 True.
+    (메모리는 참고용으로만 출력하며 종료 코드에 반영하지 않는다. peakMb가 없는 이전 결과는 "-")
+    """
+    base = {(r["feed"], r["rows"], r["stage"]): r for r in baseline["results"]}
+    regressed = False
+    print(f"\n기준: {baseline['meta'].get('commit') or '?'} ({baseline['meta'].get('timestamp')})")
+    print(f"{'feed':<11} {'rows':>8} {'stage':<9} {'base(s)':>9} {'now(s)':>9} {'change':>8} "
+          f"{'base MB':>8} {'now MB':>8}")
+    for r in results:
+        b = base.get((r["feed"], r["rows"], r["stage"]))
+        if b is None:
+            continue
+        before = b["seconds"]
+        change = (r["seconds"] - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  느려짐!"
+            regressed = True
+        base_mb = "-" if b.get("peakMb") is None else f"{b['peakMb']:.1f}"
+        now_mb = "-" if r.get("peakMb") is None else f"{r['peakMb']:.1f}"
+        print(f"{r['feed']:<11} {r['rows']:>8} {r['stage']:<9} {before:>9.3f} {r['seconds']:>9.3f} {change:>+7.1%} "
+              f"{base_mb:>8} {now_mb:>8}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--feeds", default="inpatient,outpatient")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--header-offset", type=int, default=3)
+    parser.add_argument("--bad-ratio", type=float, default=0.01)
+    parser.add_argument("--no-db", action="store_true", help="upsert 단계를 건너뛴다 (DB 불필요)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "batch-bench"),
+                        help="생성한 합성 파일을 재사용할 디렉토리")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: benchmarks/results/<커밋>.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=0.10, help="느려짐으로 볼 비율 (기본 0.10)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.makedirs(args.data_dir, exist_ok=True)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    feeds = [f for f in args.feeds.split(",") if f]
+    for feed in feeds:
+        if feed not in FEEDS:
+            parser.error(f"알 수 없는 피드: {feed}")
+
+    results = run(sizes, feeds, args.repeat, args.chunk_size, not args.no_db,
+                  args.data_dir, args.header_offset, args.bad_ratio)
+
+    git = git_commit()
+    report = {
+        "meta": {
+            **git,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "chunkSize": args.chunk_size,
+            "repeat": args.repeat,
+            "headerOffset": args.header_offset,
+            "badRatio": args.bad_ratio,
+            "patientUpsertMode": PATIENT_UPSERT_MODE,
+            "peakRssMb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+    print(f"{'feed':<11} {'rows':>8} {'stage':<9} {'best(s)':>9} {'median(s)':>10} {'rows/s':>10} {'peak MB':>8}")
+    for r in results:
+        peak = "-" if r["peakMb"] is None else f"{r['peakMb']:.1f}"
+        print(f"{r['feed']:<11} {r['rows']:>8} {r['stage']:<9} {r['seconds']:>9.3f} "
+              f"{r['medianSeconds']:>10.3f} {r['rowsPerSec'] or 0:>10.0f} {peak:>8}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{(git['commit'] or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n결과 저장: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+입원현황 파서 확장성 벤치마크
+행 수를 늘려가며 parse_inpatient_file 소요 시간과 행당 처리 시간을 측정한다.
+행당 시간이 거의 일정하면 선형 확장이다.
+
+실행 (apps/batch에서):
+    python -m benchmarks.bench_inpatient_parser --sizes 1000,10000,50000,200000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_export import write_inpatient_xlsx
+from parsers.inpatient_parser import parse_inpatient_file
+
+
+def run(sizes: list[int]) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = write_inpatient_xlsx(os.path.join(tmp, f"inpatient_{n}.xlsx"), n)
+            started = time.perf_counter()
+            rows = parse_inpatient_file(path)
+            elapsed = time.perf_counter() - started
+            assert len(rows) == n, f"행 수 불일치: {len(rows)} != {n}"
+            results.append({"rows": n, "seconds": elapsed, "usPerRow": elapsed / n * 1e6})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000,200000")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = run(sizes)
+
+    base = results[0]["usPerRow"]
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>10} {'vs first':>10}")
+    for r in results:
+        print(f"{r['rows']:>10} {r['seconds']:>10.2f} {r['usPerRow']:>10.1f} {r['usPerRow'] / base:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
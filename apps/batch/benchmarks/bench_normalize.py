@@ -0,0 +1,181 @@
+"""
+날짜·시간·예약상태 정규화 마이크로벤치마크: 기존 strptime 방식 vs parsers.normalize
+기존 구현(입원 parse_cell_date, 외래 _normalize_date/_normalize_time/_normalize_status)을 그대로 옮겨 두고,
+실제 내보내기와 비슷한 셀 값 분포(같은 생년월일·예약일이 반복, 문자열 형식 혼재)에서 셀당 처리 시간을 비교한다.
+두 구현의 결과가 모든 입력에서 같은지도 함께 확인한다 (Excel 일련번호는 기존 구현이 None이므로 비교에서 제외).
+
+실행 (apps/batch에서):
+    python -m benchmarks.bench_normalize --cells 200000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from datetime import time as dtime
+
+from parsers import normalize
+
+
+# ── 기존 구현 (비교 기준) ──────────────────────────
+
+def legacy_parse_cell_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_normalize_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    s = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_normalize_time(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%H:%M")
+    s = str(value).strip()
+    for fmt in ("%H:%M:%S", "%H:%M", "%H%M"):
+        try:
+            return datetime.strptime(s, fmt).strftime("%H:%M")
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_normalize_status(value):
+    if not value:
+        return "BOOKED"
+    s = str(value).strip().upper()
+    status_map = {
+        "예약": "BOOKED", "BOOKED": "BOOKED", "접수": "CHECKED_IN", "CHECKED_IN": "CHECKED_IN",
+        "완료": "COMPLETED", "COMPLETED": "COMPLETED", "취소": "CANCELLED", "CANCELLED": "CANCELLED",
+        "미방문": "NO_SHOW", "NO_SHOW": "NO_SHOW", "변경": "CHANGED", "CHANGED": "CHANGED",
+    }
+    return status_map.get(s, "BOOKED")
+
+
+# ── 입력 분포 ──────────────────────────
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+_TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%H%M")
+
+# 형식 경계값: 두 구현이 같은 결과를 내야 하는 입력
+EDGE_DATES = [
+    "", " ", "2024-01-02", " 2024-01-02 ", "2024-1-2", "2024/1/02", "2024.01.2", "20240102", "2024112",
+    "2024-02-29", "2023-02-29", "2024-13-01", "2024-00-10", "2024-01-32", "2024-01-00", "2024-01/02",
+    "24-01-02", "02024-01-02", "2024-01-02 09:00", "2024-01- 5", "2024--01-02", "abcd", "1999-13-40",
+    "2026-02-30", "２０２４-01-02", 20240102, 2024112, 19991340, 0, -1, True,
+]
+EDGE_TIMES = [
+    "", "9:30", "09:30", "09:30:00", "9:5", "0930", "930", "2359", "2400", "24:00", "23:60", "23:59:60",
+    "23:59:61", "23:59:62", "25:99", "09:30:00.5", "09.30", " 09:30 ", "９:30", "093000", 930, 1430, 2460,
+    dtime(9, 30), dtime(23, 59, 59), True,
+]
+EDGE_STATUSES = [None, "", "예약", " 접수 ", "completed", "Cancelled", "미방문", "변경", "보류", 0, 1]
+
+
+def make_cells(n: int, seed: int = 42) -> dict[str, list]:
+    """
+    외래예약/입원현황 합성 내보내기와 같은 분포의 셀 값.
+    생년월일은 환자 수(n/2) 규모에서, 예약일은 14일 안에서 반복된다.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dobs = [datetime(rng.randint(1935, 2005), rng.randint(1, 12), rng.randint(1, 28)) for _ in range(max(n // 2, 1))]
+
+    def date_cell(value: datetime):
+        fmt = rng.choice((None,) + _DATE_FORMATS)
+        return value if fmt is None else value.strftime(fmt)
+
+    def time_cell(value: dtime):
+        fmt = rng.choice((None,) + _TIME_FORMATS)
+        return value if fmt is None else value.strftime(fmt)
+
+    return {
+        "dob": [date_cell(rng.choice(dobs)) for _ in range(n)],
+        "date": [date_cell(today + timedelta(days=rng.randrange(14))) for _ in range(n)],
+        "time": [time_cell(dtime(rng.randint(9, 16), rng.choice((0, 10, 20, 30, 40, 50)))) for _ in range(n)],
+        "status": [rng.choice(("예약", "예약", "예약", "접수", "완료", "변경", "취소", "미방문")) for _ in range(n)],
+    }
+
+
+CASES = {
+    # 이름: (입력 열, 기존 함수, 새 함수)
+    "dob(parse_date)": ("dob", legacy_parse_cell_date, normalize.parse_date),
+    "date(format_date)": ("date", legacy_normalize_date, normalize.format_date),
+    "time(format_time)": ("time", legacy_normalize_time, normalize.format_time),
+    "status": ("status", legacy_normalize_status, normalize.normalize_status),
+}
+
+
+def check_equivalence(cells: dict[str, list]) -> list[str]:
+    mismatches = []
+    for name, (column, legacy, current) in CASES.items():
+        edges = {"dob": EDGE_DATES, "date": EDGE_DATES, "time": EDGE_TIMES, "status": EDGE_STATUSES}[column]
+        for value in list(edges) + cells[column][:5000]:
+            old, new = legacy(value), current(value)
+            if old != new:
+                mismatches.append(f"{name}: {value!r} → 기존 {old!r}, 새 {new!r}")
+    return mismatches
+
+
+def time_per_cell(func, values: list, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        normalize.clear_caches()
+        started = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(values) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cells = make_cells(args.cells)
+    mismatches = check_equivalence(cells)
+    for line in mismatches:
+        print("불일치!", line)
+
+    print(f"{'case':<18} {'기존 ns/cell':>13} {'새 ns/cell':>11} {'배율':>6}")
+    for name, (column, legacy, current) in CASES.items():
+        old = time_per_cell(legacy, cells[column], args.repeat)
+        new = time_per_cell(current, cells[column], args.repeat)
+        print(f"{name:<18} {old:>13.0f} {new:>11.0f} {old / new:>5.1f}x")
+
+    # 캐시 적중률: 측정 때마다 비우므로 모든 열을 한 번씩 다시 통과시켜 본다
+    normalize.clear_caches()
+    for column, _, current in CASES.values():
+        for value in cells[column]:
+            current(value)
+    print("캐시 적중:", {k: f"{v['hits']}/{v['hits'] + v['misses']}" for k, v in normalize.cache_info().items()})
+    print("Excel 일련번호:", normalize.parse_date(45293), normalize.format_time(0.395833333))
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
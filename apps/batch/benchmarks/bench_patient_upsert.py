@@ -0,0 +1,113 @@
+"""
+Patient upsert 벤치마크: 행 단위(upsert_patients) vs 집합 연산(upsert_patients_bulk)
+같은 시나리오(기존 환자 50%, 그중 일부 인적사항 변경/연락처 변경)를 두 방식으로 실행하여
+소요 시간과 통계 일치 여부를 비교한다.
+
+실행 (apps/batch에서, 일회성 로컬 Postgres 필요):
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_patient_upsert --sizes 1000,10000,100000
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+from benchmarks.bench_db import connect, throwaway_schema, truncate
+from importers.inpatient_importer import upsert_patients, upsert_patients_bulk
+from parsers.records import InpatientRow
+
+MODES = {"row": upsert_patients, "bulk": upsert_patients_bulk}
+
+
+def make_rows(n: int, seed: int = 7) -> tuple[list[InpatientRow], list[InpatientRow]]:
+    """(기존 DB에 넣을 행, 이번 파일의 행)을 만든다. 파서와 같은 InpatientRow 레코드다."""
+    rng = random.Random(seed)
+    existing: list[InpatientRow] = []
+    incoming: list[InpatientRow] = []
+    for i in range(n):
+        row = InpatientRow(
+            row_number=i + 2,
+            emrPatientId=f"P{i:07d}",
+            name=f"환자{i}",
+            dob=datetime(1950 + i % 50, 1 + i % 12, 1 + i % 28),
+            sex="M" if i % 2 else "F",
+            phone=f"010{rng.randint(10000000, 99999999)}",
+        )
+        incoming.append(row)
+        if i % 2 == 0:
+            before = row
+            roll = rng.random()
+            if roll < 0.1:
+                before = row._replace(name=f"개명전{i}")
+            elif roll < 0.4:
+                before = row._replace(phone="01000000000")
+            existing.append(before)
+    return existing, incoming
+
+
+def seed_existing(conn, existing: list[InpatientRow]):
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """INSERT INTO "Patient" ("id", "emrPatientId", "name", "dob", "sex", "phone", "status", "createdAt", "updatedAt")
+               VALUES %s""",
+            [(r.emrPatientId, r.name, r.dob, r.sex, r.phone) for r in existing],
+            template="(gen_random_uuid(), %s, %s, %s, %s, %s, 'ACTIVE', NOW(), NOW())",
+            page_size=5000,
+        )
+        cur.execute(
+            """INSERT INTO "Import" ("id", "filePath", "fileHash", "fileType", "status", "createdAt")
+               VALUES ('bench-import', 'bench.xlsx', 'bench', 'INPATIENT', 'PROCESSING', NOW())"""
+        )
+    conn.commit()
+
+
+def run(sizes: list[int]) -> list[dict]:
+    results = []
+    with throwaway_schema() as schema:
+        conn = connect(schema)
+        try:
+            for n in sizes:
+                existing, incoming = make_rows(n)
+                by_mode = {}
+                for mode, upsert in MODES.items():
+                    truncate(conn, "PatientIdentityConflict", "Import", "Patient")
+                    seed_existing(conn, existing)
+                    started = time.perf_counter()
+                    stats = upsert(conn, incoming, "bench-import")
+                    conn.commit()
+                    by_mode[mode] = (time.perf_counter() - started, stats)
+
+                row_sec, row_stats = by_mode["row"]
+                bulk_sec, bulk_stats = by_mode["bulk"]
+                results.append({
+                    "rows": n,
+                    "rowSeconds": row_sec,
+                    "bulkSeconds": bulk_sec,
+                    "speedup": row_sec / bulk_sec if bulk_sec else None,
+                    "statsMatch": row_stats == bulk_stats,
+                    "stats": bulk_stats,
+                })
+        finally:
+            conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    args = parser.parse_args()
+
+    # 충돌 행마다 남는 경고 로그는 측정에 방해가 되므로 끈다.
+    logging.disable(logging.WARNING)
+    results = run([int(s) for s in args.sizes.split(",")])
+    print(f"{'rows':>8} {'row(s)':>9} {'bulk(s)':>9} {'speedup':>8}  stats")
+    for r in results:
+        match = "일치" if r["statsMatch"] else "불일치!"
+        print(f"{r['rows']:>8} {r['rowSeconds']:>9.2f} {r['bulkSeconds']:>9.2f} {r['speedup']:>7.1f}x  {match} {r['stats']}")
+
+
+if __name__ == "__main__":
+    main()
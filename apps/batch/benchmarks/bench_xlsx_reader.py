@@ -0,0 +1,105 @@
+"""
+XLSX 읽기 백엔드 비교 벤치마크: openpyxl vs iterparse
+같은 합성 파일(Excel처럼 공유 문자열 테이블 사용)을 두 백엔드로 파싱하여
+파싱 소요 시간, 파서 없이 시트만 읽는 시간, 파싱 중 최대 메모리 할당(tracemalloc), 결과 일치 여부를 비교한다.
+
+실행 (apps/batch에서):
+    python -m benchmarks.bench_xlsx_reader --sizes 1000,10000,100000
+    python -m benchmarks.bench_xlsx_reader --sizes 500000 --feeds inpatient --repeat 1
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+import parsers.xlsx_reader as xlsx_reader
+from benchmarks.synthetic_export import to_shared_strings, write_inpatient_xlsx, write_outpatient_xlsx
+from parsers.inpatient_parser import iter_inpatient_rows
+from parsers.outpatient_parser import iter_outpatient_rows
+
+FEEDS = {
+    "inpatient": (write_inpatient_xlsx, iter_inpatient_rows),
+    "outpatient": (write_outpatient_xlsx, iter_outpatient_rows),
+}
+
+
+def parse_with(backend: str, iter_rows, path: str) -> list:
+    with mock.patch.object(xlsx_reader, "XLSX_READER", backend):
+        return list(iter_rows(path))
+
+
+def read_seconds(backend: str, path: str) -> float:
+    """파서 없이 시트의 모든 행·열 값을 읽는 시간 (리더 자체 비용)"""
+    started = time.perf_counter()
+    with xlsx_reader.open_sheet(path, backend) as sheet:
+        for _ in sheet:
+            pass
+    return time.perf_counter() - started
+
+
+def peak_alloc_mb(backend: str, iter_rows, path: str) -> float:
+    """행을 모으지 않고 스트리밍으로 소비하는 동안의 최대 할당량 (워커의 청크 처리와 같은 조건)"""
+    with mock.patch.object(xlsx_reader, "XLSX_READER", backend):
+        tracemalloc.start()
+        try:
+            for _ in iter_rows(path):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def run(sizes: list[int], feeds: list[str], repeat: int) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for feed in feeds:
+            write, iter_rows = FEEDS[feed]
+            for n in sizes:
+                path = os.path.join(tmp, f"{feed}_{n}.xlsx")
+                write(path, n, header_offset=3, mixed_dates=True, bad_row_ratio=0.01)
+                to_shared_strings(path)
+
+                parsed = {}
+                for backend in xlsx_reader.READERS:
+                    best = None
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        rows = parse_with(backend, iter_rows, path)
+                        elapsed = time.perf_counter() - started
+                        best = elapsed if best is None else min(best, elapsed)
+
+                    parsed[backend] = rows
+                    results.append({
+                        "feed": feed, "rows": n, "backend": backend, "seconds": best, "usPerRow": best / n * 1e6,
+                        "readSeconds": min(read_seconds(backend, path) for _ in range(repeat)),
+                        # 메모리는 시간 측정과 따로 잰다 (tracemalloc이 파싱을 느리게 하므로)
+                        "peakMb": peak_alloc_mb(backend, iter_rows, path),
+                    })
+                assert len(parsed["openpyxl"]) == n, f"행 수 불일치: {len(parsed['openpyxl'])} != {n}"
+                results[-1]["match"] = parsed["openpyxl"] == parsed["iterparse"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--feeds", default="inpatient,outpatient")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = run([int(s) for s in args.sizes.split(",")], args.feeds.split(","), args.repeat)
+
+    print(f"{'feed':<11} {'rows':>8} {'backend':<10} {'parse(s)':>9} {'us/row':>8} {'read(s)':>8} {'peak MB':>8}  결과")
+    for r in results:
+        match = "" if "match" not in r else ("일치" if r["match"] else "불일치!")
+        print(f"{r['feed']:<11} {r['rows']:>8} {r['backend']:<10} {r['seconds']:>9.2f} "
+              f"{r['usPerRow']:>8.1f} {r['readSeconds']:>8.2f} {r['peakMb']:>8.1f}  {match}")
+
+
+if __name__ == "__main__":
+    main()
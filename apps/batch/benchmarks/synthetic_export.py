@@ -0,0 +1,260 @@
+"""
+벤치마크용 합성 EMR 엑셀 생성기
+실제 EMR 내보내기와 같은 헤더 구성의 입원현황/외래예약 XLSX 파일을 원하는 행 수만큼 만든다.
+- header_offset: 헤더 위의 제목·출력정보 행 수 (파서는 처음 10행에서 헤더를 찾으므로 0~9)
+- mixed_dates: 날짜/시간 셀을 datetime과 파서가 받는 여러 문자열 형식으로 섞어 쓴다
+- bad_row_ratio: 이 비율만큼 검증에 걸리는 행(ID 누락, 잘못된 날짜, 중복 ID 등)을 섞는다
+- to_shared_strings(): openpyxl의 인라인 문자열을 Excel처럼 공유 문자열 테이블로 바꾼다
+옵션을 주지 않으면 같은 seed에서 항상 같은 파일을 만든다 (기존 벤치마크 결과와 비교 가능).
+
+실행 (apps/batch에서):
+    python -m benchmarks.synthetic_export inpatient /tmp/inpatient.xlsx --rows 500000 \\
+        --header-offset 3 --mixed-dates --bad-ratio 0.01
+"""
+import argparse
+import random
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from typing import Any
+
+from openpyxl import Workbook
+
+INPATIENT_HEADERS = [
+    "환자번호", "환자명", "생년월일", "성별", "연락처",
+    "입원일", "퇴원예정일", "담당의", "병동", "호실", "베드", "비고",
+]
+
+OUTPATIENT_HEADERS = [
+    "환자번호", "환자명", "예약일", "시작시간", "종료시간",
+    "담당의", "진료실", "예약상태", "EMR예약ID", "비고",
+]
+
+_SURNAMES = "김이박최정강조윤장임한오서신권황안송류홍"
+_GIVEN = "민서지현수영준우하은도윤예진태호성"
+
+# normalize.parse_date / format_date가 받는 문자열 형식 (None은 datetime 셀 그대로)
+_DATE_FORMATS = (None, "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+# normalize.format_time이 받는 형식 (None은 time 셀 그대로)
+_TIME_FORMATS = (None, "%H:%M", "%H:%M:%S", "%H%M")
+
+_OUTPATIENT_STATUSES = ("예약", "예약", "예약", "접수", "완료", "변경", "취소", "미방문")
+
+INPATIENT_BAD_KINDS = ("missing_id", "bad_dob", "bad_sex", "duplicate_id", "discharge_before_admit")
+OUTPATIENT_BAD_KINDS = ("missing_id", "bad_date", "bad_time", "duplicate_appointment_id")
+
+
+def _korean_name(rng: random.Random) -> str:
+    return rng.choice(_SURNAMES) + rng.choice(_GIVEN) + rng.choice(_GIVEN)
+
+
+def _date_cell(rng: random.Random, value: datetime, mixed: bool) -> Any:
+    if not mixed:
+        return value
+    fmt = rng.choice(_DATE_FORMATS)
+    return value if fmt is None else value.strftime(fmt)
+
+
+def _time_cell(rng: random.Random, value: time, mixed: bool) -> Any:
+    if not mixed:
+        return value.strftime("%H:%M")
+    fmt = rng.choice(_TIME_FORMATS)
+    return value if fmt is None else value.strftime(fmt)
+
+
+def _write_preamble(ws, title: str, header_offset: int, today: datetime):
+    """헤더 위의 제목·출력정보 행. 첫 행은 제목, 나머지는 EMR 출력 정보처럼 채운다."""
+    if header_offset <= 0:
+        return
+    ws.append([title])
+    meta = [
+        ["출력일시", today.strftime("%Y-%m-%d %H:%M")],
+        ["출력자", "EMR 배치"],
+        ["병원", "서울온케어"],
+    ]
+    for i in range(header_offset - 1):
+        ws.append(meta[i] if i < len(meta) else [f"참고 {i - len(meta) + 1}"])
+
+
+def write_inpatient_xlsx(
+    file_path: str,
+    n_rows: int,
+    seed: int = 42,
+    header_offset: int = 1,
+    mixed_dates: bool = False,
+    bad_row_ratio: float = 0.0,
+) -> str:
+    """입원현황 형식의 합성 XLSX 파일을 생성한다. (기본: 헤더 위 제목 행 1개)"""
+    rng = random.Random(seed)
+    bad_rng = random.Random(seed + 1)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("입원현황")
+    _write_preamble(ws, f"입원환자 현황 ({today:%Y-%m-%d})", header_offset, today)
+    ws.append(INPATIENT_HEADERS)
+
+    for i in range(n_rows):
+        admit = today - timedelta(days=rng.randint(0, 60))
+        row = [
+            f"P{100000 + i}",
+            _korean_name(rng),
+            datetime(rng.randint(1935, 2005), rng.randint(1, 12), rng.randint(1, 28)),
+            rng.choice(("남", "여")),
+            f"010-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+            admit,
+            admit + timedelta(days=rng.randint(3, 30)),
+            _korean_name(rng),
+            f"{rng.randint(3, 8)}병동",
+            f"{rng.randint(1, 20):02d}호",
+            str(rng.randint(1, 6)),
+            None,
+        ]
+        if mixed_dates:
+            for col in (2, 5, 6):
+                row[col] = _date_cell(bad_rng, row[col], True)
+        if bad_row_ratio and bad_rng.random() < bad_row_ratio:
+            kind = bad_rng.choice(INPATIENT_BAD_KINDS)
+            if kind == "missing_id":
+                row[0] = " "  # 빈 셀이면 파서가 빈 행으로 건너뛰므로 공백으로 둔다
+            elif kind == "bad_dob":
+                row[2] = "1999-13-40"
+            elif kind == "bad_sex":
+                row[3] = "X"
+            elif kind == "duplicate_id" and i > 0:
+                row[0] = f"P{100000 + bad_rng.randrange(i)}"
+            elif kind == "discharge_before_admit":
+                row[6] = admit - timedelta(days=3)
+        ws.append(row)
+
+    wb.save(file_path)
+    return file_path
+
+
+def write_outpatient_xlsx(
+    file_path: str,
+    n_rows: int,
+    seed: int = 42,
+    header_offset: int = 1,
+    mixed_dates: bool = False,
+    bad_row_ratio: float = 0.0,
+    n_doctors: int = 20,
+    days: int = 14,
+) -> str:
+    """
+    외래예약 형식의 합성 XLSX 파일을 생성한다.
+    예약은 오늘부터 days일 동안 n_doctors명의 의사·8개 진료실에 나뉘며, 환자는 행 수의 절반 규모에서 고른다.
+    """
+    rng = random.Random(seed)
+    bad_rng = random.Random(seed + 1)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    doctors = [f"{_korean_name(rng)}" for _ in range(n_doctors)]
+    n_patients = max(n_rows // 2, 1)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("외래예약")
+    _write_preamble(ws, f"외래 예약 현황 ({today:%Y-%m-%d} ~ {today + timedelta(days=days - 1):%Y-%m-%d})",
+                    header_offset, today)
+    ws.append(OUTPATIENT_HEADERS)
+
+    for i in range(n_rows):
+        day = today + timedelta(days=rng.randrange(days))
+        start = time(rng.randint(9, 16), rng.choice((0, 10, 20, 30, 40, 50)))
+        end = (datetime.combine(day, start) + timedelta(minutes=rng.choice((10, 20, 30)))).time()
+        patient_no = rng.randrange(n_patients)
+        row = [
+            f"P{100000 + patient_no}",
+            _korean_name(random.Random(patient_no)),  # 같은 환자번호는 항상 같은 이름
+            _date_cell(bad_rng, day, mixed_dates) if mixed_dates else day.strftime("%Y-%m-%d"),
+            _time_cell(bad_rng, start, mixed_dates),
+            _time_cell(bad_rng, end, mixed_dates) if rng.random() < 0.8 else None,
+            rng.choice(doctors),
+            f"{rng.randint(1, 8)}진료실",
+            rng.choice(_OUTPATIENT_STATUSES),
+            f"A{1000000 + i}",
+            None,
+        ]
+        if bad_row_ratio and bad_rng.random() < bad_row_ratio:
+            kind = bad_rng.choice(OUTPATIENT_BAD_KINDS)
+            if kind == "missing_id":
+                row[0] = None
+            elif kind == "bad_date":
+                row[2] = "2026-02-30"
+            elif kind == "bad_time":
+                row[3] = "25:99"
+            elif kind == "duplicate_appointment_id" and i > 0:
+                row[8] = f"A{1000000 + bad_rng.randrange(i)}"
+        ws.append(row)
+
+    wb.save(file_path)
+    return file_path
+
+
+_INLINE_CELL_RE = re.compile(rb'<c r="([A-Z]+\d+)"((?: s="\d+")?) t="inlineStr"><is><t(?: xml:space="preserve")?>(.*?)</t></is></c>')
+
+
+def to_shared_strings(file_path: str) -> str:
+    """
+    openpyxl이 쓴 인라인 문자열(t="inlineStr") 셀을 Excel처럼 공유 문자열 테이블(t="s")로 바꿔 다시 저장한다.
+    실제 EMR 내보내기는 Excel이 저장하므로 공유 문자열을 쓴다.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        items = {info.filename: zf.read(info.filename) for info in zf.infolist()}
+
+    index: dict[bytes, int] = {}
+
+    def shared(match: re.Match) -> bytes:
+        ref, style, text = match.groups()
+        idx = index.setdefault(text, len(index))
+        return b'<c r="%s"%s t="s"><v>%d</v></c>' % (ref, style, idx)
+
+    items["xl/worksheets/sheet1.xml"] = _INLINE_CELL_RE.sub(shared, items["xl/worksheets/sheet1.xml"])
+    items["xl/sharedStrings.xml"] = (
+        b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="%d" uniqueCount="%d">'
+        % (len(index), len(index))
+        + b"".join(b'<si><t xml:space="preserve">%s</t></si>' % text for text in index)
+        + b"</sst>"
+    )
+    items["[Content_Types].xml"] = items["[Content_Types].xml"].replace(
+        b"</Types>",
+        b'<Override PartName="/xl/sharedStrings.xml" '
+        b'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>',
+    )
+    items["xl/_rels/workbook.xml.rels"] = items["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>",
+        b'<Relationship Id="rIdSst" Target="sharedStrings.xml" '
+        b'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"/></Relationships>',
+    )
+
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in items.items():
+            zf.writestr(name, data)
+    return file_path
+
+
+WRITERS = {"inpatient": write_inpatient_xlsx, "outpatient": write_outpatient_xlsx}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("feed", choices=sorted(WRITERS))
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--header-offset", type=int, default=1)
+    parser.add_argument("--mixed-dates", action="store_true")
+    parser.add_argument("--bad-ratio", type=float, default=0.0)
+    parser.add_argument("--shared-strings", action="store_true", help="Excel처럼 공유 문자열 테이블로 저장")
+    args = parser.parse_args()
+
+    WRITERS[args.feed](
+        args.path, args.rows, seed=args.seed, header_offset=args.header_offset,
+        mixed_dates=args.mixed_dates, bad_row_ratio=args.bad_ratio,
+    )
+    if args.shared_strings:
+        to_shared_strings(args.path)
+    print(f"{args.path}: {args.feed} {args.rows}행")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+배치 DB 연결 풀
+워커·임포터·헬스체크가 같은 풀에서 오래 사는 연결을 빌려 쓴다.
+- 빌려줄 때 SELECT 1로 상태를 확인하고, 끊긴 연결은 새로 연결
+- 풀이 가득 차면 DB_POOL_TIMEOUT_SEC까지 대기 (대기 시간은 stats()로 보고)
+- DB_POOL_MODE=pgbouncer: pgbouncer 트랜잭션 풀링 뒤에서 쓰는 모드.
+  연결 시작 옵션(-c ...) 같은 세션 상태를 두지 않는다.
+  (psycopg2는 서버 측 prepared statement를 쓰지 않으므로 따로 끌 것은 없다)
+프로세스 풀의 자식 프로세스는 부모의 소켓을 물려쓰지 않고 자기 풀을 새로 만든다.
+
+AdvisoryLock: 여러 워커 인스턴스가 같은 수신 폴더를 공유할 때 피드/파일 단위 점유에 쓰는 advisory lock.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from config import (
+    DATABASE_URL,
+    DB_POOL_MAX,
+    DB_POOL_MIN,
+    DB_POOL_MODE,
+    DB_POOL_TIMEOUT_SEC,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+APPLICATION_NAME = "hospital-ops-batch"
+
+
+# 이 프로세스가 DB에 보낸 명령 수 (execute/executemany/COPY 호출 단위, 메트릭용)
+_queries_issued = 0
+
+
+def queries_issued() -> int:
+    return _queries_issued
+
+
+class CountingCursor(extensions.cursor):
+    """DB 왕복 수를 세는 커서. 풀의 모든 연결이 기본 커서로 쓴다. (execute_values는 페이지마다 1회)"""
+
+    def execute(self, query, vars=None):
+        global _queries_issued
+        _queries_issued += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        global _queries_issued
+        _queries_issued += 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        global _queries_issued
+        _queries_issued += 1
+        return super().copy_expert(sql, file, size)
+
+
+class PoolTimeout(Exception):
+    """풀에서 DB_POOL_TIMEOUT_SEC 안에 연결을 받지 못함"""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        dsn: str = DATABASE_URL,
+        minconn: int = DB_POOL_MIN,
+        maxconn: int = DB_POOL_MAX,
+        timeout: float = DB_POOL_TIMEOUT_SEC,
+        mode: str = DB_POOL_MODE,
+    ):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.mode = mode
+
+        self._pool: pool.ThreadedConnectionPool | None = None
+        self._pid: int | None = None
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+
+        self.checkouts = 0
+        self.reconnects = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+
+    def _connect_kwargs(self) -> dict:
+        kwargs = {"application_name": APPLICATION_NAME, "cursor_factory": CountingCursor}
+        if self.mode == "pgbouncer":
+            # pgbouncer는 알 수 없는 startup 파라미터를 거부하고, 트랜잭션 풀링에서는
+            # 세션 설정이 다른 클라이언트에게 넘어가므로 타임아웃은 pgbouncer/DB 역할에서 설정한다.
+            return kwargs
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            kwargs["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        return kwargs
+
+    def _get_pool(self) -> pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # fork된 자식에서는 부모 풀을 닫지 않고 버린다 (부모 소켓을 건드리지 않기 위해)
+                self._pool = pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.dsn, **self._connect_kwargs()
+                )
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+                logger.info(f"DB 연결 풀 생성: min={self.minconn}, max={self.maxconn}, mode={self.mode}")
+            return self._pool
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """풀에서 연결을 빌린다. 상태가 나쁜 연결은 버리고 새로 연결한다."""
+        db_pool = self._get_pool()
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"DB 연결 풀 대기 시간 초과 ({self.timeout}초, max={self.maxconn})")
+        waited = time.monotonic() - started
+        self.wait_total_sec += waited
+        self.wait_max_sec = max(self.wait_max_sec, waited)
+        self.checkouts += 1
+
+        try:
+            conn = db_pool.getconn()
+            if not self._is_alive(conn):
+                logger.warning("끊긴 DB 연결 감지, 재연결")
+                db_pool.putconn(conn, close=True)
+                self.reconnects += 1
+                conn = db_pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """연결을 풀에 돌려준다. 끝나지 않은 트랜잭션은 롤백하고, 깨진 연결은 닫는다."""
+        db_pool = self._get_pool()
+        close = bool(conn.closed)
+        if not close and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+        try:
+            db_pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "reconnects": self.reconnects,
+            "waitTotalSec": round(self.wait_total_sec, 3),
+            "waitMaxSec": round(self.wait_max_sec, 3),
+        }
+
+
+db_pool = ConnectionPool()
+
+
+def get_connection():
+    """공유 풀에서 연결을 빌린다. 사용 후 반드시 put_connection으로 돌려준다."""
+    return db_pool.getconn()
+
+
+def put_connection(conn):
+    db_pool.putconn(conn)
+
+
+def connection():
+    """with connection() as conn: 형태로 빌리고 자동 반납"""
+    return db_pool.connection()
+
+
+def advisory_key(name: str) -> int:
+    """문자열 이름을 advisory lock 키(signed bigint)로 바꾼다."""
+    digest = hashlib.blake2b(f"{APPLICATION_NAME}:{name}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class AdvisoryLock:
+    """
+    이름(피드, 파일 해시 등) 단위의 PostgreSQL advisory lock.
+    풀에서 전용 연결을 빌려 트랜잭션을 열고 pg_try_advisory_xact_lock으로 잡은 채 release()까지 유지한다.
+    - 기다리지 않는다: 다른 인스턴스가 잡고 있으면 try_acquire()가 바로 False
+    - 트랜잭션 범위 잠금이라 pgbouncer 트랜잭션 풀링에서도 같은 서버 연결에 머문다
+    - 워커가 죽어 연결이 끊기면 서버가 트랜잭션과 함께 바로 푼다
+    작업 연결은 청크마다 커밋하므로 잠금은 항상 별도 연결에서 잡는다.
+    """
+
+    def __init__(self, name: str, connection_pool: ConnectionPool | None = None):
+        self.name = name
+        self.key = advisory_key(name)
+        self._pool = connection_pool or db_pool
+        self._conn = None
+
+    def try_acquire(self) -> bool:
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                # 잠금을 쥔 동안 연결은 idle in transaction 상태이므로 서버 타임아웃에 끊기지 않게 한다.
+                cur.execute("SET LOCAL idle_in_transaction_session_timeout = 0")
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (self.key,))
+                acquired = cur.fetchone()[0]
+        except Exception:
+            self._pool.putconn(conn)
+            raise
+
+        if not acquired:
+            self._pool.putconn(conn)
+            return False
+        self._conn = conn
+        return True
+
+    def release(self):
+        """잠금 트랜잭션을 롤백해 잠금을 풀고 연결을 반납한다."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
@@ -9,13 +9,12 @@ import sys
 import time
 from datetime import datetime, timedelta
 
-import psycopg2
 import requests
 import schedule
 
+import db
 from config import (
     ALERT_WEBHOOK_URL,
-    DATABASE_URL,
     HEALTH_CHECK_INTERVAL_MINUTES,
     MAX_BATCH_GAP_HOURS,
 )
@@ -51,7 +50,7 @@ def check_batch_health():
 
     conn = None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = db.get_connection()
         with conn.cursor() as cur:
             # 최근 성공한 Import 확인
             cur.execute(
@@ -103,7 +102,7 @@ def check_batch_health():
         send_alert("헬스체크 오류", f"배치 헬스체크 실행 중 오류: {str(e)}")
     finally:
         if conn:
-            conn.close()
+            db.put_connection(conn)
 
 
 def main():
@@ -0,0 +1,329 @@
+"""
+입원/병상 동기화
+입원현황 센서스의 입원일·퇴원예정일·담당의·병동/호실/베드로 Admission과 병상 점유를 맞춘다.
+- 병동/호실/베드 이름과 담당의(User) 이름은 파일당 한 번 미리 읽은 dict로 조회
+  담당의는 DOCTOR 역할이 있는 계정만 대상이며, 같은 이름의 의사가 여럿이면 담당의를 정하지 않는다 (미확인 처리)
+- 청크의 행은 COPY로 staging 테이블에 올린 뒤 몇 개의 집합 연산으로 반영
+  (진행 중 입원 갱신 → 신규 입원 생성 → 병상 해제 → 병상 배정 → 베드 상태 갱신)
+- Admission.currentBedId는 unique이므로 옮겨 가는 베드를 먼저 비운 뒤 배정한다
+- 베드 정보가 없거나 찾을 수 없는 행은 현재 병상을 그대로 둔다
+- 같은 베드가 파일의 여러 행에 있으면 파일에서 먼저 나온 행만 배정받는다 (청크를 넘어 파일 단위로 판단,
+  스냅샷 비교로 건너뛴 행도 포함하도록 claim_beds()에 유효 행 전체를 넘긴다)
+- 커밋은 호출자(worker)가 청크 단위로 수행한다
+"""
+import csv
+import io
+import logging
+
+from parsers.records import InpatientRow
+
+logger = logging.getLogger(__name__)
+
+# EMR 동기화로 만든 BedAssignment의 changedBy
+SYNC_ACTOR = "EMR_SYNC"
+
+# 센서스에 있는 환자의 "진행 중" 입원 상태
+OPEN_STATUSES = ("ADMITTED", "DISCHARGE_PLANNED", "TRANSFER_PLANNED", "ON_LEAVE", "OTHER")
+
+
+def _name_key(*parts: str) -> tuple[str, ...]:
+    """이름 비교용 키: 공백 제거 ("3 병동" == "3병동")"""
+    return tuple("".join(p.split()) for p in parts)
+
+
+def _index_doctors(rows: list[tuple[str, str]]) -> tuple[dict[str, str], set[str]]:
+    """(이름, User.id) 목록 → (공백 제거 이름 → User.id, 동명이인 이름). 동명이인은 맵에 넣지 않는다."""
+    doctors: dict[str, str] = {}
+    ambiguous: set[str] = set()
+    for name, user_id in rows:
+        key = "".join(name.split())
+        if key in doctors and doctors[key] != user_id:
+            ambiguous.add(key)
+        doctors[key] = user_id
+    for key in ambiguous:
+        del doctors[key]
+    return doctors, ambiguous
+
+
+class AdmissionSync:
+    """
+    파일 1건의 입원/병상 동기화 상태.
+    생성 시 베드(병동, 호실, 베드) → Bed.id, 의사 이름 → User.id 맵을 미리 읽고,
+    청크마다 claim_beds()(유효 행 전체)와 sync()(반영할 행)를 호출한다.
+    """
+
+    def __init__(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT w."name", r."name", b."label", b."id"
+                   FROM "Bed" b
+                   JOIN "Room" r ON r."id" = b."roomId"
+                   JOIN "Ward" w ON w."id" = r."wardId"
+                   WHERE b."deletedAt" IS NULL AND b."isActive"
+                     AND r."deletedAt" IS NULL AND r."isActive"
+                     AND w."deletedAt" IS NULL AND w."isActive" """
+            )
+            self.beds: dict[tuple[str, ...], str] = {
+                _name_key(ward, room, label): bed_id for ward, room, label, bed_id in cur.fetchall()
+            }
+
+            # 어느 부서에서든 DOCTOR 역할이 있는 활성 계정만 담당의 후보 (간호사·직원 동명이인 제외)
+            cur.execute(
+                """SELECT u."name", u."id"
+                   FROM "User" u
+                   WHERE u."deletedAt" IS NULL AND u."isActive"
+                     AND EXISTS (SELECT 1 FROM "UserDepartment" ud
+                                 WHERE ud."userId" = u."id" AND ud."role" = 'DOCTOR')
+                   ORDER BY u."name", u."createdAt" """
+            )
+            self.doctors, ambiguous = _index_doctors(cur.fetchall())
+
+        if ambiguous:
+            logger.warning(f"입원 동기화: 동명이인 의사는 담당의를 지정하지 않음: {', '.join(sorted(ambiguous))}")
+
+        # 이 파일에서 베드를 먼저 차지한 환자: Bed.id → emrPatientId
+        self.bed_owners: dict[str, str] = {}
+
+        logger.info(f"입원 동기화 참조 로드: 베드 {len(self.beds)}개, 의사 {len(self.doctors)}명")
+
+    def _bed_id(self, row: InpatientRow) -> str | None:
+        if row.wardName and row.roomName and row.bedLabel:
+            return self.beds.get(_name_key(row.wardName, row.roomName, row.bedLabel))
+        return None
+
+    def claim_beds(self, rows: list[InpatientRow]):
+        """유효 행의 베드를 파일 순서대로 차지한다. 이미 앞 행(앞 청크 포함)이 차지한 베드는 그대로 둔다."""
+        for row in rows:
+            bed_id = self._bed_id(row)
+            if bed_id is not None:
+                self.bed_owners.setdefault(bed_id, row.emrPatientId)
+
+    def _resolve(self, rows: list[InpatientRow], unwritten: set[str]) -> tuple[list[tuple], dict[str, int]]:
+        """행마다 베드/담당의를 맵에서 찾아 staging 레코드를 만든다. 찾지 못한 행의 환자번호는 unwritten에 넣는다."""
+        records: list[tuple] = []
+        unresolved = {"bedUnresolved": 0, "doctorUnresolved": 0, "bedDuplicate": 0}
+        for row in rows:
+            bed_id = self._bed_id(row)
+            if bed_id is None and row.wardName and row.roomName and row.bedLabel:
+                unresolved["bedUnresolved"] += 1
+                unwritten.add(row.emrPatientId)
+            elif bed_id is not None and self.bed_owners.setdefault(bed_id, row.emrPatientId) != row.emrPatientId:
+                # 파일의 앞 행이 차지한 베드 → 현재 병상을 그대로 둔다
+                bed_id = None
+                unresolved["bedDuplicate"] += 1
+                unwritten.add(row.emrPatientId)
+
+            doctor_id = None
+            if row.attendingDoctor:
+                doctor_id = self.doctors.get("".join(row.attendingDoctor.split()))
+                if doctor_id is None:
+                    unresolved["doctorUnresolved"] += 1
+                    unwritten.add(row.emrPatientId)
+
+            planned = row.plannedDischargeDate
+            records.append((
+                row.emrPatientId,
+                row.admitDate.isoformat(),
+                planned.isoformat() if planned else None,
+                doctor_id,
+                bed_id,
+            ))
+        return records, unresolved
+
+    def sync(self, conn, rows: list[InpatientRow], unwritten: set[str] | None = None) -> dict[str, int]:
+        """
+        유효 행(Patient upsert 이후)으로 Admission과 병상 점유를 갱신한다.
+        unwritten: 베드·담당의를 찾지 못했거나 입원/베드 배정이 반영되지 않은 환자번호를 추가한다. (스냅샷 저장 제외용)
+        Returns: {"admissionsCreated", "admissionsUpdated", "bedsAssigned", "bedsReleased",
+                  "bedUnresolved", "doctorUnresolved", "bedDuplicate"}
+        """
+        stats = {"admissionsCreated": 0, "admissionsUpdated": 0, "bedsAssigned": 0, "bedsReleased": 0}
+        if not rows:
+            stats.update(bedUnresolved=0, doctorUnresolved=0, bedDuplicate=0)
+            return stats
+
+        if unwritten is None:
+            unwritten = set()
+        records, unresolved = self._resolve(rows, unwritten)
+        stats.update(unresolved)
+
+        with conn.cursor() as cur:
+            self._copy_stage(cur, records)
+
+            # 1) 진행 중 입원의 입원일/퇴원예정일/담당의 갱신
+            cur.execute(
+                """UPDATE "Admission" a
+                   SET "admitDate" = s."admitDate",
+                       "plannedDischargeDate" = s."plannedDischargeDate",
+                       "attendingDoctorId" = COALESCE(s."attendingDoctorId", a."attendingDoctorId"),
+                       "version" = a."version" + 1,
+                       "updatedAt" = NOW()
+                   FROM _admission_stage s
+                   WHERE a."id" = s."admissionId"
+                     AND (a."admitDate" IS DISTINCT FROM s."admitDate"
+                          OR a."plannedDischargeDate" IS DISTINCT FROM s."plannedDischargeDate"
+                          OR a."attendingDoctorId" IS DISTINCT FROM COALESCE(s."attendingDoctorId", a."attendingDoctorId"))"""
+            )
+            stats["admissionsUpdated"] = cur.rowcount
+
+            # 2) 진행 중 입원이 없는 환자는 신규 입원 생성 (담당의를 찾은 경우만: attendingDoctorId 필수)
+            cur.execute(
+                """WITH created AS (
+                       INSERT INTO "Admission"
+                           ("id", "patientId", "admitDate", "plannedDischargeDate", "attendingDoctorId",
+                            "status", "createdAt", "updatedAt")
+                       SELECT gen_random_uuid(), s."patientId", s."admitDate", s."plannedDischargeDate",
+                              s."attendingDoctorId", 'ADMITTED', NOW(), NOW()
+                       FROM _admission_stage s
+                       WHERE s."admissionId" IS NULL AND s."attendingDoctorId" IS NOT NULL
+                       ORDER BY s."emrPatientId"
+                       RETURNING "id", "patientId"
+                   )
+                   UPDATE _admission_stage s
+                   SET "admissionId" = c."id"
+                   FROM created c
+                   WHERE s."patientId" = c."patientId" """
+            )
+            stats["admissionsCreated"] = cur.rowcount
+
+            # 3) 베드가 바뀌는 입원, 그리고 센서스상 다른 환자에게 가는 베드를 먼저 비운다
+            cur.execute(
+                """WITH targets AS (
+                       SELECT a."id", a."currentBedId"
+                       FROM "Admission" a
+                       WHERE a."currentBedId" IS NOT NULL
+                         AND (
+                           EXISTS (SELECT 1 FROM _admission_stage s
+                                   WHERE s."admissionId" = a."id" AND s."bedId" IS NOT NULL
+                                     AND s."bedId" <> a."currentBedId")
+                           OR EXISTS (SELECT 1 FROM _admission_stage s
+                                      WHERE s."bedId" = a."currentBedId" AND s."admissionId" <> a."id")
+                         )
+                       FOR UPDATE OF a
+                   ), released AS (
+                       UPDATE "Admission" a
+                       SET "currentBedId" = NULL, "version" = a."version" + 1, "updatedAt" = NOW()
+                       FROM targets t
+                       WHERE a."id" = t."id"
+                   ), closed AS (
+                       UPDATE "BedAssignment" ba
+                       SET "endAt" = NOW()
+                       FROM targets t
+                       WHERE ba."admissionId" = t."id" AND ba."bedId" = t."currentBedId" AND ba."endAt" IS NULL
+                   ), touched AS (
+                       INSERT INTO _touched_beds ("bedId")
+                       SELECT "currentBedId" FROM targets
+                       ON CONFLICT DO NOTHING
+                   )
+                   SELECT COUNT(*) FROM targets"""
+            )
+            stats["bedsReleased"] = cur.fetchone()[0]
+
+            # 4) 비어 있는 입원에 베드 배정 + BedAssignment 기록
+            cur.execute(
+                """WITH assigned AS (
+                       UPDATE "Admission" a
+                       SET "currentBedId" = s."bedId", "version" = a."version" + 1, "updatedAt" = NOW()
+                       FROM _admission_stage s
+                       WHERE a."id" = s."admissionId" AND s."bedId" IS NOT NULL AND a."currentBedId" IS NULL
+                       RETURNING a."id", s."bedId"
+                   ), logged AS (
+                       INSERT INTO "BedAssignment" ("id", "admissionId", "bedId", "startAt", "changedBy", "createdAt")
+                       SELECT gen_random_uuid(), "id", "bedId", NOW(), %s, NOW() FROM assigned
+                       RETURNING "bedId"
+                   ), touched AS (
+                       INSERT INTO _touched_beds ("bedId")
+                       SELECT "bedId" FROM logged
+                       ON CONFLICT DO NOTHING
+                   )
+                   SELECT COUNT(*) FROM logged""",
+                (SYNC_ACTOR,),
+            )
+            stats["bedsAssigned"] = cur.fetchone()[0]
+
+            # 환자가 없어 staging에서 빠졌거나, 입원이 생성되지 않았거나, 센서스의 베드를 배정받지 못한 환자는
+            # 다음 파일에서 다시 동기화한다
+            cur.execute(
+                """SELECT s."emrPatientId"
+                   FROM _admission_stage s
+                   JOIN "Admission" a ON a."id" = s."admissionId"
+                   WHERE s."bedId" IS NULL OR a."currentBedId" = s."bedId" """
+            )
+            synced = {emr_id for (emr_id,) in cur.fetchall()}
+            unwritten.update(record[0] for record in records if record[0] not in synced)
+
+            # 5) 바뀐 베드의 상태 갱신: 점유 → OCCUPIED (격리 베드 제외), 비워진 OCCUPIED → EMPTY
+            cur.execute(
+                """UPDATE "Bed" b
+                   SET "status" = CASE WHEN occ."bedId" IS NULL THEN 'EMPTY' ELSE 'OCCUPIED' END::"BedStatus",
+                       "version" = b."version" + 1,
+                       "updatedAt" = NOW()
+                   FROM _touched_beds t
+                   LEFT JOIN (SELECT "currentBedId" AS "bedId" FROM "Admission"
+                              WHERE "currentBedId" IS NOT NULL) occ ON occ."bedId" = t."bedId"
+                   WHERE b."id" = t."bedId"
+                     AND ((occ."bedId" IS NOT NULL AND b."status" NOT IN ('OCCUPIED', 'ISOLATION'))
+                          OR (occ."bedId" IS NULL AND b."status" = 'OCCUPIED'))"""
+            )
+
+        if any(unresolved.values()):
+            logger.warning(
+                f"입원 동기화: 베드 미확인 {unresolved['bedUnresolved']}건, "
+                f"담당의 미확인 {unresolved['doctorUnresolved']}건, "
+                f"베드 중복 {unresolved['bedDuplicate']}건"
+            )
+        logger.info(
+            f"입원 동기화 완료: 생성={stats['admissionsCreated']}, 갱신={stats['admissionsUpdated']}, "
+            f"베드 배정={stats['bedsAssigned']}, 베드 해제={stats['bedsReleased']}"
+        )
+        return stats
+
+    @staticmethod
+    def _copy_stage(cur, records: list[tuple]):
+        """
+        청크의 동기화 대상을 COPY로 staging 테이블에 올리고 환자/진행 중 입원 ID를 채운다.
+        베드 중복은 _resolve()에서 파일 단위로 걸러 두므로 한 베드는 한 행에만 있다.
+        (트랜잭션 종료 시 자동 삭제)
+        """
+        cur.execute('DROP TABLE IF EXISTS _admission_stage')
+        cur.execute('DROP TABLE IF EXISTS _touched_beds')
+        cur.execute(
+            """CREATE TEMP TABLE _admission_stage (
+                   "emrPatientId" TEXT PRIMARY KEY,
+                   "admitDate" TIMESTAMP(3) NOT NULL,
+                   "plannedDischargeDate" TIMESTAMP(3),
+                   "attendingDoctorId" TEXT,
+                   "bedId" TEXT,
+                   "patientId" TEXT,
+                   "admissionId" TEXT
+               ) ON COMMIT DROP"""
+        )
+        cur.execute('CREATE TEMP TABLE _touched_beds ("bedId" TEXT PRIMARY KEY) ON COMMIT DROP')
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows(records)
+        buf.seek(0)
+        cur.copy_expert(
+            """COPY _admission_stage ("emrPatientId", "admitDate", "plannedDischargeDate", "attendingDoctorId", "bedId")
+               FROM STDIN WITH (FORMAT csv)""",
+            buf,
+        )
+
+        cur.execute(
+            """UPDATE _admission_stage s
+               SET "patientId" = p."id"
+               FROM "Patient" p
+               WHERE p."emrPatientId" = s."emrPatientId" AND p."deletedAt" IS NULL"""
+        )
+        cur.execute('DELETE FROM _admission_stage WHERE "patientId" IS NULL')
+        cur.execute(
+            """UPDATE _admission_stage s
+               SET "admissionId" = a."id"
+               FROM (SELECT DISTINCT ON ("patientId") "patientId", "id"
+                     FROM "Admission"
+                     WHERE "deletedAt" IS NULL AND "status" = ANY(%s::"AdmissionStatus"[])
+                     ORDER BY "patientId", "admitDate" DESC) a
+               WHERE a."patientId" = s."patientId" """,
+            (list(OPEN_STATUSES),),
+        )
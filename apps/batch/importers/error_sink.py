@@ -0,0 +1,73 @@
+"""
+ImportError 일괄 기록기
+입원/외래 임포터가 공유한다.
+- 오류 레코드를 버퍼에 모았다가 execute_values 한 번으로 저장
+- Import 한 건당 원본 행(rawRowJson)은 IMPORT_ERROR_RAW_LIMIT건까지만 저장하고 나머지는 개수만 센다
+"""
+import json
+import logging
+from typing import Any
+
+from psycopg2.extras import execute_values
+
+from config import IMPORT_ERROR_RAW_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class ImportErrorSink:
+    """Import 한 건의 오류 행을 모아 청크 단위로 flush한다."""
+
+    def __init__(self, import_id: str, raw_limit: int = IMPORT_ERROR_RAW_LIMIT):
+        self.import_id = import_id
+        self.raw_limit = raw_limit
+        self.written = 0
+        self.raw_stored = 0
+        self.raw_dropped = 0
+        self._buffer: list[tuple] = []
+
+    def add(self, error_code: str, message: str, row_number: int | None, raw: dict[str, Any] | None):
+        """오류 1건을 버퍼에 추가한다. 원본 행 한도를 넘으면 raw는 버리고 개수만 센다."""
+        raw_json = None
+        if raw is not None:
+            if self.raw_stored < self.raw_limit:
+                raw_json = json.dumps(raw, ensure_ascii=False, default=str)
+                self.raw_stored += 1
+            else:
+                self.raw_dropped += 1
+        self._buffer.append((self.import_id, error_code, message, row_number, raw_json))
+
+    def flush(self, conn) -> int:
+        """버퍼의 오류를 한 번에 INSERT한다. 커밋은 호출자가 수행한다."""
+        if not self._buffer:
+            return 0
+
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """INSERT INTO "ImportError"
+                   ("id", "importId", "errorCode", "message", "rowNumber", "rawRowJson", "createdAt")
+                   VALUES %s""",
+                self._buffer,
+                template="(gen_random_uuid(), %s, %s, %s, %s, %s::jsonb, NOW())",
+                page_size=1000,
+            )
+
+        count = len(self._buffer)
+        self.written += count
+        self._buffer.clear()
+        logger.info(f"ImportError 저장: {count}건 (누적 {self.written}건, 원본 생략 {self.raw_dropped}건)")
+        return count
+
+    def stats(self) -> dict[str, int]:
+        return {"errorRecords": self.written, "errorRawDropped": self.raw_dropped}
+
+    def state(self) -> dict[str, int]:
+        """Import 체크포인트에 저장할 누적 상태 (flush 이후 호출)"""
+        return {"written": self.written, "rawStored": self.raw_stored, "rawDropped": self.raw_dropped}
+
+    def restore(self, state: dict[str, int]):
+        """중단된 Import를 이어서 처리할 때 체크포인트의 누적 상태로 되돌린다. (원본 행 한도도 이어서 적용)"""
+        self.written = state.get("written", 0)
+        self.raw_stored = state.get("rawStored", 0)
+        self.raw_dropped = state.get("rawDropped", 0)
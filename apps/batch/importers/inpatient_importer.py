@@ -2,20 +2,26 @@
 입원현황 데이터 Importer
 파싱 + 검증된 데이터를 DB에 upsert한다.
 - Patient 테이블 upsert (emrPatientId 기준)
+  · 행 단위(upsert_patients) / staging 테이블 집합 연산(upsert_patients_bulk)
 - 인적사항 변경 시 IDENTITY_CONFLICT 생성
-- Import / ImportError 테이블 기록
+- ImportError 테이블 기록 (ImportErrorSink로 일괄 저장)
+- 커밋은 호출자(worker)가 청크 단위로 수행한다
 """
+import csv
+import io
 import json
 import logging
 from datetime import datetime
-from typing import Any
+
+from importers.error_sink import ImportErrorSink
+from parsers.records import InpatientRow, RowError
 
 logger = logging.getLogger(__name__)
 
 
 def upsert_patients(
     conn,
-    valid_rows: list[dict[str, Any]],
+    valid_rows: list[InpatientRow],
     import_id: str,
 ) -> dict[str, int]:
     """
@@ -26,11 +32,11 @@ def upsert_patients(
 
     with conn.cursor() as cur:
         for row in valid_rows:
-            emr_id = row["emrPatientId"]
-            name = row["name"]
-            dob = row["dob"]
-            sex = row["sex"]
-            phone = row.get("phone")
+            emr_id = row.emrPatientId
+            name = row.name
+            dob = row.dob
+            sex = row.sex
+            phone = row.phone
 
             # 기존 환자 조회
             cur.execute(
@@ -88,7 +94,6 @@ def upsert_patients(
                     else:
                         stats["skipped"] += 1
 
-    conn.commit()
     logger.info(
         f"Patient upsert 완료: 생성={stats['created']}, "
         f"갱신={stats['updated']}, 충돌={stats['conflicts']}, 건너뜀={stats['skipped']}"
@@ -96,40 +101,134 @@ def upsert_patients(
     return stats
 
 
+def _copy_patient_stage(cur, valid_rows: list[InpatientRow]):
+    """유효 행을 COPY로 임시 staging 테이블에 적재한다. (트랜잭션 종료 시 자동 삭제)"""
+    cur.execute('DROP TABLE IF EXISTS _patient_stage')
+    cur.execute(
+        """CREATE TEMP TABLE _patient_stage (
+               "emrPatientId" TEXT PRIMARY KEY,
+               "name" TEXT NOT NULL,
+               "dob" TIMESTAMP(3) NOT NULL,
+               "sex" TEXT NOT NULL,
+               "phone" TEXT
+           ) ON COMMIT DROP"""
+    )
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in valid_rows:
+        writer.writerow((
+            row.emrPatientId,
+            row.name,
+            row.dob.isoformat(),
+            row.sex,
+            row.phone,
+        ))
+    buf.seek(0)
+    cur.copy_expert(
+        'COPY _patient_stage ("emrPatientId", "name", "dob", "sex", "phone") FROM STDIN WITH (FORMAT csv)',
+        buf,
+    )
+
+
+def upsert_patients_bulk(
+    conn,
+    valid_rows: list[InpatientRow],
+    import_id: str,
+) -> dict[str, int]:
+    """
+    upsert_patients의 집합 연산 버전. 행 수와 무관하게 5개 문장으로 처리한다.
+    1. COPY로 staging 테이블 적재
+    2. "Patient"와 1회 조인 → 인적사항 변경 행을 PatientIdentityConflict에 일괄 INSERT
+    3. 인적사항이 같은 기존 환자의 연락처 일괄 UPDATE
+    4. 신규 환자 INSERT … ON CONFLICT DO NOTHING
+    통계 의미는 upsert_patients와 같다. (나머지 행은 skipped)
+    Returns: {"created": n, "updated": n, "conflicts": n, "skipped": n}
+    """
+    stats = {"created": 0, "updated": 0, "conflicts": 0, "skipped": 0}
+    if not valid_rows:
+        return stats
+
+    with conn.cursor() as cur:
+        _copy_patient_stage(cur, valid_rows)
+
+        # 인적사항 변경 감지 (이름, 생년월일, 성별) → 충돌 기록, 자동 업데이트하지 않음
+        cur.execute(
+            """INSERT INTO "PatientIdentityConflict"
+                   ("id", "importId", "emrPatientId", "beforeJson", "afterJson", "status", "detectedAt")
+               SELECT gen_random_uuid(), %s, s."emrPatientId",
+                      jsonb_build_object('name', p."name", 'dob', to_char(p."dob", 'YYYY-MM-DD'), 'sex', p."sex"),
+                      jsonb_build_object('name', s."name", 'dob', to_char(s."dob", 'YYYY-MM-DD'), 'sex', s."sex"),
+                      'OPEN', NOW()
+               FROM _patient_stage s
+               JOIN "Patient" p ON p."emrPatientId" = s."emrPatientId" AND p."deletedAt" IS NULL
+               WHERE p."name" IS DISTINCT FROM s."name"
+                  OR p."dob"::date IS DISTINCT FROM s."dob"::date
+                  OR p."sex" IS DISTINCT FROM s."sex"
+               RETURNING "emrPatientId", "beforeJson"->>'name', "afterJson"->>'name'""",
+            (import_id,),
+        )
+        for emr_id, old_name, new_name in cur.fetchall():
+            stats["conflicts"] += 1
+            logger.warning(f"인적사항 변경 감지: {emr_id} ({old_name} → {new_name})")
+
+        # 연락처 등 비식별 정보만 업데이트
+        cur.execute(
+            """UPDATE "Patient" p
+               SET "phone" = s."phone", "updatedAt" = NOW()
+               FROM _patient_stage s
+               WHERE p."emrPatientId" = s."emrPatientId"
+                 AND p."deletedAt" IS NULL
+                 AND p."name" = s."name"
+                 AND p."dob"::date = s."dob"::date
+                 AND p."sex" = s."sex"
+                 AND s."phone" IS NOT NULL
+                 AND p."phone" IS DISTINCT FROM s."phone" """
+        )
+        stats["updated"] = cur.rowcount
+
+        # 신규 환자 생성 (삭제된 환자와 emrPatientId가 겹치면 건너뜀)
+        # 외래 피드와 동시에 실행될 수 있으므로 emrPatientId 순으로 넣어 교착을 피한다.
+        cur.execute(
+            """INSERT INTO "Patient" ("id", "emrPatientId", "name", "dob", "sex", "phone", "status", "createdAt", "updatedAt")
+               SELECT gen_random_uuid(), s."emrPatientId", s."name", s."dob", s."sex", s."phone", 'ACTIVE', NOW(), NOW()
+               FROM _patient_stage s
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM "Patient" p
+                   WHERE p."emrPatientId" = s."emrPatientId" AND p."deletedAt" IS NULL
+               )
+               ORDER BY s."emrPatientId"
+               ON CONFLICT ("emrPatientId") DO NOTHING"""
+        )
+        stats["created"] = cur.rowcount
+
+    stats["skipped"] = len(valid_rows) - stats["created"] - stats["updated"] - stats["conflicts"]
+    logger.info(
+        f"Patient bulk upsert 완료: 생성={stats['created']}, "
+        f"갱신={stats['updated']}, 충돌={stats['conflicts']}, 건너뜀={stats['skipped']}"
+    )
+    return stats
+
+
 def save_import_errors(
     conn,
     import_id: str,
-    error_rows: list[dict[str, Any]],
+    error_rows: list[RowError],
+    sink: ImportErrorSink | None = None,
 ) -> int:
-    """오류 행들을 ImportError 테이블에 저장한다."""
-    count = 0
-    with conn.cursor() as cur:
-        for err in error_rows:
-            row_num = err.get("rowNumber")
-            errors = err.get("errors", [])
-            raw = err.get("raw", {})
-
-            # _errors, _rowNumber 제거
-            clean_raw = {k: v for k, v in raw.items() if not k.startswith("_")}
-            # datetime → str 변환
-            for k, v in clean_raw.items():
-                if isinstance(v, datetime):
-                    clean_raw[k] = v.isoformat()
+    """
+    오류 행들을 ImportError 테이블에 저장한다.
+    청크 처리 중에는 Import 단위 sink를 넘겨 원본 행 저장 한도를 파일 전체에 적용한다.
+    """
+    if sink is None:
+        sink = ImportErrorSink(import_id)
 
-            cur.execute(
-                """INSERT INTO "ImportError"
-                   ("id", "importId", "errorCode", "message", "rowNumber", "rawRowJson", "createdAt")
-                   VALUES (gen_random_uuid(), %s, %s, %s, %s, %s::jsonb, NOW())""",
-                (
-                    import_id,
-                    "VALIDATION_ERROR",
-                    "; ".join(errors),
-                    row_num,
-                    json.dumps(clean_raw, ensure_ascii=False, default=str),
-                ),
-            )
-            count += 1
+    for err in error_rows:
+        # 업무 필드만 저장 (datetime은 JSON 직렬화 시 isoformat)
+        clean_raw = {
+            k: v.isoformat() if isinstance(v, datetime) else v
+            for k, v in err.row.data().items()
+        }
+        sink.add("VALIDATION_ERROR", "; ".join(err.errors), err.row.row_number, clean_raw)
 
-    conn.commit()
-    logger.info(f"ImportError 저장: {count}건")
-    return count
+    return sink.flush(conn)
@@ -1,214 +1,351 @@
 """
 외래예약 임포터
 파싱된 외래예약 데이터를 DB에 Upsert 한다.
+- 환자/의사/진료실/기존 예약은 ReferenceResolver로 청크당 몇 번의 쿼리에 미리 조회
 - EMR예약ID 기준으로 기존 레코드를 조회
 - 없으면 신규 생성, 있으면 변경 감지 → conflictFlag 설정
+- INSERT/UPDATE는 청크당 execute_values 한 번으로 반영한다. 무결성·데이터 오류가 나면 세이브포인트로 되돌리고
+  그 문장만 행 단위로 다시 실행해, 실패한 행만 건너뛴다 (청크 전체가 실패하지 않음)
+- 커밋은 호출자(worker)가 청크 단위로 수행한다
 """
-import json
 import logging
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from importers.error_sink import ImportErrorSink
+from parsers.records import OutpatientRow, RowError
 
 logger = logging.getLogger("importer.outpatient")
 
 
-def save_import_errors(conn, import_id: str, error_rows: list[dict]):
-    """오류 행을 ImportError 테이블에 저장한다."""
-    with conn.cursor() as cur:
-        for row in error_rows:
-            cur.execute(
-                """INSERT INTO "ImportError"
-                   ("id", "importId", "errorCode", "message", "rowNumber", "rawRowJson", "createdAt")
-                   VALUES (gen_random_uuid(), %s, %s, %s, %s, %s::jsonb, NOW())""",
-                (
-                    import_id,
-                    "PARSE_ERROR",
-                    row.get("_error", "알 수 없는 오류"),
-                    row.get("_row"),
-                    json.dumps({k: str(v) for k, v in row.items() if not k.startswith("_")}, ensure_ascii=False),
-                ),
-            )
-    conn.commit()
-
-
-def _find_or_create_patient(cur, emr_patient_id: str, patient_name: str) -> str | None:
-    """환자를 emrPatientId로 조회하거나 신규 생성한다. 환자 ID를 반환한다."""
-    cur.execute(
-        'SELECT "id" FROM "Patient" WHERE "emrPatientId" = %s AND "deletedAt" IS NULL LIMIT 1',
-        (emr_patient_id,),
-    )
-    result = cur.fetchone()
-    if result:
-        return result[0]
-
-    # 환자가 없으면 최소 정보로 생성 (배치에서는 이름 + emrPatientId만)
-    cur.execute(
-        """INSERT INTO "Patient" ("id", "emrPatientId", "name", "dob", "sex", "status", "createdAt", "updatedAt")
-           VALUES (gen_random_uuid(), %s, %s, '1900-01-01', 'M', 'ACTIVE', NOW(), NOW())
-           RETURNING "id" """,
-        (emr_patient_id, patient_name),
-    )
-    result = cur.fetchone()
-    return result[0] if result else None
-
-
-def _find_or_create_doctor(cur, doctor_name: str, emr_doctor_id: str | None) -> str | None:
-    """의사를 이름 또는 emrDoctorId로 조회하거나 신규 생성한다."""
-    if emr_doctor_id:
-        cur.execute(
-            'SELECT "id" FROM "Doctor" WHERE "emrDoctorId" = %s AND "deletedAt" IS NULL LIMIT 1',
-            (emr_doctor_id,),
+def save_import_errors(conn, import_id: str, error_rows: list[RowError], sink: ImportErrorSink | None = None) -> int:
+    """
+    validate_outpatient_rows의 오류 행(RowError)을 ImportError 테이블에 저장한다.
+    파서 오류는 PARSE_ERROR, 그 외(파일 내 중복 등)는 VALIDATION_ERROR로 기록한다.
+    청크 처리 중에는 Import 단위 sink를 넘겨 원본 행 저장 한도를 파일 전체에 적용한다.
+    """
+    if sink is None:
+        sink = ImportErrorSink(import_id)
+
+    for err in error_rows:
+        sink.add(
+            "PARSE_ERROR" if err.row.errors else "VALIDATION_ERROR",
+            "; ".join(err.errors) or "알 수 없는 오류",
+            err.row.row_number,
+            {k: str(v) for k, v in err.row.data().items() if v is not None},
         )
-        result = cur.fetchone()
-        if result:
-            return result[0]
+    return sink.flush(conn)
+
+
+class ReferenceResolver:
+    """
+    청크에 필요한 참조 데이터를 = ANY(%s) 쿼리 몇 번으로 미리 읽어 dict로 조회한다.
+    - 환자(emrPatientId), 의사(emrDoctorId / 이름), 진료실(이름), 기존 예약(emrAppointmentId)
+    - 없는 환자와 의사는 각각 한 번의 일괄 INSERT로 생성한다.
+    행마다 조회하던 _find_or_create_* 방식(예약당 최대 6쿼리)을 대체한다.
+    """
+
+    def __init__(self, cur, rows: list[OutpatientRow]):
+        self.patients: dict[str, str] = {}
+        self.doctors_by_emr_id: dict[str, str] = {}
+        self.doctors_by_name: dict[str, str] = {}
+        self.clinic_rooms: dict[str, str] = {}
+        self.appointments: dict[str, tuple] = {}
+
+        self._load(cur, rows)
+        self._create_missing_patients(cur, rows)
+        self._create_missing_doctors(cur, rows)
+
+    def _load(self, cur, rows: list[OutpatientRow]):
+        patient_ids = list({r.emrPatientId for r in rows})
+        doctor_emr_ids = list({r.emrDoctorId for r in rows if r.emrDoctorId})
+        doctor_names = list({r.doctorName for r in rows if r.doctorName})
+        room_names = list({r.clinicRoomName for r in rows if r.clinicRoomName})
+        appointment_ids = list({r.emrAppointmentId for r in rows if r.emrAppointmentId})
 
-    if doctor_name:
         cur.execute(
-            'SELECT "id" FROM "Doctor" WHERE "name" = %s AND "deletedAt" IS NULL LIMIT 1',
-            (doctor_name,),
+            'SELECT "emrPatientId", "id" FROM "Patient" WHERE "emrPatientId" = ANY(%s) AND "deletedAt" IS NULL',
+            (patient_ids,),
         )
-        result = cur.fetchone()
-        if result:
-            return result[0]
+        self.patients.update(cur.fetchall())
 
-        # 없으면 신규 생성
-        cur.execute(
-            """INSERT INTO "Doctor" ("id", "name", "emrDoctorId", "isActive", "createdAt", "updatedAt")
-               VALUES (gen_random_uuid(), %s, %s, true, NOW(), NOW())
-               RETURNING "id" """,
-            (doctor_name, emr_doctor_id),
+        if doctor_emr_ids:
+            cur.execute(
+                'SELECT "emrDoctorId", "id" FROM "Doctor" WHERE "emrDoctorId" = ANY(%s) AND "deletedAt" IS NULL',
+                (doctor_emr_ids,),
+            )
+            self.doctors_by_emr_id.update(cur.fetchall())
+
+        if doctor_names:
+            cur.execute(
+                """SELECT DISTINCT ON ("name") "name", "id" FROM "Doctor"
+                   WHERE "name" = ANY(%s) AND "deletedAt" IS NULL
+                   ORDER BY "name", "createdAt" """,
+                (doctor_names,),
+            )
+            self.doctors_by_name.update(cur.fetchall())
+
+        if room_names:
+            cur.execute(
+                'SELECT "name", "id" FROM "ClinicRoom" WHERE "name" = ANY(%s) AND "deletedAt" IS NULL',
+                (room_names,),
+            )
+            self.clinic_rooms.update(cur.fetchall())
+
+        if appointment_ids:
+            cur.execute(
+                'SELECT "emrAppointmentId", "id", "startAt", "endAt", "doctorId", "status", "source" '
+                'FROM "Appointment" WHERE "emrAppointmentId" = ANY(%s) AND "deletedAt" IS NULL',
+                (appointment_ids,),
+            )
+            for emr_appointment_id, *existing in cur.fetchall():
+                self.appointments[emr_appointment_id] = tuple(existing)
+
+    def _create_missing_patients(self, cur, rows: list[OutpatientRow]):
+        """없는 환자를 최소 정보(이름 + emrPatientId)로 일괄 생성한다."""
+        missing: dict[str, str] = {}
+        for r in rows:
+            if r.emrPatientId not in self.patients:
+                missing.setdefault(r.emrPatientId, r.patientName or "")
+        if not missing:
+            return
+
+        # 삭제된 환자와 emrPatientId가 겹치면 생성되지 않으며, 해당 행은 건너뛴다.
+        # 입원 피드와 동시에 실행될 수 있으므로 emrPatientId 순으로 넣어 교착을 피한다.
+        created = execute_values(
+            cur,
+            """INSERT INTO "Patient" ("id", "emrPatientId", "name", "dob", "sex", "status", "createdAt", "updatedAt")
+               VALUES %s
+               ON CONFLICT ("emrPatientId") DO NOTHING
+               RETURNING "emrPatientId", "id" """,
+            sorted(missing.items()),
+            template="(gen_random_uuid(), %s, %s, '1900-01-01', 'M', 'ACTIVE', NOW(), NOW())",
+            page_size=len(missing),
+            fetch=True,
         )
-        result = cur.fetchone()
-        return result[0] if result else None
+        self.patients.update(created)
 
-    return None
+    def _create_missing_doctors(self, cur, rows: list[OutpatientRow]):
+        """emrDoctorId로도 이름으로도 찾지 못한 의사를 일괄 생성한다."""
+        missing: dict[str, str | None] = {}
+        for r in rows:
+            name = r.doctorName
+            if name and self.doctor_id(name, r.emrDoctorId) is None:
+                missing.setdefault(name, r.emrDoctorId)
+        if not missing:
+            return
 
+        created = execute_values(
+            cur,
+            """INSERT INTO "Doctor" ("id", "name", "emrDoctorId", "isActive", "createdAt", "updatedAt")
+               VALUES %s
+               ON CONFLICT ("emrDoctorId") DO NOTHING
+               RETURNING "name", "id", "emrDoctorId" """,
+            list(missing.items()),
+            template="(gen_random_uuid(), %s, %s, true, NOW(), NOW())",
+            page_size=len(missing),
+            fetch=True,
+        )
+        for name, doctor_id, emr_doctor_id in created:
+            self.doctors_by_name[name] = doctor_id
+            if emr_doctor_id:
+                self.doctors_by_emr_id[emr_doctor_id] = doctor_id
 
-def _find_clinic_room(cur, room_name: str | None) -> str | None:
-    """진료실을 이름으로 조회한다."""
-    if not room_name:
+    def patient_id(self, emr_patient_id: str) -> str | None:
+        return self.patients.get(emr_patient_id)
+
+    def doctor_id(self, doctor_name: str, emr_doctor_id: str | None) -> str | None:
+        """emrDoctorId 우선, 없으면 이름으로 찾는다."""
+        if emr_doctor_id and emr_doctor_id in self.doctors_by_emr_id:
+            return self.doctors_by_emr_id[emr_doctor_id]
+        if doctor_name:
+            return self.doctors_by_name.get(doctor_name)
         return None
-    cur.execute(
-        'SELECT "id" FROM "ClinicRoom" WHERE "name" = %s AND "deletedAt" IS NULL LIMIT 1',
-        (room_name,),
-    )
-    result = cur.fetchone()
-    return result[0] if result else None
 
+    def clinic_room_id(self, room_name: str | None) -> str | None:
+        if not room_name:
+            return None
+        return self.clinic_rooms.get(room_name)
+
+
+def _execute_batch(cur, sql: str, values: dict[str, tuple | list], template: str) -> list[str]:
+    """
+    values를 execute_values 한 번으로 반영한다. 무결성·데이터 오류가 나면 세이브포인트로 되돌리고
+    행마다 다시 실행해 실패한 행만 건너뛴다.
+    Returns: 반영하지 못한 values의 키
+    """
+    cur.execute("SAVEPOINT appointment_batch")
+    try:
+        execute_values(cur, sql, list(values.values()), template=template, page_size=1000)
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        cur.execute("ROLLBACK TO SAVEPOINT appointment_batch")
+        logger.warning(f"예약 일괄 반영 실패, 행 단위로 다시 시도 ({len(values)}건): {e}")
+    else:
+        cur.execute("RELEASE SAVEPOINT appointment_batch")
+        return []
 
-def upsert_appointments(conn, valid_rows: list[dict], import_id: str) -> dict:
-    """외래예약 데이터를 DB에 Upsert 한다."""
+    failed: list[str] = []
+    for key, value in values.items():
+        cur.execute("SAVEPOINT appointment_row")
+        try:
+            execute_values(cur, sql, [value], template=template)
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            cur.execute("ROLLBACK TO SAVEPOINT appointment_row")
+            logger.warning(f"예약 반영 실패, 건너뜀 ({key}): {e}")
+            failed.append(key)
+        else:
+            cur.execute("RELEASE SAVEPOINT appointment_row")
+    cur.execute("RELEASE SAVEPOINT appointment_batch")
+    return failed
+
+
+def upsert_appointments(
+    conn,
+    valid_rows: list[OutpatientRow],
+    import_id: str,
+    unwritten: set[str] | None = None,
+) -> dict:
+    """
+    외래예약 데이터를 DB에 Upsert 한다.
+    참조 데이터는 ReferenceResolver로 미리 읽고, 변경 사항은 모아서
+    신규 INSERT / EMR 덮어쓰기 UPDATE / 충돌 플래그 UPDATE 각 1회로 반영한다.
+    INSERT/UPDATE 중 무결성·데이터 오류가 난 행은 행 단위 재시도에서 걸러 skipped로 센다.
+    파일 내 EMR예약ID 중복은 validate_outpatient_rows에서 이미 걸러진다.
+    unwritten: 환자·의사를 찾지 못하거나 실패해 반영하지 못한 행의 EMR예약ID를 추가한다. (스냅샷 저장 제외용)
+    """
+    if unwritten is None:
+        unwritten = set()
     stats = {"created": 0, "updated": 0, "conflicts": 0, "skipped": 0}
+    if not valid_rows:
+        return stats
 
     with conn.cursor() as cur:
+        refs = ReferenceResolver(cur, valid_rows)
+
+        inserts: dict[str, list] = {}      # emrAppointmentId(없으면 행 키) → INSERT 값
+        updates: dict[str, tuple] = {}     # Appointment.id → UPDATE 값
+        update_keys: dict[str, str] = {}   # Appointment.id → emrAppointmentId
+        conflict_ids: set[str] = set()
+
         for row in valid_rows:
             try:
-                emr_patient_id = row["emrPatientId"]
-                patient_name = row.get("patientName", "")
-                emr_appointment_id = row.get("emrAppointmentId")
-                apt_date = row["appointmentDate"]
-                start_time = row["startTime"]
-                end_time = row["endTime"]
-                doctor_name = row.get("doctorName", "")
-                emr_doctor_id = row.get("emrDoctorId")
-                clinic_room_name = row.get("clinicRoomName")
-                status = row.get("status", "BOOKED")
-                notes = row.get("notes")
-
-                # 환자 조회/생성
-                patient_id = _find_or_create_patient(cur, emr_patient_id, patient_name)
+                emr_patient_id = row.emrPatientId
+                emr_appointment_id = row.emrAppointmentId
+                apt_date = row.appointmentDate
+                doctor_name = row.doctorName or ""
+                status = row.status or "BOOKED"
+                notes = row.notes
+
+                patient_id = refs.patient_id(emr_patient_id)
                 if not patient_id:
                     logger.warning(f"환자 생성 실패: {emr_patient_id}")
                     stats["skipped"] += 1
+                    if emr_appointment_id:
+                        unwritten.add(emr_appointment_id)
                     continue
 
-                # 의사 조회/생성
-                doctor_id = _find_or_create_doctor(cur, doctor_name, emr_doctor_id)
+                doctor_id = refs.doctor_id(doctor_name, row.emrDoctorId)
                 if not doctor_id:
                     logger.warning(f"의사 조회 실패: {doctor_name}")
                     stats["skipped"] += 1
+                    if emr_appointment_id:
+                        unwritten.add(emr_appointment_id)
                     continue
 
-                # 진료실 조회
-                clinic_room_id = _find_clinic_room(cur, clinic_room_name)
+                clinic_room_id = refs.clinic_room_id(row.clinicRoomName)
 
                 # startAt / endAt 조합
-                start_at = f"{apt_date}T{start_time}:00"
-                end_at = f"{apt_date}T{end_time}:00"
-
-                # 기존 예약 조회 (emrAppointmentId 기준)
-                existing = None
-                if emr_appointment_id:
-                    cur.execute(
-                        'SELECT "id", "startAt", "endAt", "doctorId", "status", "source" '
-                        'FROM "Appointment" WHERE "emrAppointmentId" = %s AND "deletedAt" IS NULL LIMIT 1',
-                        (emr_appointment_id,),
-                    )
-                    existing = cur.fetchone()
+                start_at = datetime.fromisoformat(f"{apt_date}T{row.startTime}:00")
+                end_at = datetime.fromisoformat(f"{apt_date}T{row.endTime}:00")
+
+                existing = refs.appointments.get(emr_appointment_id) if emr_appointment_id else None
 
                 if existing:
-                    existing_id = existing[0]
-                    old_start = str(existing[1])
-                    old_end = str(existing[2])
-                    old_doctor = existing[3]
-                    old_status = existing[4]
-                    old_source = existing[5]
+                    existing_id, old_start, old_end, old_doctor, old_status, old_source = existing
 
                     # 변경 감지
-                    changed = False
-                    if start_at not in old_start or end_at not in old_end:
-                        changed = True
-                    if doctor_id != old_doctor:
-                        changed = True
-                    if status != old_status:
-                        changed = True
-
-                    if changed:
+                    changed = (
+                        start_at != old_start
+                        or end_at != old_end
+                        or doctor_id != old_doctor
+                        or status != old_status
+                    )
+
+                    if not changed:
+                        stats["skipped"] += 1
+                    elif old_source == "INTERNAL":
                         # 이미 INTERNAL에서 수정된 경우 → 충돌 플래그 설정
-                        if old_source == "INTERNAL":
-                            cur.execute(
-                                """UPDATE "Appointment"
-                                   SET "conflictFlag" = true,
-                                       "version" = "version" + 1,
-                                       "updatedAt" = NOW()
-                                   WHERE "id" = %s""",
-                                (existing_id,),
-                            )
-                            stats["conflicts"] += 1
-                            logger.info(f"충돌 감지: EMR예약ID={emr_appointment_id}")
-                        else:
-                            # EMR 소스면 덮어쓰기
-                            cur.execute(
-                                """UPDATE "Appointment"
-                                   SET "startAt" = %s, "endAt" = %s, "doctorId" = %s,
-                                       "clinicRoomId" = %s, "status" = %s,
-                                       "notes" = %s, "source" = 'EMR',
-                                       "version" = "version" + 1, "updatedAt" = NOW()
-                                   WHERE "id" = %s""",
-                                (start_at, end_at, doctor_id, clinic_room_id, status, notes, existing_id),
-                            )
-                            stats["updated"] += 1
+                        conflict_ids.add(existing_id)
+                        stats["conflicts"] += 1
+                        logger.info(f"충돌 감지: EMR예약ID={emr_appointment_id}")
                     else:
-                        stats["skipped"] += 1
+                        # EMR 소스면 덮어쓰기
+                        updates[existing_id] = (
+                            existing_id, start_at, end_at, doctor_id, clinic_room_id, status, notes,
+                        )
+                        update_keys[existing_id] = emr_appointment_id
+                        stats["updated"] += 1
                 else:
                     # 신규 생성
-                    cur.execute(
-                        """INSERT INTO "Appointment"
-                           ("id", "emrAppointmentId", "patientId", "doctorId", "clinicRoomId",
-                            "startAt", "endAt", "status", "source", "notes",
-                            "conflictFlag", "version", "createdAt", "updatedAt")
-                           VALUES (gen_random_uuid(), %s, %s, %s, %s,
-                                   %s, %s, %s, 'EMR', %s,
-                                   false, 0, NOW(), NOW())""",
-                        (emr_appointment_id, patient_id, doctor_id, clinic_room_id,
-                         start_at, end_at, status, notes),
+                    key = emr_appointment_id or f"_row{row.row_number}"
+                    inserts[key] = (
+                        emr_appointment_id, patient_id, doctor_id, clinic_room_id,
+                        start_at, end_at, status, notes,
                     )
                     stats["created"] += 1
 
             except Exception as e:
-                logger.warning(f"예약 upsert 실패 (행 {row.get('_row', '?')}): {e}")
+                logger.warning(f"예약 upsert 실패 (행 {row.row_number}): {e}")
                 stats["skipped"] += 1
+                if row.emrAppointmentId:
+                    unwritten.add(row.emrAppointmentId)
                 continue
 
-    conn.commit()
+        if inserts:
+            failed = _execute_batch(
+                cur,
+                """INSERT INTO "Appointment"
+                   ("id", "emrAppointmentId", "patientId", "doctorId", "clinicRoomId",
+                    "startAt", "endAt", "status", "source", "notes",
+                    "conflictFlag", "version", "createdAt", "updatedAt")
+                   VALUES %s""",
+                inserts,
+                template="""(gen_random_uuid(), %s, %s, %s, %s,
+                             %s, %s, %s::"AppointmentStatus", 'EMR', %s,
+                             false, 0, NOW(), NOW())""",
+            )
+            stats["created"] -= len(failed)
+            stats["skipped"] += len(failed)
+            unwritten.update(inserts[key][0] for key in failed if inserts[key][0])
+
+        if updates:
+            failed = _execute_batch(
+                cur,
+                """UPDATE "Appointment" a
+                   SET "startAt" = v."startAt", "endAt" = v."endAt", "doctorId" = v."doctorId",
+                       "clinicRoomId" = v."clinicRoomId", "status" = v."status",
+                       "notes" = v."notes", "source" = 'EMR',
+                       "version" = a."version" + 1, "updatedAt" = NOW()
+                   FROM (VALUES %s) AS v("id", "startAt", "endAt", "doctorId", "clinicRoomId", "status", "notes")
+                   WHERE a."id" = v."id" """,
+                updates,
+                template='(%s, %s::timestamp, %s::timestamp, %s, %s, %s::"AppointmentStatus", %s)',
+            )
+            stats["updated"] -= len(failed)
+            stats["skipped"] += len(failed)
+            unwritten.update(update_keys[key] for key in failed)
+
+        if conflict_ids:
+            cur.execute(
+                """UPDATE "Appointment"
+                   SET "conflictFlag" = true,
+                       "version" = "version" + 1,
+                       "updatedAt" = NOW()
+                   WHERE "id" = ANY(%s)""",
+                (list(conflict_ids),),
+            )
+
     logger.info(f"외래예약 Upsert 완료: {stats}")
     return stats
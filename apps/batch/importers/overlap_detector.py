@@ -0,0 +1,93 @@
+"""
+외래예약 중복 예약(겹침) 검사
+임포트가 끝난 뒤 파일이 다룬 날짜들의 예약을 startAt 순으로 한 번에 읽어
+의사별·진료실별·일자별로 스윕 라인을 돌려 시간이 겹치는 예약을 찾고,
+conflictFlag를 한 번의 UPDATE로 설정한다.
+- 취소(CANCELLED)·부도(NO_SHOW) 예약은 검사하지 않는다
+- 끝나는 시각과 다음 예약의 시작 시각이 같으면 겹침이 아니다
+- 이미 충돌 해결 처리(conflictResolvedAt)된 예약은 다시 플래그하지 않는다
+- 커밋은 호출자(worker)가 수행한다
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def find_overlaps(intervals: Iterable[tuple[Hashable, datetime, datetime]]) -> set:
+    """
+    startAt 오름차순으로 정렬된 (id, start, end) 목록에서 다른 구간과 겹치는 id를 모두 찾는다.
+    정렬은 호출자 책임이다 (정렬되지 않은 입력은 겹침을 놓칠 수 있음).
+    지금까지 가장 늦게 끝나는 구간만 기억하면 되므로 정렬 이후 O(n).
+    현재 구간이 그 구간의 끝보다 먼저 시작하면 두 구간 모두 겹침이다.
+    """
+    overlapping = set()
+    latest_id = None
+    latest_end = None
+    for item_id, start, end in intervals:
+        if latest_end is not None and start < latest_end:
+            overlapping.add(item_id)
+            overlapping.add(latest_id)
+        if latest_end is None or end > latest_end:
+            latest_id, latest_end = item_id, end
+    return overlapping
+
+
+def flag_overlapping_appointments(conn, days: Iterable[str]) -> dict[str, int]:
+    """
+    days(YYYY-MM-DD 목록)의 예약 중 같은 의사 또는 같은 진료실에서 시간이 겹치는 예약에
+    conflictFlag를 설정한다.
+    Returns: {"overlapsFlagged": n}
+    """
+    days = sorted(days)
+    if not days:
+        return {"overlapsFlagged": 0}
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT "id", "doctorId", "clinicRoomId", "startAt", "endAt", "conflictFlag",
+                      "conflictResolvedAt" IS NOT NULL
+               FROM "Appointment"
+               WHERE "deletedAt" IS NULL
+                 AND "status" NOT IN ('CANCELLED', 'NO_SHOW')
+                 AND "startAt" >= %s AND "startAt" < %s
+                 AND "startAt"::date = ANY(%s::date[])
+               ORDER BY "startAt", "id" """,
+            (datetime.fromisoformat(days[0]), datetime.fromisoformat(days[-1]) + timedelta(days=1), days),
+        )
+        rows = cur.fetchall()
+
+        # 이미 startAt 순으로 읽었으므로 그룹별 목록도 정렬된 상태를 유지한다.
+        groups: dict[tuple, list[tuple]] = defaultdict(list)
+        skip_ids: set[str] = set()
+        for apt_id, doctor_id, clinic_room_id, start_at, end_at, flagged, resolved in rows:
+            day = start_at.date()
+            groups[("doctor", doctor_id, day)].append((apt_id, start_at, end_at))
+            if clinic_room_id:
+                groups[("room", clinic_room_id, day)].append((apt_id, start_at, end_at))
+            if flagged or resolved:
+                skip_ids.add(apt_id)
+
+        overlapping: set[str] = set()
+        for intervals in groups.values():
+            if len(intervals) > 1:
+                overlapping |= find_overlaps(intervals)
+
+        to_flag = list(overlapping - skip_ids)
+        if to_flag:
+            cur.execute(
+                """UPDATE "Appointment"
+                   SET "conflictFlag" = true,
+                       "version" = "version" + 1,
+                       "updatedAt" = NOW()
+                   WHERE "id" = ANY(%s)""",
+                (to_flag,),
+            )
+
+    logger.info(
+        f"중복 예약 검사 ({len(days)}일, {days[0]} ~ {days[-1]}): 예약 {len(rows)}건, 겹침 {len(overlapping)}건, "
+        f"신규 플래그 {len(to_flag)}건"
+    )
+    return {"overlapsFlagged": len(to_flag)}
@@ -0,0 +1,192 @@
+"""
+스냅샷 대사 (Reconciliation)
+전체 스냅샷 파일(입원현황 센서스, 외래예약 export) 임포트가 끝난 뒤
+"DB에는 진행 중인데 이번 파일에는 없는" 레코드를 파일 키 staging 테이블과의 anti-join 한 번으로 찾아
+상태를 집합 연산 한 번으로 변경한다.
+- 입원현황: 센서스에서 빠진 환자의 진행 중 Admission → DISCHARGED (병상 EMPTY, BedAssignment 종료)
+  진행 중 상태는 admission_sync.OPEN_STATUSES 하나로 정의한다 (외출·외박(ON_LEAVE), 기타(OTHER) 포함)
+- 외래예약: 파일의 예약일 범위 안에서 export에서 빠진 EMR 예약 → CANCELLED
+- 파일 생성 이후 앱에서 만든 레코드는 대상에서 제외 (createdAt < 파일 수정 시각)
+  createdAt은 Prisma가 UTC로 저장하므로 수정 시각은 UTC aware datetime으로 받아 UTC 기준으로 비교한다
+- 격리(ISOLATION) 병상은 퇴원 처리해도 상태를 EMPTY로 바꾸지 않는다 (admission_sync와 같은 규칙)
+- 대상이 진행 중 레코드의 RECONCILE_MAX_RATIO를 넘으면 잘린 파일로 보고 적용하지 않는다
+- 커밋은 호출자(worker)가 수행한다
+"""
+import csv
+import io
+import logging
+from datetime import datetime, timedelta
+
+from config import RECONCILE_MAX_RATIO
+from importers.admission_sync import OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# 이 건수 이하는 비율과 상관없이 적용 (소규모 병동에서 한두 명 퇴원으로 비율 초과가 나는 것 방지)
+RECONCILE_MIN_GUARD = 5
+
+# 세션 TimeZone과 상관없이 UTC 벽시계 시각(timestamp without time zone)으로 바꿔 createdAt과 비교한다
+_EXPORTED_AT_UTC = "(%(exported_at)s::timestamptz AT TIME ZONE 'UTC')"
+
+_OPEN_ADMISSIONS = """
+    FROM "Admission" a
+    JOIN "Patient" p ON p."id" = a."patientId"
+    WHERE p."emrPatientId" IS NOT NULL
+      AND a."deletedAt" IS NULL
+      AND a."status" = ANY(%(open_statuses)s::"AdmissionStatus"[])
+      AND a."createdAt" < """ + _EXPORTED_AT_UTC
+
+_OPEN_EMR_APPOINTMENTS = """
+    FROM "Appointment" ap
+    WHERE ap."source" = 'EMR'
+      AND ap."emrAppointmentId" IS NOT NULL
+      AND ap."deletedAt" IS NULL
+      AND ap."status" IN ('BOOKED', 'CHANGED')
+      AND ap."startAt" >= %(date_from)s AND ap."startAt" < %(date_to)s
+      AND ap."createdAt" < """ + _EXPORTED_AT_UTC
+
+
+def _copy_key_stage(cur, keys: set[str]):
+    """파일의 키 목록을 COPY로 임시 staging 테이블에 적재한다. (트랜잭션 종료 시 자동 삭제)"""
+    cur.execute('DROP TABLE IF EXISTS _import_keys')
+    cur.execute('CREATE TEMP TABLE _import_keys ("key" TEXT PRIMARY KEY) ON COMMIT DROP')
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for key in keys:
+        writer.writerow((key,))
+    buf.seek(0)
+    cur.copy_expert('COPY _import_keys ("key") FROM STDIN WITH (FORMAT csv)', buf)
+    cur.execute('ANALYZE _import_keys')
+
+
+def _within_guard(label: str, absent: int, total: int) -> bool:
+    """빠진 건수가 진행 중 건수의 RECONCILE_MAX_RATIO 이하인지 확인한다."""
+    if absent <= RECONCILE_MIN_GUARD or absent <= total * RECONCILE_MAX_RATIO:
+        return True
+    logger.error(
+        f"{label} 대사 중단: 파일에서 빠진 {absent}건이 진행 중 {total}건의 "
+        f"{RECONCILE_MAX_RATIO:.0%}를 넘습니다. 잘린 파일일 수 있어 적용하지 않습니다."
+    )
+    return False
+
+
+def _require_aware(exported_at: datetime):
+    if exported_at.tzinfo is None:
+        raise ValueError("exported_at은 시간대가 있는 datetime이어야 합니다 (worker.file_exported_at 참고).")
+
+
+def reconcile_admissions(conn, emr_patient_ids: set[str], exported_at: datetime) -> dict[str, int]:
+    """
+    센서스에 없는 환자의 진행 중 Admission을 퇴원 처리한다.
+    exported_at: 파일 수정 시각 (시간대가 있는 datetime)
+    퇴원일은 파일 수정 일자(입원일처럼 워커 로컬 날짜의 0시), 병상은 EMPTY로 돌리고(격리 병상 제외)
+    열린 BedAssignment를 종료한다.
+    Returns: {"discharged": n, "bedsFreed": n}
+    """
+    _require_aware(exported_at)
+    local_export = exported_at.astimezone().replace(tzinfo=None)
+    params = {
+        "exported_at": exported_at,
+        "open_statuses": list(OPEN_STATUSES),
+        "discharge_date": local_export.replace(hour=0, minute=0, second=0, microsecond=0),
+    }
+    with conn.cursor() as cur:
+        _copy_key_stage(cur, emr_patient_ids)
+
+        cur.execute(
+            f"""SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE NOT EXISTS (
+                           SELECT 1 FROM _import_keys k WHERE k."key" = p."emrPatientId"))
+                {_OPEN_ADMISSIONS}""",
+            params,
+        )
+        total, absent = cur.fetchone()
+        if absent == 0 or not _within_guard("입원", absent, total):
+            return {"discharged": 0, "bedsFreed": 0}
+
+        cur.execute(
+            f"""WITH targets AS (
+                    SELECT a."id", a."currentBedId"
+                    {_OPEN_ADMISSIONS}
+                      AND NOT EXISTS (SELECT 1 FROM _import_keys k WHERE k."key" = p."emrPatientId")
+                    FOR UPDATE OF a
+                ), discharged AS (
+                    UPDATE "Admission" a
+                    SET "status" = 'DISCHARGED',
+                        "dischargeDate" = %(discharge_date)s,
+                        "currentBedId" = NULL,
+                        "version" = a."version" + 1,
+                        "updatedAt" = NOW()
+                    FROM targets t
+                    WHERE a."id" = t."id"
+                    RETURNING a."id"
+                ), freed AS (
+                    UPDATE "Bed" b
+                    SET "status" = 'EMPTY', "version" = b."version" + 1, "updatedAt" = NOW()
+                    FROM targets t
+                    WHERE b."id" = t."currentBedId" AND b."status" <> 'ISOLATION'
+                    RETURNING b."id"
+                ), ended AS (
+                    UPDATE "BedAssignment" ba
+                    SET "endAt" = NOW()
+                    FROM targets t
+                    WHERE ba."admissionId" = t."id" AND ba."endAt" IS NULL
+                    RETURNING ba."id"
+                )
+                SELECT (SELECT COUNT(*) FROM discharged), (SELECT COUNT(*) FROM freed)""",
+            params,
+        )
+        discharged, beds_freed = cur.fetchone()
+
+    logger.info(f"입원 대사: 센서스에서 빠진 {discharged}건 퇴원 처리 (병상 {beds_freed}개 비움)")
+    return {"discharged": discharged, "bedsFreed": beds_freed}
+
+
+def reconcile_appointments(
+    conn,
+    emr_appointment_ids: set[str],
+    date_from: str,
+    date_to: str,
+    exported_at: datetime,
+) -> dict[str, int]:
+    """
+    파일의 예약일 범위(date_from ~ date_to, YYYY-MM-DD) 안에서 export에 없는 EMR 예약을 취소 처리한다.
+    exported_at: 파일 수정 시각 (시간대가 있는 datetime)
+    이미 접수·완료·부도 처리된 예약은 건드리지 않는다.
+    Returns: {"cancelled": n}
+    """
+    _require_aware(exported_at)
+    params = {
+        "exported_at": exported_at,
+        "date_from": datetime.fromisoformat(date_from),
+        "date_to": datetime.fromisoformat(date_to) + timedelta(days=1),
+    }
+    with conn.cursor() as cur:
+        _copy_key_stage(cur, emr_appointment_ids)
+
+        cur.execute(
+            f"""SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE NOT EXISTS (
+                           SELECT 1 FROM _import_keys k WHERE k."key" = ap."emrAppointmentId"))
+                {_OPEN_EMR_APPOINTMENTS}""",
+            params,
+        )
+        total, absent = cur.fetchone()
+        if absent == 0 or not _within_guard("외래예약", absent, total):
+            return {"cancelled": 0}
+
+        cur.execute(
+            f"""UPDATE "Appointment"
+                SET "status" = 'CANCELLED', "version" = "version" + 1, "updatedAt" = NOW()
+                WHERE "id" IN (
+                    SELECT ap."id"
+                    {_OPEN_EMR_APPOINTMENTS}
+                      AND NOT EXISTS (SELECT 1 FROM _import_keys k WHERE k."key" = ap."emrAppointmentId")
+                )""",
+            params,
+        )
+        cancelled = cur.rowcount
+
+    logger.info(f"외래예약 대사: export에서 빠진 EMR 예약 {cancelled}건 취소 ({date_from} ~ {date_to})")
+    return {"cancelled": cancelled}
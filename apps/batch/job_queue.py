@@ -0,0 +1,240 @@
+"""
+Redis 임포트 작업 큐
+스캐너가 수신 완료된 파일을 {path, hash, feed} 작업으로 넣고, 여러 프로세스·호스트의 컨슈머가 가져가 처리한다.
+- 피드마다 FIFO 리스트 하나. 같은 피드의 파일은 순서대로 반영해야 하므로
+  피드 리스(redis Lock)를 잡은 컨슈머 하나만 맨 앞 작업을 처리하고, 다른 피드는 다른 컨슈머가 동시에 처리한다.
+- 리스 만료 시간이 visibility timeout: 컨슈머가 죽으면 만료 후 다른 컨슈머가 같은 작업을 다시 가져간다.
+  처리 중에는 하트비트 스레드가 리스를 연장한다.
+- 실패한 작업은 지수 백오프 후 재시도하고, IMPORT_QUEUE_MAX_ATTEMPTS를 넘으면 dead-letter 리스트로 옮긴다.
+  재시도를 기다리는 동안 같은 피드의 뒤 작업도 기다린다 (순서 보장).
+- 같은 (피드, 해시) 작업은 큐에 한 번만 들어간다.
+
+키 (prefix = IMPORT_QUEUE_PREFIX)
+  {prefix}:{feed}:queue  작업 JSON 리스트 (RPUSH로 넣고 맨 앞부터 처리)
+  {prefix}:{feed}:lease  피드 리스
+  {prefix}:{feed}:head   맨 앞 작업의 시도 횟수·다음 시도 시각·마지막 오류 (HASH)
+  {prefix}:ids           큐에 있는 작업 ID 집합 (중복 투입 방지)
+  {prefix}:dead          dead-letter 작업 JSON 리스트
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any
+
+import redis
+from redis.exceptions import LockError
+from redis.lock import Lock
+
+from config import (
+    IMPORT_QUEUE_BACKOFF_SEC,
+    IMPORT_QUEUE_MAX_ATTEMPTS,
+    IMPORT_QUEUE_PREFIX,
+    IMPORT_QUEUE_VISIBILITY_SEC,
+    REDIS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SEC = 3600
+
+# 작업 ID가 집합에 없을 때만 큐에 넣는다.
+# KEYS: ids, queue / ARGV: job_id, payload
+_ENQUEUE_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# 맨 앞 작업이 아직 payload일 때만 꺼낸다 (리스를 잃은 사이 다른 컨슈머가 이미 끝낸 경우 보호).
+# dead_payload가 있으면 dead-letter 리스트로 옮긴다.
+# KEYS: queue, head, ids, dead / ARGV: payload, job_id, dead_payload('' = 정상 완료)
+_POP_HEAD_SCRIPT = """
+if redis.call('LINDEX', KEYS[1], 0) ~= ARGV[1] then
+    return 0
+end
+redis.call('LPOP', KEYS[1])
+redis.call('DEL', KEYS[2])
+redis.call('SREM', KEYS[3], ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('RPUSH', KEYS[4], ARGV[3])
+end
+return 1
+"""
+
+
+def job_id(feed: str, file_hash: str) -> str:
+    return f"{feed}:{file_hash}"
+
+
+class ClaimedJob:
+    """
+    컨슈머가 가져간 작업. ImportQueue.ack() 또는 fail()로 끝내야 피드 리스가 풀린다.
+    가지고 있는 동안 하트비트 스레드가 visibility_sec / 3마다 리스를 연장한다.
+    """
+
+    def __init__(self, feed: str, payload: str, lease: Lock, attempts: int, visibility_sec: int):
+        self.feed = feed
+        self.payload = payload
+        self.job: dict[str, Any] = json.loads(payload)
+        self.attempts = attempts
+        self._lease = lease
+        self._visibility_sec = visibility_sec
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._extend_lease, name=f"lease-{feed}", daemon=True)
+        self._heartbeat.start()
+
+    def _extend_lease(self):
+        while not self._stop.wait(self._visibility_sec / 3):
+            try:
+                self._lease.extend(self._visibility_sec, replace_ttl=True)
+            except LockError:
+                logger.error(f"[{self.feed}] 작업 리스를 잃었습니다 (다른 컨슈머가 다시 가져갈 수 있음): {self.job['path']}")
+                return
+            except redis.RedisError as e:
+                logger.warning(f"[{self.feed}] 작업 리스 연장 실패, 재시도: {e}")
+
+    def release(self):
+        """하트비트를 멈추고 피드 리스를 반납한다."""
+        self._stop.set()
+        self._heartbeat.join()
+        try:
+            self._lease.release()
+        except LockError:
+            # 이미 만료되어 다른 컨슈머에게 넘어간 리스
+            pass
+
+
+class ImportQueue:
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        prefix: str = IMPORT_QUEUE_PREFIX,
+        visibility_sec: int = IMPORT_QUEUE_VISIBILITY_SEC,
+        max_attempts: int = IMPORT_QUEUE_MAX_ATTEMPTS,
+        backoff_sec: float = IMPORT_QUEUE_BACKOFF_SEC,
+        client: redis.Redis | None = None,
+    ):
+        self.client = client or redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.visibility_sec = visibility_sec
+        self.max_attempts = max_attempts
+        self.backoff_sec = backoff_sec
+        self._enqueue = self.client.register_script(_ENQUEUE_SCRIPT)
+        self._pop_head = self.client.register_script(_POP_HEAD_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def enqueue(self, feed: str, path: str, file_hash: str) -> bool:
+        """작업을 피드 큐 끝에 넣는다. 같은 (피드, 해시) 작업이 이미 큐에 있으면 False."""
+        payload = json.dumps(
+            {"feed": feed, "path": path, "hash": file_hash, "enqueuedAt": time.time()},
+            ensure_ascii=False,
+        )
+        added = self._enqueue(keys=[self._key("ids"), self._key(feed, "queue")], args=[job_id(feed, file_hash), payload])
+        return bool(added)
+
+    def claim(self, feed: str) -> ClaimedJob | None:
+        """
+        피드 리스를 잡고 맨 앞 작업을 가져온다.
+        리스가 다른 컨슈머에 있거나, 큐가 비었거나, 맨 앞 작업이 재시도 대기 중이면 None.
+        """
+        lease = self.client.lock(
+            self._key(feed, "lease"), timeout=self.visibility_sec, blocking=False, thread_local=False,
+        )
+        if not lease.acquire():
+            return None
+
+        try:
+            payload = self.client.lindex(self._key(feed, "queue"), 0)
+            if payload is None:
+                lease.release()
+                return None
+
+            head_key = self._key(feed, "head")
+            not_before = float(self.client.hget(head_key, "notBefore") or 0)
+            if not_before > time.time():
+                lease.release()
+                return None
+
+            # 리스 만료로 다시 가져온 작업도 시도 횟수에 포함된다 (컨슈머를 계속 죽이는 파일 방지)
+            attempts = self.client.hincrby(head_key, "attempts", 1)
+            if attempts > self.max_attempts:
+                last_error = self.client.hget(head_key, "lastError") or "처리 중 컨슈머가 반복해서 중단되었습니다."
+                self._finish(feed, payload, self._dead_payload(payload, attempts - 1, last_error))
+                lease.release()
+                return None
+        except Exception:
+            lease.release()
+            raise
+
+        return ClaimedJob(feed, payload, lease, attempts, self.visibility_sec)
+
+    def ack(self, claimed: ClaimedJob):
+        """작업을 완료 처리하고 리스를 반납한다."""
+        try:
+            self._finish(claimed.feed, claimed.payload)
+        finally:
+            claimed.release()
+
+    def fail(self, claimed: ClaimedJob, error: str) -> str:
+        """
+        작업 실패를 기록하고 리스를 반납한다.
+        시도 횟수가 남았으면 백오프 후 재시도, 아니면 dead-letter로 옮긴다.
+        Returns: "retry" | "dead"
+        """
+        try:
+            if claimed.attempts >= self.max_attempts:
+                self._finish(claimed.feed, claimed.payload, self._dead_payload(claimed.payload, claimed.attempts, error))
+                logger.error(f"[{claimed.feed}] 작업 dead-letter ({claimed.attempts}회 실패): {claimed.job['path']} - {error}")
+                return "dead"
+
+            delay = min(self.backoff_sec * 2 ** (claimed.attempts - 1), MAX_BACKOFF_SEC)
+            self.client.hset(
+                self._key(claimed.feed, "head"),
+                mapping={"notBefore": time.time() + delay, "lastError": error},
+            )
+            logger.warning(
+                f"[{claimed.feed}] 작업 실패 ({claimed.attempts}/{self.max_attempts}), "
+                f"{delay:.0f}초 후 재시도: {claimed.job['path']} - {error}"
+            )
+            return "retry"
+        finally:
+            claimed.release()
+
+    def _finish(self, feed: str, payload: str, dead_payload: str = ""):
+        job = json.loads(payload)
+        removed = self._pop_head(
+            keys=[self._key(feed, "queue"), self._key(feed, "head"), self._key("ids"), self._key("dead")],
+            args=[payload, job_id(feed, job["hash"]), dead_payload],
+        )
+        if not removed:
+            logger.warning(f"[{feed}] 큐 맨 앞 작업이 바뀌어 완료 처리를 건너뜀: {job['path']}")
+
+    @staticmethod
+    def _dead_payload(payload: str, attempts: int, error: str) -> str:
+        job = json.loads(payload)
+        job.update(attempts=attempts, lastError=error, deadAt=time.time())
+        return json.dumps(job, ensure_ascii=False)
+
+    def dead_letters(self, limit: int = 100) -> list[dict[str, Any]]:
+        """dead-letter 작업 목록 (오래된 순)"""
+        return [json.loads(p) for p in self.client.lrange(self._key("dead"), 0, limit - 1)]
+
+    def stats(self, feeds: list[str]) -> dict[str, Any]:
+        """피드별 대기 작업 수·맨 앞 작업 시도 횟수와 dead-letter 수"""
+        pipe = self.client.pipeline(transaction=False)
+        for feed in feeds:
+            pipe.llen(self._key(feed, "queue"))
+            pipe.hget(self._key(feed, "head"), "attempts")
+        pipe.llen(self._key("dead"))
+        values = pipe.execute()
+
+        stats: dict[str, Any] = {}
+        for i, feed in enumerate(feeds):
+            stats[feed] = {"queued": values[2 * i], "headAttempts": int(values[2 * i + 1] or 0)}
+        stats["dead"] = values[-1]
+        return stats
@@ -0,0 +1,205 @@
+"""
+임포트 계측
+파일 1건의 단계별 소요 시간, 처리량(rows/sec), DB 명령 수, 최대 RSS를 모아 Import.statsJson.metrics에 남기고,
+피드별 누적 값을 Prometheus 텍스트 형식으로 로컬 포트(BATCH_METRICS_PORT)에 노출한다.
+- 단계 시간은 perf_counter 누적이라 오버헤드가 작다 (파서는 행마다, 나머지는 청크마다 두 번)
+- 프로세스 풀 자식의 결과는 부모가 file_result로 돌려받아 record_results()로 집계한다
+"""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Iterator
+
+import db
+from config import METRICS_BIND, METRICS_PORT
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 파일 1건 처리 시간 히스토그램 구간 (초)
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+
+
+def peak_rss_mb() -> float | None:
+    """프로세스 최대 RSS (MB). resource 모듈이 없는 플랫폼에서는 None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    if sys.platform == "darwin":
+        peak //= 1024
+    return round(peak / 1024, 1)
+
+
+class ImportMetrics:
+    """파일 1건의 단계별 소요 시간과 DB 명령 수를 모은다."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self._queries_at_start = db.queries_issued()
+
+    def _add(self, name: str, since: float):
+        self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - since
+
+    @contextmanager
+    def stage(self, name: str):
+        """with 블록의 소요 시간을 name 단계에 더한다. (같은 단계를 여러 번 써도 누적)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, started)
+
+    def timed_iter(self, name: str, rows: Iterable[Any]) -> Iterator[Any]:
+        """행 스트림을 감싸 next()에 걸린 시간(파서가 실제로 일한 시간)만 name 단계에 더한다."""
+        it = iter(rows)
+        while True:
+            started = time.perf_counter()
+            try:
+                row = next(it)
+            except StopIteration:
+                self._add(name, started)
+                return
+            self._add(name, started)
+            yield row
+
+    def summary(self, total_rows: int) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "elapsedSec": round(elapsed, 3),
+            "stagesSec": {name: round(sec, 3) for name, sec in self.stages.items()},
+            "rowsPerSec": round(total_rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "queries": db.queries_issued() - self._queries_at_start,
+            "peakRssMb": peak_rss_mb(),
+        }
+
+
+class _Registry:
+    """피드별 누적 메트릭. 스레드(HTTP 핸들러)와 공유하므로 잠금으로 보호한다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files: dict[tuple[str, str], int] = {}
+        self.rows: dict[str, int] = {}
+        self.queries: dict[str, int] = {}
+        self.stage_seconds: dict[tuple[str, str], float] = {}
+        self.duration_buckets: dict[str, list[int]] = {}
+        self.duration_sum: dict[str, float] = {}
+        self.duration_count: dict[str, int] = {}
+        self.last_rows_per_sec: dict[str, float] = {}
+        self.peak_rss_mb: dict[str, float] = {}
+        self.header_layouts: dict[tuple[str, str, str], int] = {}
+
+    def record(self, result: dict[str, Any]):
+        feed, status = result["feed"], result["status"]
+        stats = result.get("stats") or {}
+        m = stats.get("metrics")
+        with self._lock:
+            self.files[(feed, status)] = self.files.get((feed, status), 0) + 1
+            if stats.get("headerLayout"):
+                key = (feed, stats["headerLayout"], "hit" if stats.get("headerLayoutCached") else "miss")
+                self.header_layouts[key] = self.header_layouts.get(key, 0) + 1
+            if not m:
+                return
+            self.rows[feed] = self.rows.get(feed, 0) + stats.get("totalRows", 0)
+            self.queries[feed] = self.queries.get(feed, 0) + m["queries"]
+            for stage, sec in m["stagesSec"].items():
+                self.stage_seconds[(feed, stage)] = self.stage_seconds.get((feed, stage), 0.0) + sec
+
+            elapsed = m["elapsedSec"]
+            buckets = self.duration_buckets.setdefault(feed, [0] * len(DURATION_BUCKETS))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    buckets[i] += 1
+            self.duration_sum[feed] = self.duration_sum.get(feed, 0.0) + elapsed
+            self.duration_count[feed] = self.duration_count.get(feed, 0) + 1
+            self.last_rows_per_sec[feed] = m["rowsPerSec"]
+            if m.get("peakRssMb") is not None:
+                self.peak_rss_mb[feed] = max(self.peak_rss_mb.get(feed, 0.0), m["peakRssMb"])
+
+    def render(self) -> str:
+        """Prometheus 텍스트 노출 형식"""
+        lines: list[str] = []
+
+        def family(name: str, kind: str, help_text: str, samples: Iterable[tuple[str, float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{metric} {value}" for metric, value in samples)
+
+        with self._lock:
+            family("batch_import_files_total", "counter", "Processed import files by feed and status",
+                   ((f'batch_import_files_total{{feed="{f}",status="{s}"}}', n) for (f, s), n in self.files.items()))
+            family("batch_import_rows_total", "counter", "Rows read from import files",
+                   ((f'batch_import_rows_total{{feed="{f}"}}', n) for f, n in self.rows.items()))
+            family("batch_import_queries_total", "counter", "Database commands issued while importing",
+                   ((f'batch_import_queries_total{{feed="{f}"}}', n) for f, n in self.queries.items()))
+            family("batch_import_stage_seconds_total", "counter", "Time spent per import stage",
+                   ((f'batch_import_stage_seconds_total{{feed="{f}",stage="{s}"}}', round(sec, 3))
+                    for (f, s), sec in self.stage_seconds.items()))
+
+            samples: list[tuple[str, float]] = []
+            for feed, buckets in self.duration_buckets.items():
+                for bound, n in zip(DURATION_BUCKETS, buckets):
+                    samples.append((f'batch_import_duration_seconds_bucket{{feed="{feed}",le="{bound}"}}', n))
+                samples.append((f'batch_import_duration_seconds_bucket{{feed="{feed}",le="+Inf"}}',
+                                self.duration_count[feed]))
+                samples.append((f'batch_import_duration_seconds_sum{{feed="{feed}"}}', round(self.duration_sum[feed], 3)))
+                samples.append((f'batch_import_duration_seconds_count{{feed="{feed}"}}', self.duration_count[feed]))
+            family("batch_import_duration_seconds", "histogram", "Wall time per imported file", samples)
+
+            family("batch_import_last_rows_per_second", "gauge", "Throughput of the most recent import",
+                   ((f'batch_import_last_rows_per_second{{feed="{f}"}}', v) for f, v in self.last_rows_per_sec.items()))
+            family("batch_header_layout_total", "counter", "Header layout lookups by fingerprint (hit = cached layout)",
+                   ((f'batch_header_layout_total{{feed="{f}",layout="{l}",result="{r}"}}', n)
+                    for (f, l, r), n in self.header_layouts.items()))
+            family("batch_import_peak_rss_megabytes", "gauge", "Peak RSS of the process that imported the feed",
+                   ((f'batch_import_peak_rss_megabytes{{feed="{f}"}}', v) for f, v in self.peak_rss_mb.items()))
+        return "\n".join(lines) + "\n"
+
+
+registry = _Registry()
+
+
+def record_results(results: list[dict[str, Any]]):
+    """파일별 처리 결과(file_result)를 누적 메트릭에 더한다."""
+    for result in results:
+        registry.record(result)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 스크레이프마다 접근 로그를 남기지 않는다.
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, bind: str = METRICS_BIND) -> ThreadingHTTPServer | None:
+    """/metrics를 백그라운드 스레드에서 제공한다. 포트가 0이거나 이미 사용 중이면 None."""
+    if port <= 0:
+        return None
+    try:
+        server = ThreadingHTTPServer((bind, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"메트릭 서버를 시작하지 못했습니다 ({bind}:{port}): {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"메트릭 서버 시작: http://{bind}:{port}/metrics")
+    return server
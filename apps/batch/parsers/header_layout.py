@@ -0,0 +1,187 @@
+"""
+EMR 엑셀 헤더 레이아웃 레지스트리
+EMR은 피드마다 몇 가지 정해진 헤더 구성으로만 내보내므로, 헤더 행을 정규화한 셀들의 해시(지문)로
+레이아웃을 식별하고 열 매핑(col_map)과 필수 컬럼 누락 여부를 캐시한다.
+- 셀 정규화: 미리 만든 변환 테이블로 전각 영숫자·기호를 반각으로 바꾸고 공백류(전각 공백, NBSP 포함)를 지운다
+  ("환자 번호", "ＥＭＲ＿ＩＤ"도 HEADER_MAP과 매칭). 뒤쪽 빈 셀은 지문에서 제외 (읽기 백엔드마다 행 폭이 다름)
+- 처음 max_scan 행 중 지문이 캐시에 있는 행을 만나면 바로 그 레이아웃을 쓰고,
+  없으면 기존처럼 셀마다 HEADER_MAP을 대조해 min_matches개 이상 맞는 행을 헤더로 보고 새 레이아웃으로 등록한다.
+- 레이아웃은 워커 로컬 상태 DB(SQLite)에 피드별로 보관한다. 프로세스 풀은 실행마다 새로 뜨므로 메모리 캐시만으로는 적중하지 않는다.
+  각 레이아웃에는 만들 때 쓴 매칭 규칙(HEADER_MAP·필수 필드·keep_first·min_matches)의 해시를 함께 저장하고,
+  규칙이 바뀌면(헤더 별칭·필수 컬럼 추가 등) 이전 레이아웃은 적중하지 않아 다시 스캔한다.
+  적중 여부는 Import.statsJson(headerLayout, headerLayoutCached)과 메트릭(batch_header_layout_total)에 남는다.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Any, Iterator, NamedTuple
+
+from config import STATE_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# 전각 ASCII(U+FF01~U+FF5E) → 반각, 공백류 삭제
+_HEADER_TRANSLATION = str.maketrans(
+    {**{chr(code): chr(code - 0xFEE0) for code in range(0xFF01, 0xFF5F)},
+     **{ch: None for ch in " \t\r\n\u3000\u00a0\u200b\ufeff"}}
+)
+
+
+def normalize_header(value: Any) -> str:
+    """헤더 셀 값을 비교용 문자열로 정규화한다. (None → "")"""
+    if value is None:
+        return ""
+    return str(value).translate(_HEADER_TRANSLATION)
+
+
+def fingerprint(cells: tuple[str, ...]) -> str:
+    return hashlib.blake2b("\x1f".join(cells).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class HeaderMatch(NamedTuple):
+    row: int                 # 헤더 행 번호 (1부터)
+    col_map: dict[str, int]  # 내부 필드명 → 열 인덱스(0부터)
+    missing: frozenset[str]  # 누락된 필수 필드
+    layout: str              # 헤더 지문
+    cached: bool             # 등록된 레이아웃으로 찾았는지
+
+    def stats(self) -> dict[str, Any]:
+        return {"headerRow": self.row, "headerLayout": self.layout, "headerLayoutCached": self.cached}
+
+
+class HeaderLayouts:
+    """
+    피드 하나의 헤더 레이아웃 레지스트리.
+    keep_first=True면 같은 필드에 매칭되는 열이 여럿일 때 앞의 열을, False면 뒤의 열을 쓴다.
+    """
+
+    def __init__(
+        self,
+        feed: str,
+        header_map: dict[str, str],
+        required_fields: set[str],
+        keep_first: bool = False,
+        max_scan: int = 10,
+        min_matches: int = 3,
+        db_path: str = STATE_DB_PATH,
+    ):
+        self.feed = feed
+        self.header_map = {normalize_header(k): v for k, v in header_map.items()}
+        self.required_fields = frozenset(required_fields)
+        self.keep_first = keep_first
+        self.max_scan = max_scan
+        self.min_matches = min_matches
+        self.db_path = db_path
+        self.rules = hashlib.blake2b(
+            json.dumps(
+                [sorted(self.header_map.items()), sorted(self.required_fields), keep_first, min_matches],
+                ensure_ascii=False,
+            ).encode("utf-8"),
+            digest_size=8,
+        ).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self._layouts: dict[str, tuple[dict[str, int], frozenset[str]]] | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 규칙 해시가 없던 캐시는 버리고 새로 만든다 (다시 스캔하면 채워짐)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(header_layout)")}
+            if columns and "rules" not in columns:
+                conn.execute("DROP TABLE header_layout")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS header_layout (
+                       feed TEXT NOT NULL,
+                       fingerprint TEXT NOT NULL,
+                       rules TEXT NOT NULL,
+                       col_map TEXT NOT NULL,
+                       missing TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       PRIMARY KEY (feed, fingerprint)
+                   )"""
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._layouts = None
+        return self._conn
+
+    def _load(self) -> dict[str, tuple[dict[str, int], frozenset[str]]]:
+        if self._layouts is None or self._pid != os.getpid():
+            layouts: dict[str, tuple[dict[str, int], frozenset[str]]] = {}
+            try:
+                rows = self._connection().execute(
+                    "SELECT fingerprint, col_map, missing FROM header_layout WHERE feed = ? AND rules = ?",
+                    (self.feed, self.rules),
+                ).fetchall()
+                for fp, col_map, missing in rows:
+                    layouts[fp] = (json.loads(col_map), frozenset(json.loads(missing)))
+            except sqlite3.Error as e:
+                logger.warning(f"[{self.feed}] 헤더 레이아웃 캐시를 읽지 못했습니다 (전체 스캔으로 진행): {e}")
+            self._layouts = layouts
+        return self._layouts
+
+    def _register(self, fp: str, col_map: dict[str, int], missing: frozenset[str]):
+        try:
+            conn = self._connection()
+            conn.execute(
+                """INSERT OR REPLACE INTO header_layout (feed, fingerprint, rules, col_map, missing, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (self.feed, fp, self.rules, json.dumps(col_map), json.dumps(sorted(missing)), time.time()),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[{self.feed}] 헤더 레이아웃 캐시를 기록하지 못했습니다: {e}")
+
+    def _scan(self, cells: tuple[str, ...]) -> dict[str, int]:
+        col_map: dict[str, int] = {}
+        for col_idx, text in enumerate(cells):
+            field = self.header_map.get(text) if text else None
+            if field is None:
+                continue
+            if self.keep_first and field in col_map:
+                continue
+            col_map[field] = col_idx
+        return col_map
+
+    def detect(self, rows: Iterator[tuple]) -> HeaderMatch | None:
+        """
+        행 스트림에서 헤더 행을 찾는다. 헤더가 없으면 None.
+        rows는 헤더 행까지만 소비되므로, 이후 데이터 행은 같은 이터레이터로 이어서 읽는다.
+        """
+        layouts = self._load()
+        for row_idx, values in enumerate(islice(rows, self.max_scan), start=1):
+            cells = tuple(normalize_header(v) for v in values)
+            end = len(cells)
+            while end and not cells[end - 1]:
+                end -= 1
+            cells = cells[:end]
+            if not cells:
+                continue
+
+            fp = fingerprint(cells)
+            known = layouts.get(fp)
+            if known is not None:
+                self.hits += 1
+                return HeaderMatch(row_idx, dict(known[0]), known[1], fp, True)
+
+            col_map = self._scan(cells)
+            if len(col_map) >= self.min_matches:
+                self.misses += 1
+                missing = self.required_fields - col_map.keys()
+                layouts[fp] = (col_map, missing)
+                self._register(fp, col_map, missing)
+                logger.info(f"[{self.feed}] 새 헤더 레이아웃 등록: {fp} ({len(col_map)}개 컬럼)")
+                return HeaderMatch(row_idx, dict(col_map), missing, fp, False)
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -3,10 +3,12 @@
 EMR에서 내보낸 입원환자 목록 XLSX 파일을 파싱한다.
 """
 import logging
-from datetime import datetime
-from typing import Any
+from typing import Any, BinaryIO, Iterator
 
-import openpyxl
+from parsers.header_layout import HeaderLayouts
+from parsers.normalize import parse_date
+from parsers.records import NO_ERRORS, InpatientRow
+from parsers.xlsx_reader import open_sheet
 
 logger = logging.getLogger(__name__)
 
@@ -36,155 +38,123 @@ HEADER_MAP: dict[str, str] = {
 
 REQUIRED_FIELDS = {"emrPatientId", "name", "dob", "sex", "admitDate"}
 
-
-def detect_header_row(ws) -> tuple[int, dict[str, int]]:
-    """
-    워크시트에서 헤더 행을 자동 감지한다.
-    처음 10행 내에서 HEADER_MAP의 키와 3개 이상 매칭되는 행을 헤더로 판단.
-    Returns: (헤더_행_번호, {내부필드명: 열_인덱스})
-    """
-    for row_idx in range(1, min(11, ws.max_row + 1)):
-        col_map: dict[str, int] = {}
-        for col_idx in range(1, ws.max_column + 1):
-            cell_value = ws.cell(row=row_idx, column=col_idx).value
-            if cell_value is None:
-                continue
-            header_text = str(cell_value).strip()
-            if header_text in HEADER_MAP:
-                col_map[HEADER_MAP[header_text]] = col_idx
-
-        if len(col_map) >= 3:
-            return row_idx, col_map
-
-    raise ValueError("헤더 행을 찾을 수 없습니다. EMR 엑셀 파일 형식을 확인하세요.")
+LAYOUTS = HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS)
 
 
-def parse_cell_date(value: Any) -> datetime | None:
-    """셀 값을 datetime으로 변환"""
+def _text(value: Any) -> str | None:
+    """셀 값을 앞뒤 공백을 지운 문자열로. 비어 있으면 None"""
     if value is None:
         return None
-    if isinstance(value, datetime):
-        return value
-    text = str(value).strip()
-    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d"):
-        try:
-            return datetime.strptime(text, fmt)
-        except ValueError:
-            continue
-    return None
-
-
-def parse_row(row_values: dict[str, Any], row_number: int) -> dict[str, Any]:
+    return str(value).strip() or None
+
+
+def parse_row(row_values: dict[str, Any], row_number: int) -> InpatientRow:
     """
-    한 행을 파싱하여 정규화된 딕셔너리를 반환한다.
-    유효성 검사 실패 시 errors 리스트를 포함.
+    한 행을 파싱하여 정규화된 InpatientRow를 반환한다.
+    유효성 검사 실패 시 errors에 메시지를 담는다.
     """
     errors: list[str] = []
-    result: dict[str, Any] = {"_rowNumber": row_number, "_errors": errors}
 
     # emrPatientId
-    emr_id = row_values.get("emrPatientId")
-    if emr_id is None or str(emr_id).strip() == "":
+    emr_id = _text(row_values.get("emrPatientId"))
+    if emr_id is None:
         errors.append("환자번호가 비어있습니다.")
-    else:
-        result["emrPatientId"] = str(emr_id).strip()
 
     # name
-    name = row_values.get("name")
-    if name is None or str(name).strip() == "":
+    name = _text(row_values.get("name"))
+    if name is None:
         errors.append("환자명이 비어있습니다.")
-    else:
-        result["name"] = str(name).strip()
 
     # dob
-    dob = parse_cell_date(row_values.get("dob"))
+    dob = parse_date(row_values.get("dob"))
     if dob is None:
         errors.append("생년월일이 올바르지 않습니다.")
-    else:
-        result["dob"] = dob
 
     # sex
-    sex = row_values.get("sex")
-    if sex is None or str(sex).strip() == "":
+    sex = _text(row_values.get("sex"))
+    if sex is None:
         errors.append("성별이 비어있습니다.")
-    else:
-        sex_str = str(sex).strip()
-        if sex_str in ("남", "M", "male", "남자"):
-            result["sex"] = "M"
-        elif sex_str in ("여", "F", "female", "여자"):
-            result["sex"] = "F"
-        else:
-            result["sex"] = sex_str
+    elif sex in ("남", "M", "male", "남자"):
+        sex = "M"
+    elif sex in ("여", "F", "female", "여자"):
+        sex = "F"
 
     # phone (optional)
-    phone = row_values.get("phone")
-    if phone is not None and str(phone).strip():
-        result["phone"] = str(phone).strip().replace("-", "")
+    phone = _text(row_values.get("phone"))
+    if phone is not None:
+        phone = phone.replace("-", "")
 
     # admitDate
-    admit_date = parse_cell_date(row_values.get("admitDate"))
+    admit_date = parse_date(row_values.get("admitDate"))
     if admit_date is None:
         errors.append("입원일이 올바르지 않습니다.")
-    else:
-        result["admitDate"] = admit_date
-
-    # plannedDischargeDate (optional)
-    planned = parse_cell_date(row_values.get("plannedDischargeDate"))
-    if planned:
-        result["plannedDischargeDate"] = planned
 
-    # attendingDoctor (optional)
-    doctor = row_values.get("attendingDoctor")
-    if doctor and str(doctor).strip():
-        result["attendingDoctor"] = str(doctor).strip()
+    return InpatientRow(
+        row_number=row_number,
+        emrPatientId=emr_id,
+        name=name,
+        dob=dob,
+        sex=sex,
+        phone=phone,
+        admitDate=admit_date,
+        # optional
+        plannedDischargeDate=parse_date(row_values.get("plannedDischargeDate")),
+        attendingDoctor=_text(row_values.get("attendingDoctor")),
+        wardName=_text(row_values.get("wardName")),
+        roomName=_text(row_values.get("roomName")),
+        bedLabel=_text(row_values.get("bedLabel")),
+        notes=_text(row_values.get("notes")),
+        errors=tuple(errors) if errors else NO_ERRORS,
+    )
+
+
+def iter_inpatient_rows(
+    source: str | BinaryIO,
+    header_stats: dict[str, Any] | None = None,
+) -> Iterator[InpatientRow]:
+    """
+    입원현황 엑셀 파일을 한 번만 순차로 읽으며 파싱된 행을 하나씩 반환한다.
+    source는 파일 경로 또는 이미 읽어 둔 버퍼 스트림(ExportFile.open())이다.
+    행 스트림 하나로 헤더 감지와 행 추출을 모두 처리하며, 헤더를 찾은 뒤에는
+    매핑된 열만 읽도록 리더에 알린다 (xlsx_reader 참고).
+    header_stats를 넘기면 헤더 행 번호와 레이아웃 지문·캐시 적중 여부를 채운다.
+    """
+    logger.info(f"파싱 시작: {source if isinstance(source, str) else '메모리 버퍼'}")
+    with open_sheet(source) as sheet:
+        rows = iter(sheet)
+        header = LAYOUTS.detect(rows)
+        if header is None:
+            raise ValueError("헤더 행을 찾을 수 없습니다. EMR 엑셀 파일 형식을 확인하세요.")
+        header_row, col_map = header.row, header.col_map
+        logger.info(f"헤더 행: {header_row}, 레이아웃: {header.layout}{' (캐시)' if header.cached else ''}, 매핑: {col_map}")
+        if header_stats is not None:
+            header_stats.update(header.stats())
+
+        # 필수 필드 검증
+        if header.missing:
+            raise ValueError(f"필수 컬럼이 누락되었습니다: {set(header.missing)}")
+
+        sheet.select_columns(col_map.values())
+        first_col = next(iter(col_map.values()))
+        count = 0
+        for row_idx, values in enumerate(rows, start=header_row + 1):
+            # 빈 행 건너뛰기
+            if first_col >= len(values) or values[first_col] is None:
+                continue
 
-    # ward/room/bed (optional)
-    for field in ("wardName", "roomName", "bedLabel"):
-        val = row_values.get(field)
-        if val and str(val).strip():
-            result[field] = str(val).strip()
+            row_values: dict[str, Any] = {
+                field_name: values[col_idx] if col_idx < len(values) else None
+                for field_name, col_idx in col_map.items()
+            }
 
-    # notes (optional)
-    notes = row_values.get("notes")
-    if notes and str(notes).strip():
-        result["notes"] = str(notes).strip()
+            count += 1
+            yield parse_row(row_values, row_idx)
 
-    return result
+    logger.info(f"파싱 완료: {count}건")
 
 
-def parse_inpatient_file(file_path: str) -> list[dict[str, Any]]:
+def parse_inpatient_file(source: str | BinaryIO) -> list[InpatientRow]:
     """
     입원현황 엑셀 파일을 파싱하여 행 데이터 리스트를 반환한다.
     """
-    logger.info(f"파싱 시작: {file_path}")
-    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-    ws = wb.active
-
-    if ws is None:
-        raise ValueError("워크시트를 찾을 수 없습니다.")
-
-    header_row, col_map = detect_header_row(ws)
-    logger.info(f"헤더 행: {header_row}, 매핑: {col_map}")
-
-    # 필수 필드 검증
-    missing = REQUIRED_FIELDS - set(col_map.keys())
-    if missing:
-        raise ValueError(f"필수 컬럼이 누락되었습니다: {missing}")
-
-    rows: list[dict[str, Any]] = []
-    for row_idx in range(header_row + 1, ws.max_row + 1):
-        # 빈 행 건너뛰기
-        first_val = ws.cell(row=row_idx, column=list(col_map.values())[0]).value
-        if first_val is None:
-            continue
-
-        row_values: dict[str, Any] = {}
-        for field_name, col_idx in col_map.items():
-            row_values[field_name] = ws.cell(row=row_idx, column=col_idx).value
-
-        parsed = parse_row(row_values, row_idx)
-        rows.append(parsed)
-
-    wb.close()
-    logger.info(f"파싱 완료: {len(rows)}건")
-    return rows
+    return list(iter_inpatient_rows(source))
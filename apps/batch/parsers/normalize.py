@@ -0,0 +1,158 @@
+"""
+셀 값 정규화 (날짜·시간·예약상태)
+입원/외래 파서가 함께 쓴다. 기존 strptime 형식 목록과 같은 입력을 받되
+- 형식마다 strptime을 시도하고 예외로 다음 형식으로 넘어가는 대신, 미리 컴파일한 정규식 한 번으로 판별한다
+  (각 필드 패턴은 strptime의 %Y/%m/%d/%H/%M/%S 패턴과 같다)
+- 생년월일·예약일처럼 같은 값이 반복되므로 원본 셀 값을 키로 LRU 캐시한다
+- 날짜 서식이 없는 숫자 셀은 Excel 일련번호(1900 기준)로 해석한다.
+  단 기존처럼 날짜 열의 정수가 YYYYMMDD로 읽히면 그대로 쓰고, 시간 열의 정수는 HHMM(930, 1430)으로 본다
+"""
+import re
+from datetime import datetime, time
+from functools import lru_cache
+from typing import Any
+
+from openpyxl.utils.datetime import from_excel
+
+_Y = r"(\d\d\d\d)"
+_M = r"(1[0-2]|0[1-9]|[1-9])"
+_D = r"(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+_HH = r"(2[0-3]|[0-1]\d|\d)"
+_MM = r"([0-5]\d|\d)"
+# strptime은 60·61초도 패턴으로는 받지만 datetime 생성에서 실패하므로 0~59만 허용한다
+_SS = r"([0-5]\d|\d)"
+
+# %Y-%m-%d, %Y/%m/%d, %Y.%m.%d (구분자는 한 종류만)
+_DATE_SEP_RE = re.compile(rf"{_Y}([-/.]){_M}\2{_D}")
+# %Y%m%d
+_DATE_COMPACT_RE = re.compile(rf"{_Y}{_M}{_D}")
+# %H:%M:%S, %H:%M
+_TIME_COLON_RE = re.compile(rf"{_HH}:{_MM}(?::{_SS})?")
+# %H%M
+_TIME_COMPACT_RE = re.compile(rf"{_HH}{_MM}")
+
+# Excel 일련번호 범위 (1900-01-01 ~ 9999-12-31)
+_MAX_SERIAL = 2958466
+
+STATUS_MAP: dict[str, str] = {
+    "예약": "BOOKED",
+    "BOOKED": "BOOKED",
+    "접수": "CHECKED_IN",
+    "CHECKED_IN": "CHECKED_IN",
+    "완료": "COMPLETED",
+    "COMPLETED": "COMPLETED",
+    "취소": "CANCELLED",
+    "CANCELLED": "CANCELLED",
+    "미방문": "NO_SHOW",
+    "NO_SHOW": "NO_SHOW",
+    "변경": "CHANGED",
+    "CHANGED": "CHANGED",
+}
+
+CACHE_SIZE = 65536
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _date_from_text(text: str) -> datetime | None:
+    match = _DATE_SEP_RE.fullmatch(text)
+    if match:
+        year, _, month, day = match.groups()
+    else:
+        match = _DATE_COMPACT_RE.fullmatch(text)
+        if not match:
+            return None
+        year, month, day = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day))
+    except ValueError:
+        # 2월 30일 등 존재하지 않는 날짜
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def _parse_date_cached(value: Any) -> datetime | None:
+    if _is_number(value):
+        if isinstance(value, int):
+            # 20240102, 2024112 같은 정수는 기존 %Y%m%d 해석을 우선한다
+            parsed = _date_from_text(str(value))
+            if parsed:
+                return parsed
+        if 1 <= value < _MAX_SERIAL:
+            serial = from_excel(value)
+            return serial if isinstance(serial, datetime) else None
+        return None
+    return _date_from_text(str(value).strip())
+
+
+def parse_date(value: Any) -> datetime | None:
+    """셀 값을 datetime으로 변환한다. 변환할 수 없으면 None."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return _parse_date_cached(value)
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def _format_date_cached(value: Any) -> str | None:
+    parsed = _parse_date_cached(value)
+    return parsed.strftime("%Y-%m-%d") if parsed else None
+
+
+def format_date(value: Any) -> str | None:
+    """셀 값을 YYYY-MM-DD 문자열로 변환한다. 변환할 수 없으면 None."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    return _format_date_cached(value)
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def _format_time_cached(value: Any) -> str | None:
+    if isinstance(value, float):
+        if not 0 <= value < _MAX_SERIAL:
+            return None
+        serial = from_excel(value)
+        return serial.strftime("%H:%M")
+
+    text = str(value).strip()
+    match = _TIME_COLON_RE.fullmatch(text) or _TIME_COMPACT_RE.fullmatch(text)
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{int(match.group(2)):02d}"
+
+
+def format_time(value: Any) -> str | None:
+    """셀 값을 HH:MM 문자열로 변환한다. 변환할 수 없으면 None."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, time)):
+        return value.strftime("%H:%M")
+    return _format_time_cached(value)
+
+
+def normalize_status(value: Any) -> str:
+    """EMR 예약 상태를 시스템 상태로 매핑한다. 비어 있거나 모르는 값은 BOOKED."""
+    if not value:
+        return "BOOKED"
+    return STATUS_MAP.get(str(value).strip().upper(), "BOOKED")
+
+
+def clear_caches():
+    """정규화 캐시를 비운다 (벤치마크용)"""
+    _parse_date_cached.cache_clear()
+    _format_date_cached.cache_clear()
+    _format_time_cached.cache_clear()
+
+
+def cache_info() -> dict[str, Any]:
+    """정규화 캐시 적중 통계 (벤치마크·디버깅용)"""
+    return {
+        "date": _parse_date_cached.cache_info()._asdict(),
+        "dateText": _format_date_cached.cache_info()._asdict(),
+        "time": _format_time_cached.cache_info()._asdict(),
+    }
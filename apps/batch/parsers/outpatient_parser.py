@@ -1,11 +1,14 @@
 """
 외래예약 엑셀 파서
-EMR에서 내보낸 외래예약 엑셀 파일을 파싱하여 dict 리스트로 변환한다.
+EMR에서 내보낸 외래예약 엑셀 파일을 파싱하여 OutpatientRow 목록으로 변환한다.
 """
 import logging
-from datetime import datetime
+from typing import Any, BinaryIO, Iterator
 
-from openpyxl import load_workbook
+from parsers.header_layout import HeaderLayouts
+from parsers.normalize import format_date, format_time, normalize_status
+from parsers.records import OutpatientRow
+from parsers.xlsx_reader import open_sheet
 
 logger = logging.getLogger("parser.outpatient")
 
@@ -43,157 +46,108 @@ HEADER_MAP: dict[str, str] = {
 
 REQUIRED_FIELDS = {"emrPatientId", "patientName", "appointmentDate", "startTime"}
 
-
-def _detect_header_row(ws, max_scan: int = 10) -> tuple[int, dict[str, int]]:
-    """첫 10행 내에서 헤더 행을 자동 감지한다."""
-    for row_idx in range(1, max_scan + 1):
-        cells = [str(cell.value or "").strip() for cell in ws[row_idx]]
-        mapping: dict[str, int] = {}
-        for col_idx, cell_val in enumerate(cells):
-            if cell_val in HEADER_MAP:
-                field = HEADER_MAP[cell_val]
-                if field not in mapping:
-                    mapping[field] = col_idx
-        if len(mapping) >= 3:
-            return row_idx, mapping
-    raise ValueError("헤더 행을 찾을 수 없습니다. EMR 외래예약 엑셀 형식을 확인하세요.")
-
-
-def _normalize_date(value) -> str | None:
-    """날짜 값을 YYYY-MM-DD 문자열로 변환한다."""
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value.strftime("%Y-%m-%d")
-    s = str(value).strip()
-    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d"):
-        try:
-            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
-        except ValueError:
-            continue
-    return None
-
-
-def _normalize_time(value) -> str | None:
-    """시간 값을 HH:MM 문자열로 변환한다."""
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value.strftime("%H:%M")
-    s = str(value).strip()
-    # HH:MM:SS or HH:MM
-    for fmt in ("%H:%M:%S", "%H:%M", "%H%M"):
-        try:
-            return datetime.strptime(s, fmt).strftime("%H:%M")
-        except ValueError:
-            continue
-    return None
-
-
-def _normalize_status(value) -> str:
-    """EMR 상태를 시스템 상태로 매핑한다."""
-    if not value:
-        return "BOOKED"
-    s = str(value).strip().upper()
-    status_map = {
-        "예약": "BOOKED",
-        "BOOKED": "BOOKED",
-        "접수": "CHECKED_IN",
-        "CHECKED_IN": "CHECKED_IN",
-        "완료": "COMPLETED",
-        "COMPLETED": "COMPLETED",
-        "취소": "CANCELLED",
-        "CANCELLED": "CANCELLED",
-        "미방문": "NO_SHOW",
-        "NO_SHOW": "NO_SHOW",
-        "변경": "CHANGED",
-        "CHANGED": "CHANGED",
-    }
-    return status_map.get(s, "BOOKED")
-
-
-def parse_outpatient_file(file_path: str) -> list[dict]:
-    """외래예약 엑셀 파일을 파싱하여 dict 리스트를 반환한다."""
-    logger.info(f"외래예약 파싱 시작: {file_path}")
-    wb = load_workbook(file_path, read_only=True, data_only=True)
-    ws = wb.active
-
-    try:
-        header_row, col_map = _detect_header_row(ws)
-    except ValueError as e:
-        logger.error(str(e))
-        return []
-
-    logger.info(f"헤더 감지 완료 (행 {header_row}): {list(col_map.keys())}")
-
-    rows = []
-    for row_idx, row in enumerate(ws.iter_rows(min_row=header_row + 1), start=header_row + 1):
-        cells = [cell.value for cell in row]
-
-        # 빈 행 건너뛰기
-        if all(c is None for c in cells):
-            continue
-
-        try:
-            record: dict = {"_row": row_idx}
-
-            for field, col_idx in col_map.items():
-                val = cells[col_idx] if col_idx < len(cells) else None
-                record[field] = val
-
-            # 필수 필드 확인
-            emr_id = str(record.get("emrPatientId", "") or "").strip()
-            if not emr_id:
-                record["_error"] = "환자번호 누락"
-                rows.append(record)
+# 같은 필드에 매칭되는 열이 여럿이면 앞의 열을 쓴다
+LAYOUTS = HeaderLayouts("OUTPATIENT", HEADER_MAP, REQUIRED_FIELDS, keep_first=True)
+
+
+def iter_outpatient_rows(source: str | BinaryIO, header_stats: dict[str, Any] | None = None) -> Iterator[OutpatientRow]:
+    """
+    외래예약 엑셀 파일을 한 번만 순차로 읽으며 파싱된 행을 하나씩 반환한다.
+    source는 파일 경로 또는 이미 읽어 둔 버퍼 스트림(ExportFile.open())이다.
+    header_stats를 넘기면 헤더 행 번호와 레이아웃 지문·캐시 적중 여부를 채운다.
+    """
+    logger.info(f"외래예약 파싱 시작: {source if isinstance(source, str) else '메모리 버퍼'}")
+    with open_sheet(source) as sheet:
+        rows = iter(sheet)
+        header = LAYOUTS.detect(rows)
+        if header is None:
+            logger.error("헤더 행을 찾을 수 없습니다. EMR 외래예약 엑셀 형식을 확인하세요.")
+            return
+        header_row, col_map = header.row, header.col_map
+        if header_stats is not None:
+            header_stats.update(header.stats())
+
+        logger.info(
+            f"헤더 감지 완료 (행 {header_row}, 레이아웃 {header.layout}{' 캐시' if header.cached else ''}): "
+            f"{list(col_map.keys())}"
+        )
+        sheet.select_columns(col_map.values())
+
+        count = 0
+        for row_idx, cells in enumerate(rows, start=header_row + 1):
+            # 빈 행 건너뛰기
+            if all(c is None for c in cells):
                 continue
 
-            record["emrPatientId"] = emr_id
-            record["patientName"] = str(record.get("patientName", "") or "").strip()
+            count += 1
+            yield _parse_record(cells, col_map, row_idx)
 
-            # 날짜 정규화
-            apt_date = _normalize_date(record.get("appointmentDate"))
-            if not apt_date:
-                record["_error"] = "예약일 형식 오류"
-                rows.append(record)
-                continue
-            record["appointmentDate"] = apt_date
+    logger.info(f"외래예약 파싱 완료: {count}행")
 
-            # 시간 정규화
-            start_time = _normalize_time(record.get("startTime"))
-            if not start_time:
-                record["_error"] = "시작시간 형식 오류"
-                rows.append(record)
-                continue
-            record["startTime"] = start_time
-
-            end_time = _normalize_time(record.get("endTime"))
-            if not end_time:
-                # 기본 30분 진료
-                h, m = map(int, start_time.split(":"))
-                m += 30
-                if m >= 60:
-                    h += 1
-                    m -= 60
-                end_time = f"{h:02d}:{m:02d}"
-            record["endTime"] = end_time
-
-            # 상태 정규화
-            record["status"] = _normalize_status(record.get("status"))
-
-            # 기타 필드
-            record["doctorName"] = str(record.get("doctorName", "") or "").strip()
-            record["emrDoctorId"] = str(record.get("emrDoctorId", "") or "").strip() or None
-            record["clinicRoomName"] = str(record.get("clinicRoomName", "") or "").strip() or None
-            record["notes"] = str(record.get("notes", "") or "").strip() or None
-            record["emrAppointmentId"] = str(record.get("emrAppointmentId", "") or "").strip() or None
-
-            rows.append(record)
-
-        except Exception as e:
-            logger.warning(f"행 {row_idx} 파싱 실패: {e}")
-            rows.append({"_row": row_idx, "_error": f"파싱 오류: {str(e)}"})
-
-    wb.close()
-    logger.info(f"외래예약 파싱 완료: {len(rows)}행")
-    return rows
+
+def _parse_record(cells: tuple, col_map: dict[str, int], row_idx: int) -> OutpatientRow:
+    """
+    한 행을 정규화된 OutpatientRow로 변환한다.
+    오류 시 errors에 메시지를 담고, 아직 정규화하지 않은 필드는 원본 셀 값으로 둔다.
+    """
+    try:
+        record: dict = {}
+
+        for field, col_idx in col_map.items():
+            val = cells[col_idx] if col_idx < len(cells) else None
+            record[field] = val
+
+        # 필수 필드 확인
+        emr_id = str(record.get("emrPatientId", "") or "").strip()
+        if not emr_id:
+            return OutpatientRow(row_idx, **record, errors=("환자번호 누락",))
+
+        record["emrPatientId"] = emr_id
+        record["patientName"] = str(record.get("patientName", "") or "").strip()
+
+        # 날짜 정규화
+        apt_date = format_date(record.get("appointmentDate"))
+        if not apt_date:
+            return OutpatientRow(row_idx, **record, errors=("예약일 형식 오류",))
+        record["appointmentDate"] = apt_date
+
+        # 시간 정규화
+        start_time = format_time(record.get("startTime"))
+        if not start_time:
+            return OutpatientRow(row_idx, **record, errors=("시작시간 형식 오류",))
+        record["startTime"] = start_time
+
+        end_time = format_time(record.get("endTime"))
+        if not end_time:
+            # 기본 30분 진료
+            h, m = map(int, start_time.split(":"))
+            m += 30
+            if m >= 60:
+                h += 1
+                m -= 60
+            end_time = f"{h:02d}:{m:02d}"
+        record["endTime"] = end_time
+
+        # 상태 정규화
+        record["status"] = normalize_status(record.get("status"))
+
+        # 기타 필드
+        record["doctorName"] = str(record.get("doctorName", "") or "").strip()
+        record["emrDoctorId"] = str(record.get("emrDoctorId", "") or "").strip() or None
+        record["clinicRoomName"] = str(record.get("clinicRoomName", "") or "").strip() or None
+        record["notes"] = str(record.get("notes", "") or "").strip() or None
+        record["emrAppointmentId"] = str(record.get("emrAppointmentId", "") or "").strip() or None
+
+        return OutpatientRow(row_idx, **record)
+
+    except Exception as e:
+        logger.warning(f"행 {row_idx} 파싱 실패: {e}")
+        return OutpatientRow(row_idx, errors=(f"파싱 오류: {str(e)}",))
+
+
+def parse_outpatient_file(source: str | BinaryIO) -> list[OutpatientRow]:
+    """
+    외래예약 엑셀 파일을 파싱하여 OutpatientRow 목록을 반환한다.
+    source는 파일 경로 또는 이미 읽어 둔 버퍼 스트림(ExportFile.open())이다.
+    """
+    return list(iter_outpatient_rows(source))
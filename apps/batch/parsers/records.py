@@ -0,0 +1,67 @@
+"""
+파싱된 행 레코드
+파서가 만든 행을 검증·스냅샷 비교·임포터까지 그대로 넘기는 튜플 기반 레코드.
+행마다 dict(+ _errors 리스트)를 만들던 방식보다 행당 메모리가 훨씬 작고, 필드 오타는 AttributeError로 바로 드러난다.
+- 업무 필드는 EMR/DB 필드명(camelCase)을 그대로 쓴다 (FeedSnapshot의 key_field 등에서 getattr로 조회)
+- row_number: 엑셀 행 번호, errors: 파서 오류 메시지 (없으면 공유 빈 튜플 NO_ERRORS)
+- 파서 오류가 있는 행은 정규화 전 원본 셀 값이 필드에 남아 있을 수 있다 (오류 원본 행 기록용)
+"""
+from datetime import datetime
+from typing import Any, NamedTuple
+
+# 오류 없음 (모든 정상 행이 같은 빈 튜플을 공유한다)
+NO_ERRORS: tuple[str, ...] = ()
+
+
+class InpatientRow(NamedTuple):
+    row_number: int
+    emrPatientId: str | None = None
+    name: str | None = None
+    dob: datetime | None = None
+    sex: str | None = None
+    phone: str | None = None
+    admitDate: datetime | None = None
+    plannedDischargeDate: datetime | None = None
+    attendingDoctor: str | None = None
+    wardName: str | None = None
+    roomName: str | None = None
+    bedLabel: str | None = None
+    notes: str | None = None
+    errors: tuple[str, ...] = NO_ERRORS
+
+    def data(self) -> dict[str, Any]:
+        """값이 있는 업무 필드 (스냅샷 해시·오류 원본 행용, 기존 파서 dict와 같은 키 구성)"""
+        return {
+            field: value
+            for field, value in zip(self._fields[1:-1], self[1:-1])
+            if value is not None
+        }
+
+
+class OutpatientRow(NamedTuple):
+    row_number: int
+    emrPatientId: str | None = None
+    patientName: str | None = None
+    appointmentDate: str | None = None
+    startTime: str | None = None
+    endTime: str | None = None
+    doctorName: str | None = None
+    emrDoctorId: str | None = None
+    clinicRoomName: str | None = None
+    status: str | None = None
+    notes: str | None = None
+    emrAppointmentId: str | None = None
+    errors: tuple[str, ...] = NO_ERRORS
+
+    def data(self) -> dict[str, Any]:
+        """업무 필드 전체 (스냅샷 해시·오류 원본 행용, 기존 파서 dict와 같은 키 구성)"""
+        return dict(zip(self._fields[1:-1], self[1:-1]))
+
+
+ParsedRow = InpatientRow | OutpatientRow
+
+
+class RowError(NamedTuple):
+    """검증에서 걸러진 행과 오류 메시지 (파서 오류 포함)"""
+    row: ParsedRow
+    errors: list[str]
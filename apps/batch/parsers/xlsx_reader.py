@@ -0,0 +1,319 @@
+"""
+XLSX 시트 읽기 백엔드
+파서는 open_sheet()로 활성 시트를 열어 행 튜플 스트림을 받는다. 백엔드는 BATCH_XLSX_READER로 고른다.
+- openpyxl (기본): load_workbook(read_only=True, data_only=True)의 iter_rows(values_only=True)
+- iterparse: xlsx zip에서 시트 XML을 ElementTree.iterparse로 직접 스트리밍한다.
+  셀 객체와 스타일 객체를 만들지 않고, 공유 문자열은 필요한 인덱스까지만 읽으며,
+  헤더 감지 후 select_columns()로 지정한 열만 값으로 변환한다.
+두 백엔드는 같은 값을 돌려준다 (날짜 서식 숫자 → datetime/time, 정수/실수, bool, 문자열).
+행 번호가 어긋나지 않도록 XML에 없는 빈 행도 빈 튜플로 돌려준다.
+"""
+import posixpath
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, BinaryIO, Iterable, Iterator
+from xml.etree import ElementTree as ET
+
+import openpyxl
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+from config import XLSX_READER
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW = f"{_NS_MAIN}row"
+_CELL = f"{_NS_MAIN}c"
+_VALUE = f"{_NS_MAIN}v"
+_INLINE = f"{_NS_MAIN}is"
+_TEXT = f"{_NS_MAIN}t"
+_RUN = f"{_NS_MAIN}r"
+_SHEET_DATA = f"{_NS_MAIN}sheetData"
+_SHARED_ITEM = f"{_NS_MAIN}si"
+_SST = f"{_NS_MAIN}sst"
+
+_REL_SHARED_STRINGS = "/sharedStrings"
+_REL_STYLES = "/styles"
+
+# select_columns()에서 빠진 열에 값이 있으면 읽지 않고 이 값을 넣는다.
+# 파서는 매핑된 열만 보므로, "값이 전혀 없는 행" 판정만 openpyxl 백엔드와 같게 유지하는 용도다.
+UNREAD = object()
+
+
+def _package_path(target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def active_sheet_path(zf: zipfile.ZipFile) -> str:
+    """workbook.xml과 관계 파일에서 활성 시트의 zip 내부 경로를 찾는다."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = workbook.findall(f"{_NS_MAIN}sheets/{_NS_MAIN}sheet")
+    if not sheets:
+        raise ValueError("워크시트를 찾을 수 없습니다.")
+
+    active_tab = 0
+    view = workbook.find(f"{_NS_MAIN}bookViews/{_NS_MAIN}workbookView")
+    if view is not None:
+        active_tab = int(view.get("activeTab", "0"))
+    if active_tab >= len(sheets):
+        active_tab = 0
+    rel_id = sheets[active_tab].get(f"{_NS_REL}id")
+
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+        if rel.get("Id") == rel_id:
+            return _package_path(rel.get("Target", ""))
+    raise ValueError(f"시트 관계를 찾을 수 없습니다: {rel_id}")
+
+
+def _rich_text(node: ET.Element) -> str:
+    """<si>/<is>의 문자열: 직접 <t> + 서식 run(<r><t>)을 이어 붙인다. 윗주(<rPh>)는 제외."""
+    parts = []
+    for child in node:
+        if child.tag == _TEXT:
+            parts.append(child.text or "")
+        elif child.tag == _RUN:
+            text = child.find(_TEXT)
+            if text is not None:
+                parts.append(text.text or "")
+    return "".join(parts)
+
+
+def _cast_number(text: str) -> int | float:
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+class SheetReader(ABC):
+    """활성 시트의 행 스트림. with 블록 또는 close()로 닫는다."""
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[tuple]:
+        """행 튜플을 순서대로 반환한다."""
+
+    def select_columns(self, columns: Iterable[int]):
+        """이후 읽는 행에서 값을 변환할 열(0부터)을 지정한다. 백엔드에 따라 무시될 수 있다."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OpenpyxlSheetReader(SheetReader):
+    def __init__(self, source: str | BinaryIO):
+        self._wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        if self._wb.active is None:
+            self._wb.close()
+            raise ValueError("워크시트를 찾을 수 없습니다.")
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self._wb.active.iter_rows(values_only=True)
+
+    def close(self):
+        self._wb.close()
+
+
+class _SharedStrings:
+    """공유 문자열 테이블. 요청된 인덱스까지만 XML을 읽어 둔다."""
+
+    def __init__(self, zf: zipfile.ZipFile, path: str | None):
+        self._strings: list[str] = []
+        self._file = zf.open(path) if path else None
+        self._events = ET.iterparse(self._file, events=("start", "end")) if self._file else iter(())
+        self._root: ET.Element | None = None
+
+    def __getitem__(self, index: int) -> str:
+        strings = self._strings
+        while index >= len(strings):
+            try:
+                event, elem = next(self._events)
+            except StopIteration:
+                raise ValueError(f"공유 문자열 인덱스가 범위를 벗어났습니다: {index}") from None
+            if event == "start":
+                if elem.tag == _SST:
+                    self._root = elem
+            elif elem.tag == _SHARED_ITEM:
+                strings.append(_rich_text(elem))
+                self._root.clear()
+        return strings[index]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class IterparseSheetReader(SheetReader):
+    def __init__(self, source: str | BinaryIO):
+        self._zf = zipfile.ZipFile(source)
+        try:
+            self._sheet_path = active_sheet_path(self._zf)
+            parts = self._workbook_parts()
+            self._date_styles, self._timedelta_styles = self._load_date_styles(parts.get(_REL_STYLES))
+            self._shared = _SharedStrings(self._zf, parts.get(_REL_SHARED_STRINGS))
+        except Exception:
+            self._zf.close()
+            raise
+        self._columns: frozenset[int] | None = None
+        self._width = 0
+        self._col_cache: dict[str, int] = {}
+
+    def _workbook_parts(self) -> dict[str, str]:
+        """관계 유형 접미사(/styles, /sharedStrings) → zip 내부 경로. epoch도 여기서 읽는다."""
+        workbook = ET.fromstring(self._zf.read("xl/workbook.xml"))
+        props = workbook.find(f"{_NS_MAIN}workbookPr")
+        date1904 = props is not None and props.get("date1904", "").lower() in ("1", "true")
+        self._epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        parts: dict[str, str] = {}
+        rels = ET.fromstring(self._zf.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+            kind = rel.get("Type", "")
+            for suffix in (_REL_STYLES, _REL_SHARED_STRINGS):
+                if kind.endswith(suffix):
+                    parts[suffix] = _package_path(rel.get("Target", ""))
+        return parts
+
+    def _load_date_styles(self, styles_path: str | None) -> tuple[frozenset[int], frozenset[int]]:
+        """cellXfs에서 날짜/기간 서식을 쓰는 스타일 인덱스를 찾는다. (openpyxl과 같은 판정)"""
+        if not styles_path or styles_path not in self._zf.namelist():
+            return frozenset(), frozenset()
+        styles = ET.fromstring(self._zf.read(styles_path))
+        formats: dict[int, str] = dict(BUILTIN_FORMATS)
+        for fmt in styles.iterfind(f"{_NS_MAIN}numFmts/{_NS_MAIN}numFmt"):
+            formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode", "")
+
+        dates, timedeltas = set(), set()
+        for idx, xf in enumerate(styles.iterfind(f"{_NS_MAIN}cellXfs/{_NS_MAIN}xf")):
+            code = formats.get(int(xf.get("numFmtId", "0")), "")
+            if is_date_format(code):
+                dates.add(idx)
+                if is_timedelta_format(code):
+                    timedeltas.add(idx)
+        return frozenset(dates), frozenset(timedeltas)
+
+    def select_columns(self, columns: Iterable[int]):
+        self._columns = frozenset(columns)
+        self._width = max(self._columns) + 1 if self._columns else 0
+
+    def _column_index(self, ref: str) -> int:
+        letters = ref.rstrip("0123456789")
+        idx = self._col_cache.get(letters)
+        if idx is None:
+            idx = 0
+            for ch in letters:
+                idx = idx * 26 + ord(ch) - 64
+            idx -= 1
+            self._col_cache[letters] = idx
+        return idx
+
+    def _cell_value(self, cell: ET.Element) -> Any:
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            node = cell.find(_INLINE)
+            return _rich_text(node) if node is not None else None
+
+        text = cell.findtext(_VALUE) or None
+        if text is None:
+            return None
+        if kind == "n":
+            value = _cast_number(text)
+            style = cell.get("s")
+            if style and int(style) in self._date_styles:
+                try:
+                    return from_excel(value, self._epoch, timedelta=int(style) in self._timedelta_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if kind == "s":
+            return self._shared[int(text)]
+        if kind == "b":
+            return bool(int(text))
+        if kind == "d":
+            return datetime.fromisoformat(text.rstrip("Z"))
+        return text  # str(수식 문자열 결과), e(오류 값)
+
+    def __iter__(self) -> Iterator[tuple]:
+        row_number = 0
+        sheet_data: ET.Element | None = None
+        with self._zf.open(self._sheet_path) as f:
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == _SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag != _ROW:
+                    continue
+
+                r = elem.get("r")
+                current = int(r) if r else row_number + 1
+                # XML에 없는 행(빈 행)은 빈 튜플로 채운다
+                while row_number < current - 1:
+                    row_number += 1
+                    yield ()
+                row_number = current
+
+                yield self._row_values(elem)
+                # 처리한 행은 트리에서 떼어 내 메모리가 파일 크기에 비례해 늘지 않게 한다
+                sheet_data.clear()
+
+    def _row_values(self, row: ET.Element) -> tuple:
+        columns = self._columns
+        if columns is None:
+            values: list[Any] = []
+            col = -1
+            for cell in row:
+                if cell.tag != _CELL:
+                    continue
+                ref = cell.get("r")
+                col = self._column_index(ref) if ref else col + 1
+                if col > len(values):
+                    values.extend([None] * (col - len(values)))
+                values.append(self._cell_value(cell))
+            return tuple(values)
+
+        values = [None] * self._width
+        col = -1
+        for cell in row:
+            if cell.tag != _CELL:
+                continue
+            ref = cell.get("r")
+            col = self._column_index(ref) if ref else col + 1
+            if col in columns:
+                values[col] = self._cell_value(cell)
+            elif len(cell):
+                # 값을 변환하지 않고 "값 있음"만 남긴다
+                if col >= len(values):
+                    values.extend([None] * (col + 1 - len(values)))
+                values[col] = UNREAD
+        return tuple(values)
+
+    def close(self):
+        self._shared.close()
+        self._zf.close()
+
+
+READERS: dict[str, type[SheetReader]] = {
+    "openpyxl": OpenpyxlSheetReader,
+    "iterparse": IterparseSheetReader,
+}
+
+
+def open_sheet(source: str | BinaryIO, backend: str | None = None) -> SheetReader:
+    """source(파일 경로 또는 버퍼 스트림)의 활성 시트를 backend(기본 BATCH_XLSX_READER)로 연다."""
+    backend = backend or XLSX_READER
+    try:
+        reader = READERS[backend]
+    except KeyError:
+        raise ValueError(f"알 수 없는 XLSX 읽기 백엔드입니다: {backend}") from None
+    return reader(source)
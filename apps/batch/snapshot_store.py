@@ -0,0 +1,192 @@
+"""
+피드 스냅샷 저장소
+마지막으로 성공한 Import의 행별 내용 해시를 키(emrPatientId / emrAppointmentId)별로 워커 로컬 SQLite에 보관한다.
+새 파일은 이 스냅샷과 비교해 추가·변경된 행만 임포터로 넘기고, 바뀌지 않은 행은 건너뛴다.
+- 스냅샷은 Import가 SUCCESS로 커밋된 뒤에만 교체한다 (실패한 Import는 다음 실행에서 전체가 다시 비교됨)
+- 스냅샷은 저장한 Import ID에 묶인다. Postgres에서 이 피드의 마지막으로 끝난 Import가 그 SUCCESS Import가 아니면
+  (다른 호스트·컨슈머가 그 뒤에 임포트했거나, 중간 청크까지 커밋하고 실패한 Import가 있으면) 스냅샷을 버리고 전체 갱신한다.
+- 임포터가 반영하지 못한 행(담당의·베드 미확인 등)은 unwritten에 모아 저장에서 빼므로 다음 파일에서 다시 임포트된다.
+- SNAPSHOT_FULL_REFRESH_HOURS가 지난 스냅샷은 비교만 하고 모든 행을 임포터로 넘겨
+  앱에서 직접 고친 데이터 등 DB와 스냅샷이 어긋난 경우를 주기적으로 바로잡는다.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Any
+
+from config import SNAPSHOT_DIFF, SNAPSHOT_FULL_REFRESH_HOURS, STATE_DB_PATH
+from parsers.records import ParsedRow
+
+logger = logging.getLogger(__name__)
+
+
+def row_hash(row: ParsedRow) -> str:
+    """행의 업무 필드(행 번호·파서 오류 제외) 내용 해시"""
+    payload = json.dumps(row.data(), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS row_snapshot (
+               feed TEXT NOT NULL,
+               key TEXT NOT NULL,
+               row_hash TEXT NOT NULL,
+               PRIMARY KEY (feed, key)
+           ) WITHOUT ROWID"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS snapshot_meta (
+               feed TEXT PRIMARY KEY,
+               import_id TEXT NOT NULL,
+               row_count INTEGER NOT NULL,
+               saved_at REAL NOT NULL,
+               full_refresh_at REAL NOT NULL
+           )"""
+    )
+    return conn
+
+
+def _last_finished_import(conn, feed: str) -> tuple[str, str] | None:
+    """Postgres에서 이 피드의 마지막으로 끝난 Import (id, status). 처리 중인 Import는 제외한다."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT "id", "status" FROM "Import"
+               WHERE "fileType" = %s AND "status" IN ('SUCCESS', 'FAIL')
+               ORDER BY "finishedAt" DESC NULLS LAST
+               LIMIT 1""",
+            (feed,),
+        )
+        return cur.fetchone()
+
+
+class FeedSnapshot:
+    """
+    파일 1건의 스냅샷 비교 상태.
+    filter()로 청크마다 임포트할 행을 고르고, 임포터는 반영하지 못한 행의 키를 unwritten에 넣는다.
+    Import 성공 후 save()로 반영된 행의 해시만 새 스냅샷으로 저장한다.
+    """
+
+    def __init__(self, conn, feed: str, key_field: str, db_path: str = STATE_DB_PATH):
+        self.feed = feed
+        self.key_field = key_field
+        self.db_path = db_path
+
+        self.previous: dict[str, str] = {}
+        self.current: dict[str, str] = {}
+        self.unwritten: set[str] = set()
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+
+        # 마지막으로 모든 행을 반영한 시각 (비교 모드로 저장할 때는 그대로 이어받는다)
+        self.full_refresh_at: float | None = None
+        if SNAPSHOT_DIFF == "on":
+            state = _connect(db_path)
+            try:
+                meta = state.execute(
+                    "SELECT import_id, full_refresh_at FROM snapshot_meta WHERE feed = ?", (feed,)
+                ).fetchone()
+                if meta and _last_finished_import(conn, feed) != (meta[0], "SUCCESS"):
+                    logger.warning(f"[{feed}] 스냅샷(Import {meta[0]}) 이후 다른 Import가 있어 스냅샷을 버림")
+                    meta = None
+                if meta:
+                    self.full_refresh_at = meta[1]
+                    self.previous = dict(
+                        state.execute("SELECT key, row_hash FROM row_snapshot WHERE feed = ?", (feed,))
+                    )
+            finally:
+                state.close()
+
+        # 스냅샷이 없거나 오래됐으면 비교 결과와 상관없이 모든 행을 임포트한다.
+        self.full_refresh = self.full_refresh_at is None or (
+            SNAPSHOT_FULL_REFRESH_HOURS > 0
+            and time.time() - self.full_refresh_at > SNAPSHOT_FULL_REFRESH_HOURS * 3600
+        )
+        if SNAPSHOT_DIFF == "on":
+            logger.info(
+                f"[{feed}] 스냅샷 {len(self.previous)}건 로드"
+                + (" (전체 갱신 모드)" if self.full_refresh else "")
+            )
+
+    def filter(self, rows: list[ParsedRow]) -> list[ParsedRow]:
+        """유효 행 중 스냅샷과 비교해 추가·변경된 행만 반환한다. 키가 없는 행은 항상 포함."""
+        if SNAPSHOT_DIFF != "on":
+            return rows
+
+        selected: list[ParsedRow] = []
+        for row in rows:
+            key = getattr(row, self.key_field)
+            if not key:
+                self.added += 1
+                selected.append(row)
+                continue
+
+            digest = row_hash(row)
+            self.current[key] = digest
+            previous = self.previous.get(key)
+            if previous is None:
+                self.added += 1
+            elif previous != digest:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+                if not self.full_refresh:
+                    continue
+            selected.append(row)
+        return selected
+
+    def removed_keys(self) -> set[str]:
+        """이전 스냅샷에는 있었지만 이번 파일에는 없는 키"""
+        return self.previous.keys() - self.current.keys()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "snapshotAdded": self.added,
+            "snapshotChanged": self.changed,
+            "snapshotUnchanged": self.unchanged,
+            "snapshotRemoved": len(self.removed_keys()),
+            "snapshotUnwritten": len(self.unwritten),
+            "snapshotFullRefresh": self.full_refresh,
+        }
+
+    def save(self, import_id: str):
+        """
+        이번 파일에서 반영된 행 해시로 피드 스냅샷을 교체한다. Import가 커밋된 뒤에 호출한다.
+        unwritten 키는 저장하지 않으므로 다음 파일에서 추가된 행으로 보고 다시 임포트한다.
+        """
+        if SNAPSHOT_DIFF != "on":
+            return
+
+        try:
+            conn = _connect(self.db_path)
+        except sqlite3.Error as e:
+            logger.error(f"[{self.feed}] 스냅샷 저장 실패 (다음 실행은 이전 스냅샷과 비교): {e}")
+            return
+
+        try:
+            written = {key: digest for key, digest in self.current.items() if key not in self.unwritten}
+            with conn:
+                conn.execute("DELETE FROM row_snapshot WHERE feed = ?", (self.feed,))
+                conn.executemany(
+                    "INSERT INTO row_snapshot (feed, key, row_hash) VALUES (?, ?, ?)",
+                    ((self.feed, key, digest) for key, digest in written.items()),
+                )
+                now = time.time()
+                conn.execute(
+                    """INSERT OR REPLACE INTO snapshot_meta (feed, import_id, row_count, saved_at, full_refresh_at)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (self.feed, import_id, len(written), now, now if self.full_refresh else self.full_refresh_at),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"[{self.feed}] 스냅샷 저장 실패 (다음 실행은 이전 스냅샷과 비교): {e}")
+            return
+        finally:
+            conn.close()
+        logger.info(
+            f"[{self.feed}] 스냅샷 저장: {len(written)}건, 미반영 제외 {len(self.current) - len(written)}건 (Import {import_id})"
+        )
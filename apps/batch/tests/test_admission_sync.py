@@ -0,0 +1,103 @@
+"""importers.admission_sync 베드 중복·담당의 조회 테스트 (참조 맵은 조회 결과만 돌려주는 가짜 연결로 채운다)"""
+from datetime import datetime
+
+from importers.admission_sync import AdmissionSync, _index_doctors
+from parsers.records import InpatientRow
+
+
+class FakeReferences:
+    """AdmissionSync 생성자의 베드·의사 조회 결과를 차례로 돌려주는 연결"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries: list[str] = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.queries.append(sql)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def make_sync() -> AdmissionSync:
+    beds = [("3병동", "301호", "1", "bed-1"), ("3병동", "301호", "2", "bed-2")]
+    doctors = [("이의사", "doc-1")]
+    return AdmissionSync(FakeReferences(beds, doctors))
+
+
+def inpatient(emr_id: str, bed_label: str) -> InpatientRow:
+    return InpatientRow(
+        2, emr_id, name="김민서", admitDate=datetime(2026, 10, 1), attendingDoctor="이의사",
+        wardName="3병동", roomName="301호", bedLabel=bed_label,
+    )
+
+
+def staged_beds(sync: AdmissionSync, rows, unwritten: set[str]) -> dict[str, str | None]:
+    records, _ = sync._resolve(rows, unwritten)
+    return {record[0]: record[4] for record in records}
+
+
+def test_duplicate_bed_is_resolved_across_chunks():
+    sync = make_sync()
+    unwritten: set[str] = set()
+    first = [inpatient("P2", "1")]
+    second = [inpatient("P1", "1"), inpatient("P3", "2")]
+
+    sync.claim_beds(first)
+    assert staged_beds(sync, first, unwritten) == {"P2": "bed-1"}
+
+    # 뒤 청크의 P1은 환자번호가 앞서더라도 파일에서 먼저 나온 P2의 베드를 가져가지 못한다
+    sync.claim_beds(second)
+    assert staged_beds(sync, second, unwritten) == {"P1": None, "P3": "bed-2"}
+    assert unwritten == {"P1"}
+
+
+def test_rows_skipped_by_snapshot_still_claim_their_bed():
+    sync = make_sync()
+    unwritten: set[str] = set()
+
+    # P2는 바뀌지 않아 sync()로 넘어가지 않아도 베드는 차지한다
+    sync.claim_beds([inpatient("P2", "1")])
+    later = [inpatient("P1", "1")]
+    sync.claim_beds(later)
+
+    records, unresolved = sync._resolve(later, unwritten)
+    assert records[0][4] is None
+    assert unresolved == {"bedUnresolved": 0, "doctorUnresolved": 0, "bedDuplicate": 1}
+
+
+def test_doctor_lookup_only_reads_doctor_accounts():
+    conn = FakeReferences([], [("이의사", "doc-1")])
+    sync = AdmissionSync(conn)
+
+    doctor_query = " ".join(conn.queries[1].split())
+    assert 'JOIN "UserDepartment"' in doctor_query or 'FROM "UserDepartment"' in doctor_query
+    assert "\"role\" = 'DOCTOR'" in doctor_query
+    assert sync.doctors == {"이의사": "doc-1"}
+
+
+def test_doctors_sharing_a_name_are_left_unresolved():
+    # 같은 계정이 여러 부서에서 DOCTOR면 같은 id로 여러 번 나온다
+    doctors, ambiguous = _index_doctors([
+        ("김 의사", "doc-1"), ("김의사", "doc-2"), ("박의사", "doc-3"), ("박의사", "doc-3"),
+    ])
+    assert doctors == {"박의사": "doc-3"}
+    assert ambiguous == {"김의사"}
+
+    sync = AdmissionSync(FakeReferences([], [("김의사", "doc-1"), ("김의사", "doc-2")]))
+    unwritten: set[str] = set()
+    row = InpatientRow(2, "P1", name="김민서", admitDate=datetime(2026, 10, 1), attendingDoctor="김의사")
+    records, unresolved = sync._resolve([row], unwritten)
+
+    assert records[0][3] is None
+    assert unresolved["doctorUnresolved"] == 1
+    assert unwritten == {"P1"}
@@ -0,0 +1,65 @@
+"""validators.data_validator 테스트"""
+from datetime import datetime, timedelta
+
+from parsers.records import InpatientRow, OutpatientRow
+from validators.data_validator import validate_outpatient_rows, validate_rows
+
+
+def inpatient(row_number: int, emr_id: str = "P1", **fields) -> InpatientRow:
+    values = {"name": "김민서", "dob": datetime(1970, 1, 2), "sex": "M", "admitDate": datetime.now()}
+    values.update(fields)
+    return InpatientRow(row_number, emr_id, **values)
+
+
+def messages(errors) -> dict[int, list[str]]:
+    return {e.row.row_number: e.errors for e in errors}
+
+
+def test_validate_rows_applies_rules_in_order():
+    now = datetime.now()
+    rows = [
+        inpatient(2, "P1"),
+        inpatient(3, "P2", errors=("환자명이 비어있습니다.",)),
+        inpatient(4, "P1", sex="X"),
+        inpatient(5, "P3", dob=datetime(1800, 1, 1), sex="X"),
+        inpatient(6, "P4", admitDate=now + timedelta(days=40), plannedDischargeDate=now),
+    ]
+
+    valid, errors = validate_rows(rows)
+
+    assert [r.row_number for r in valid] == [2]
+    assert messages(errors) == {
+        3: ["환자명이 비어있습니다."],
+        # 중복 행은 다른 규칙을 검사하지 않는다
+        4: ["파일 내 환자번호 중복: P1"],
+        5: ["생년월일이 범위를 벗어납니다: 1800-01-01", "성별 값이 올바르지 않습니다: X"],
+        6: [
+            f"입원일이 30일 이상 미래입니다: {(now + timedelta(days=40)).strftime('%Y-%m-%d')}",
+            "퇴원예정일이 입원일보다 이전입니다.",
+        ],
+    }
+
+
+def test_seen_ids_carry_across_chunks():
+    seen: set[str] = set()
+    validate_rows([inpatient(2, "P1")], seen)
+    valid, errors = validate_rows([inpatient(3, "P1"), inpatient(4, "P2")], seen)
+
+    assert [r.row_number for r in valid] == [4]
+    assert messages(errors) == {3: ["파일 내 환자번호 중복: P1"]}
+
+
+def test_validate_outpatient_rows_flags_parser_errors_and_duplicate_appointments():
+    rows = [
+        OutpatientRow(2, "P1", emrAppointmentId="A1"),
+        OutpatientRow(3, "P2", emrAppointmentId="A1"),
+        OutpatientRow(4, "P3"),
+        OutpatientRow(5, "P4"),
+        OutpatientRow(6, errors=("환자번호 누락",)),
+    ]
+
+    valid, errors = validate_outpatient_rows(rows)
+
+    # 예약ID가 없는 행은 중복 검사 대상이 아니다
+    assert [r.row_number for r in valid] == [2, 4, 5]
+    assert messages(errors) == {3: ["파일 내 예약번호 중복: A1"], 6: ["환자번호 누락"]}
@@ -0,0 +1,67 @@
+"""parsers.header_layout.HeaderLayouts 캐시 테스트"""
+import sqlite3
+
+import pytest
+
+from parsers.header_layout import HeaderLayouts
+from parsers.inpatient_parser import HEADER_MAP, REQUIRED_FIELDS
+
+HEADER = ("환자번호", "환자명", "생년월일", "성별", "입원일", "주치의")
+DATA = ("P1", "김민서", "1970-01-02", "M", "2026-10-01", "이의사")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def detect(layouts: HeaderLayouts):
+    rows = iter([("입원현황",), HEADER, DATA])
+    match = layouts.detect(rows)
+    # 헤더 행까지만 소비한다
+    assert next(rows) == DATA
+    return match
+
+
+def test_registered_layout_is_reused_across_instances(db_path):
+    first = detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path))
+    second = detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path))
+
+    assert not first.cached and second.cached
+    assert first.row == second.row == 2
+    assert second.col_map == first.col_map
+    assert second.layout == first.layout
+
+
+def test_changed_header_map_misses_cached_layout(db_path):
+    detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path))
+
+    # 파서에 헤더 별칭을 추가하면 같은 파일 헤더라도 다시 스캔해 새 열을 매핑한다
+    header_map = {**HEADER_MAP, "주치의": "attendingDoctor"}
+    match = detect(HeaderLayouts("INPATIENT", header_map, REQUIRED_FIELDS, db_path=db_path))
+
+    assert not match.cached
+    assert match.col_map["attendingDoctor"] == 5
+
+
+def test_changed_required_fields_misses_cached_layout(db_path):
+    detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path))
+
+    match = detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS | {"bedLabel"}, db_path=db_path))
+
+    assert not match.cached
+    assert match.missing == {"bedLabel"}
+
+
+def test_cache_without_rules_column_is_rebuilt(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """CREATE TABLE header_layout (
+               feed TEXT NOT NULL, fingerprint TEXT NOT NULL, col_map TEXT NOT NULL,
+               missing TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (feed, fingerprint))"""
+    )
+    conn.close()
+
+    layouts = HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path)
+    assert not detect(layouts).cached
+    assert detect(HeaderLayouts("INPATIENT", HEADER_MAP, REQUIRED_FIELDS, db_path=db_path)).cached
@@ -0,0 +1,223 @@
+"""
+job_queue.ImportQueue 테스트 (fakeredis)
+컨슈머마다 같은 가짜 Redis 서버를 공유하는 별도 클라이언트를 써서 여러 프로세스·호스트를 흉내 낸다.
+재시도 대기(notBefore)는 job_queue 모듈의 시계만 바꿔서 진행시키고,
+리스 만료는 Redis TTL이 실제 시간으로 흐르므로 visibility_sec을 1초로 두고 기다린다.
+"""
+import time
+
+import fakeredis
+import pytest
+
+import job_queue
+from job_queue import ImportQueue
+
+VISIBILITY_SEC = 1
+
+
+class FakeClock:
+    """job_queue가 쓰는 time 모듈 대신 넣는 시계. advance()로 재시도 대기 시간을 건너뛴다."""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(job_queue, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def make_queue(server):
+    """같은 서버를 쓰는 컨슈머(큐 인스턴스)를 만든다."""
+
+    def make(**kwargs) -> ImportQueue:
+        options = {"prefix": "test", "visibility_sec": VISIBILITY_SEC, "max_attempts": 3, "backoff_sec": 10}
+        options.update(kwargs)
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return ImportQueue(client=client, **options)
+
+    return make
+
+
+def crash(claimed):
+    """컨슈머가 죽은 것처럼 하트비트만 멈추고 리스는 반납하지 않는다."""
+    claimed._stop.set()
+    claimed._heartbeat.join()
+
+
+def wait_for_lease_expiry():
+    time.sleep(VISIBILITY_SEC + 0.2)
+
+
+def test_enqueue_dedups_by_feed_and_hash(make_queue):
+    queue = make_queue()
+
+    assert queue.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+    assert not queue.enqueue("INPATIENT", "/in/a_copy.xlsx", "h1")
+    # 다른 피드는 같은 해시여도 별도 작업
+    assert queue.enqueue("OUTPATIENT", "/out/a.xlsx", "h1")
+    assert queue.stats(["INPATIENT", "OUTPATIENT"])["INPATIENT"]["queued"] == 1
+
+    # 완료된 작업은 다시 넣을 수 있다
+    claimed = queue.claim("INPATIENT")
+    queue.ack(claimed)
+    assert queue.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+
+
+def test_claim_is_fifo_per_feed(make_queue):
+    queue = make_queue()
+    queue.enqueue("INPATIENT", "/in/1.xlsx", "h1")
+    queue.enqueue("INPATIENT", "/in/2.xlsx", "h2")
+
+    first = queue.claim("INPATIENT")
+    assert first.job["path"] == "/in/1.xlsx"
+    queue.ack(first)
+
+    second = queue.claim("INPATIENT")
+    assert second.job["path"] == "/in/2.xlsx"
+    queue.ack(second)
+    assert queue.claim("INPATIENT") is None
+
+
+def test_lease_is_exclusive_while_heartbeat_runs(make_queue):
+    consumer_a, consumer_b = make_queue(), make_queue()
+    consumer_a.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+    consumer_a.enqueue("OUTPATIENT", "/out/a.xlsx", "h2")
+
+    claimed = consumer_a.claim("INPATIENT")
+    assert claimed is not None
+    assert consumer_b.claim("INPATIENT") is None
+
+    # 하트비트가 리스를 연장하므로 visibility timeout이 지나도 다른 컨슈머가 가져가지 못한다
+    wait_for_lease_expiry()
+    assert consumer_b.claim("INPATIENT") is None
+
+    # 다른 피드는 동시에 처리할 수 있다
+    other = consumer_b.claim("OUTPATIENT")
+    assert other is not None
+    consumer_b.ack(other)
+
+    consumer_a.ack(claimed)
+    assert consumer_b.claim("INPATIENT") is None
+
+
+def test_expired_lease_is_redelivered_after_consumer_crash(make_queue):
+    consumer_a, consumer_b = make_queue(), make_queue()
+    consumer_a.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+
+    claimed = consumer_a.claim("INPATIENT")
+    crash(claimed)
+    assert consumer_b.claim("INPATIENT") is None
+
+    wait_for_lease_expiry()
+    redelivered = consumer_b.claim("INPATIENT")
+    assert redelivered is not None
+    assert redelivered.job["hash"] == "h1"
+    assert redelivered.attempts == 2
+
+    consumer_b.ack(redelivered)
+    assert consumer_b.stats(["INPATIENT"])["INPATIENT"]["queued"] == 0
+
+
+def test_ack_after_losing_lease_does_not_pop_next_job(make_queue):
+    consumer_a, consumer_b = make_queue(), make_queue()
+    consumer_a.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+    consumer_a.enqueue("INPATIENT", "/in/b.xlsx", "h2")
+
+    stale = consumer_a.claim("INPATIENT")
+    crash(stale)
+    wait_for_lease_expiry()
+    redelivered = consumer_b.claim("INPATIENT")
+    consumer_b.ack(redelivered)
+
+    # 늦게 끝난 첫 컨슈머의 ack는 이미 바뀐 맨 앞 작업(b)을 지우지 않는다
+    consumer_a.ack(stale)
+    remaining = consumer_b.claim("INPATIENT")
+    assert remaining.job["path"] == "/in/b.xlsx"
+    consumer_b.ack(remaining)
+
+
+def test_failed_job_retries_with_exponential_backoff(make_queue, clock):
+    queue = make_queue(backoff_sec=10)
+    queue.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+    queue.enqueue("INPATIENT", "/in/b.xlsx", "h2")
+
+    claimed = queue.claim("INPATIENT")
+    assert queue.fail(claimed, "DB 연결 실패") == "retry"
+
+    # 백오프 동안은 같은 피드의 뒤 작업도 기다린다 (순서 보장)
+    assert queue.claim("INPATIENT") is None
+    clock.advance(9)
+    assert queue.claim("INPATIENT") is None
+    clock.advance(2)
+    retried = queue.claim("INPATIENT")
+    assert retried.job["path"] == "/in/a.xlsx"
+    assert retried.attempts == 2
+
+    # 두 번째 실패는 두 배로 기다린다
+    assert queue.fail(retried, "DB 연결 실패") == "retry"
+    clock.advance(19)
+    assert queue.claim("INPATIENT") is None
+    clock.advance(2)
+    third = queue.claim("INPATIENT")
+    assert third.attempts == 3
+    queue.ack(third)
+
+    # 성공하면 시도 횟수가 초기화되고 다음 작업은 바로 처리된다
+    following = queue.claim("INPATIENT")
+    assert following.job["path"] == "/in/b.xlsx"
+    assert following.attempts == 1
+    queue.ack(following)
+
+
+def test_job_is_dead_lettered_after_max_attempts(make_queue, clock):
+    queue = make_queue(max_attempts=2, backoff_sec=10)
+    queue.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+    queue.enqueue("INPATIENT", "/in/b.xlsx", "h2")
+
+    assert queue.fail(queue.claim("INPATIENT"), "헤더 없음") == "retry"
+    clock.advance(11)
+    assert queue.fail(queue.claim("INPATIENT"), "헤더 없음") == "dead"
+
+    dead = queue.dead_letters()
+    assert len(dead) == 1
+    assert dead[0]["path"] == "/in/a.xlsx"
+    assert dead[0]["attempts"] == 2
+    assert dead[0]["lastError"] == "헤더 없음"
+    assert queue.stats(["INPATIENT"]) == {"INPATIENT": {"queued": 1, "headAttempts": 0}, "dead": 1}
+
+    # dead-letter 후에는 뒤 작업이 바로 처리되고, 같은 파일을 다시 넣을 수 있다
+    following = queue.claim("INPATIENT")
+    assert following.job["path"] == "/in/b.xlsx"
+    queue.ack(following)
+    assert queue.enqueue("INPATIENT", "/in/a.xlsx", "h1")
+
+
+def test_repeated_consumer_crashes_dead_letter_the_job(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue("INPATIENT", "/in/poison.xlsx", "h1")
+
+    for _ in range(2):
+        crash(queue.claim("INPATIENT"))
+        wait_for_lease_expiry()
+
+    # 리스 만료로 다시 가져간 것도 시도로 세므로, 컨슈머를 계속 죽이는 파일은 dead-letter로 빠진다
+    assert queue.claim("INPATIENT") is None
+    dead = queue.dead_letters()
+    assert [d["path"] for d in dead] == ["/in/poison.xlsx"]
+    assert dead[0]["attempts"] == 2
+    assert queue.stats(["INPATIENT"])["INPATIENT"]["queued"] == 0
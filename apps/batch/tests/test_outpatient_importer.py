@@ -0,0 +1,55 @@
+"""importers.outpatient_importer 일괄 반영 실패 시 행 단위 재시도 테스트"""
+import psycopg2
+import pytest
+
+import importers.outpatient_importer as outpatient_importer
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+@pytest.fixture
+def bad_values(monkeypatch):
+    """execute_values 대신 넣는 가짜. (bad에 든 값이 있으면 IntegrityError, 반영된 값은 written에 쌓음)"""
+    bad: set = set()
+    written: list = []
+
+    def fake_execute_values(cur, sql, values, template=None, page_size=100):
+        if any(value in bad for value in values):
+            raise psycopg2.IntegrityError("duplicate key")
+        written.extend(values)
+
+    monkeypatch.setattr(outpatient_importer, "execute_values", fake_execute_values)
+    return bad, written
+
+
+def test_batch_is_written_in_one_statement_when_it_succeeds(bad_values):
+    _, written = bad_values
+    cur = RecordingCursor()
+
+    failed = outpatient_importer._execute_batch(cur, "INSERT", {"A1": ("A1",), "A2": ("A2",)}, "(%s)")
+
+    assert failed == []
+    assert written == [("A1",), ("A2",)]
+    assert cur.statements == ["SAVEPOINT appointment_batch", "RELEASE SAVEPOINT appointment_batch"]
+
+
+def test_failing_row_is_skipped_and_the_rest_of_the_chunk_is_written(bad_values):
+    bad, written = bad_values
+    bad.add(("A2",))
+    cur = RecordingCursor()
+
+    failed = outpatient_importer._execute_batch(
+        cur, "INSERT", {"A1": ("A1",), "A2": ("A2",), "A3": ("A3",)}, "(%s)",
+    )
+
+    assert failed == ["A2"]
+    assert written == [("A1",), ("A3",)]
+    assert cur.statements[:2] == ["SAVEPOINT appointment_batch", "ROLLBACK TO SAVEPOINT appointment_batch"]
+    assert cur.statements.count("ROLLBACK TO SAVEPOINT appointment_row") == 1
+    assert cur.statements[-1] == "RELEASE SAVEPOINT appointment_batch"
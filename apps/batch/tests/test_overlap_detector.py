@@ -0,0 +1,82 @@
+"""importers.overlap_detector 테스트"""
+from datetime import datetime
+
+from importers.overlap_detector import find_overlaps, flag_overlapping_appointments
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return datetime(2026, 10, 16, hour, minute)
+
+
+class FakeAppointments:
+    """예약 조회 결과를 돌려주고 conflictFlag UPDATE 대상 id를 기록하는 연결"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.flagged: set[str] = set()
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        if sql.lstrip().startswith("UPDATE"):
+            self.flagged = set(params[0])
+
+    def fetchall(self):
+        # 실제 조회와 같이 ORDER BY "startAt", "id"
+        return sorted(self.rows, key=lambda r: (r[3], r[0]))
+
+
+def appointment(apt_id: str, doctor_id: str, room_id: str | None, start: datetime, end: datetime, flagged=False):
+    return (apt_id, doctor_id, room_id, start, end, flagged, False)
+
+
+def test_touching_boundaries_are_not_overlaps():
+    intervals = [("A", at(9), at(9, 30)), ("B", at(9, 30), at(10)), ("C", at(10), at(10, 30))]
+    assert find_overlaps(intervals) == set()
+
+
+def test_long_booking_overlaps_every_contained_booking():
+    intervals = [
+        ("long", at(9), at(12)),
+        ("short1", at(9, 30), at(10)),
+        ("short2", at(10, 30), at(11)),
+        ("short3", at(11, 30), at(12)),
+        ("after", at(12), at(12, 30)),
+    ]
+    assert find_overlaps(intervals) == {"long", "short1", "short2", "short3"}
+
+
+def test_callers_sort_by_start_before_detection():
+    intervals = [("C", at(11), at(11, 30)), ("A", at(9), at(10, 30)), ("B", at(10), at(10, 15))]
+
+    # 정렬은 호출자 책임: 정렬하면 입력 순서와 상관없이 같은 결과
+    assert find_overlaps(sorted(intervals, key=lambda i: i[1])) == {"A", "B"}
+
+
+def test_doctor_and_room_groups_are_checked_independently():
+    conn = FakeAppointments([
+        # 다른 의사, 같은 진료실 → 진료실 겹침
+        appointment("r1", "doc-1", "room-1", at(9), at(10)),
+        appointment("r2", "doc-2", "room-1", at(9, 30), at(10, 30)),
+        # 같은 의사, 다른 진료실(또는 진료실 없음) → 의사 겹침
+        appointment("d1", "doc-3", "room-2", at(11), at(12)),
+        appointment("d2", "doc-3", None, at(11, 30), at(12, 30)),
+        # 다른 의사, 다른 진료실 → 겹침 아님
+        appointment("x1", "doc-4", "room-3", at(9), at(10)),
+        appointment("x2", "doc-5", "room-4", at(9), at(10)),
+        # 이미 플래그된 예약은 다시 갱신하지 않는다
+        appointment("f1", "doc-6", "room-5", at(13), at(14), flagged=True),
+        appointment("f2", "doc-6", "room-5", at(13, 30), at(14, 30)),
+    ])
+
+    result = flag_overlapping_appointments(conn, {"2026-10-16"})
+
+    assert conn.flagged == {"r1", "r2", "d1", "d2", "f2"}
+    assert result == {"overlapsFlagged": 5}
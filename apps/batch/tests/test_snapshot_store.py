@@ -0,0 +1,86 @@
+"""snapshot_store.FeedSnapshot 테스트 (Postgres는 마지막 Import 조회 결과만 돌려주는 가짜 연결로 대신한다)"""
+import pytest
+
+from parsers.records import OutpatientRow
+from snapshot_store import FeedSnapshot
+
+
+class FakeImports:
+    """_last_finished_import가 읽는 "Import" 조회 결과만 흉내 내는 연결"""
+
+    def __init__(self):
+        self.last: tuple[str, str] | None = None
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchone(self):
+        return self.last
+
+
+@pytest.fixture
+def pg():
+    return FakeImports()
+
+
+@pytest.fixture
+def open_snapshot(pg, tmp_path):
+    db_path = str(tmp_path / "state.db")
+
+    def open_() -> FeedSnapshot:
+        return FeedSnapshot(pg, "OUTPATIENT", "emrAppointmentId", db_path)
+
+    return open_
+
+
+def appointment(row_number: int, emr_id: str, start: str = "09:00") -> OutpatientRow:
+    return OutpatientRow(row_number, "P1", appointmentDate="2026-10-16", startTime=start, emrAppointmentId=emr_id)
+
+
+def import_file(snapshot: FeedSnapshot, pg: FakeImports, import_id: str, rows, unwritten=()) -> list[str]:
+    selected = [r.emrAppointmentId for r in snapshot.filter(rows)]
+    snapshot.unwritten.update(unwritten)
+    snapshot.save(import_id)
+    pg.last = (import_id, "SUCCESS")
+    return selected
+
+
+def test_unchanged_rows_are_skipped_against_own_last_import(pg, open_snapshot):
+    rows = [appointment(2, "A1"), appointment(3, "A2")]
+    assert import_file(open_snapshot(), pg, "imp-1", rows) == ["A1", "A2"]
+
+    snapshot = open_snapshot()
+    assert not snapshot.full_refresh
+    assert import_file(snapshot, pg, "imp-2", [appointment(2, "A1"), appointment(3, "A2", "10:00")]) == ["A2"]
+
+
+def test_snapshot_is_dropped_when_another_import_finished_later(pg, open_snapshot):
+    rows = [appointment(2, "A1")]
+    import_file(open_snapshot(), pg, "imp-1", rows)
+
+    # 다른 호스트가 그 뒤에 임포트했거나, 청크 일부를 커밋하고 실패한 Import가 있으면 로컬 스냅샷을 믿지 않는다
+    for last in [("imp-other", "SUCCESS"), ("imp-failed", "FAIL"), None]:
+        pg.last = last
+        snapshot = open_snapshot()
+        assert snapshot.full_refresh
+        assert snapshot.previous == {}
+        assert [r.emrAppointmentId for r in snapshot.filter(rows)] == ["A1"]
+
+
+def test_unwritten_rows_are_not_saved_and_retried(pg, open_snapshot):
+    rows = [appointment(2, "A1"), appointment(3, "A2")]
+    import_file(open_snapshot(), pg, "imp-1", rows, unwritten={"A2"})
+
+    snapshot = open_snapshot()
+    assert snapshot.previous.keys() == {"A1"}
+    assert import_file(snapshot, pg, "imp-2", rows) == ["A2"]
+    assert snapshot.stats()["snapshotAdded"] == 1
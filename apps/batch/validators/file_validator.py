@@ -1,27 +1,69 @@
 """
 파일 유효성 검증
-- 파일 수신 완료 확인 (done_signal / stable_size)
-- XLSX 무결성 검사
+- 파일 수신 완료 확인 (done_signal / stable_size, 후보 전체를 한 번의 대기로 확인)
+- 파일 1회 읽기 (읽은 버퍼 그대로 SHA-256 계산, 복사 없음)
+- XLSX 무결성 검사 (zip 디렉토리 + 시트 dimension, 워크북 생성 없음)
 - SHA-256 중복 체크
 """
 import hashlib
+import io
 import logging
 import os
+import re
 import time
-
-import openpyxl
+import zipfile
+from xml.etree import ElementTree as ET
 
 from config import FILE_STABLE_WAIT_SEC, RECEIPT_MODE
+from parsers.xlsx_reader import active_sheet_path
 
 logger = logging.getLogger(__name__)
 
+READ_CHUNK_SIZE = 1024 * 1024
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\s+ref="[A-Z]*(\d*)(?::[A-Z]*(\d+))?"')
+
+
+class ExportFile:
+    """
+    한 번 읽어 들인 EMR 내보내기 파일.
+    무결성 검사와 파서가 같은 버퍼를 공유하므로 파일을 다시 읽지 않는다.
+    """
+
+    def __init__(self, path: str, data: bytes, sha256: str):
+        self.path = path
+        self.data = data
+        self.sha256 = sha256
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def open(self) -> io.BytesIO:
+        """파서에 넘길 새 읽기 스트림을 반환한다."""
+        return io.BytesIO(self.data)
+
+
+def read_export_file(file_path: str) -> ExportFile:
+    """
+    파일을 한 번에 읽어 버퍼에 담고 그 버퍼로 SHA-256을 계산한다.
+    read()는 파일 크기(fstat)만큼 한 번에 할당하므로 청크를 이어 붙인 뒤 bytes로 복사할 때처럼
+    잠깐이라도 파일 크기의 두 배를 쓰지 않는다.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return ExportFile(file_path, data, hashlib.sha256(data).hexdigest())
+
 
 def compute_sha256(file_path: str) -> str:
-    """파일의 SHA-256 해시를 계산한다."""
+    """파일의 SHA-256 해시를 계산한다. (1 MiB 단위 버퍼 읽기)"""
     sha = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        while chunk := f.read(8192):
-            sha.update(chunk)
+    with open(file_path, "rb", buffering=0) as f:
+        buf = bytearray(READ_CHUNK_SIZE)
+        view = memoryview(buf)
+        while n := f.readinto(buf):
+            sha.update(view[:n])
     return sha.hexdigest()
 
 
@@ -47,24 +89,113 @@ def is_file_ready(file_path: str) -> bool:
         return os.path.exists(file_path) and os.path.getsize(file_path) > 0
 
 
-def validate_xlsx(file_path: str) -> tuple[bool, str]:
+class ReceiptTracker:
     """
-    XLSX 파일 무결성 검사.
-    Returns: (성공여부, 에러메시지)
+    stable_size 수신 확인을 여러 파일에 대해 한 번에 수행한다.
+    후보 파일 전체의 (크기, mtime)을 한 번에 기록하고, 대기 구간이 지난 뒤 함께 다시 확인하여
+    변하지 않은 파일만 내보낸다. 파일마다 잠들던 방식(N × 대기)이 대기 1회로 줄어든다.
+    같은 인스턴스를 계속 쓰면(감시 모드) 이미 충분히 오래 관측된 파일은 기다리지 않는다.
+    """
+
+    def __init__(self, wait_sec: float = FILE_STABLE_WAIT_SEC):
+        self.wait_sec = wait_sec
+        # path → (size, mtime_ns, 이 상태로 처음 관측된 시각)
+        self._seen: dict[str, tuple[int, int, float]] = {}
+
+    def observe(self, paths: list[str]):
+        """모든 후보 파일의 현재 상태를 기록한다. 상태가 바뀐 파일은 관측 시각을 새로 잡는다."""
+        now = time.monotonic()
+        current: dict[str, tuple[int, int, float]] = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            prev = self._seen.get(path)
+            if prev and prev[:2] == (st.st_size, st.st_mtime_ns):
+                current[path] = prev
+            else:
+                current[path] = (st.st_size, st.st_mtime_ns, now)
+        self._seen = current
+
+    def stable(self, paths: list[str]) -> list[str]:
+        """대기 구간 동안 크기와 mtime이 변하지 않은(크기 > 0) 파일만 원래 순서대로 반환한다."""
+        now = time.monotonic()
+        result = []
+        for path in paths:
+            state = self._seen.get(path)
+            if state and state[0] > 0 and now - state[2] >= self.wait_sec:
+                result.append(path)
+        return result
+
+    def wait_until_stable(self, paths: list[str]) -> list[str]:
+        """후보 전체를 기록하고, 필요한 만큼 한 번만 기다린 뒤 함께 재확인한다."""
+        self.observe(paths)
+        now = time.monotonic()
+        remaining = [
+            self.wait_sec - (now - state[2])
+            for path in paths
+            if (state := self._seen.get(path)) and now - state[2] < self.wait_sec
+        ]
+        if remaining:
+            time.sleep(max(remaining))
+        self.observe(paths)
+        return self.stable(paths)
+
+
+def filter_ready_files(file_paths: list[str], tracker: ReceiptTracker | None = None) -> list[str]:
+    """
+    후보 파일 중 수신이 완료된 파일만 원래 순서대로 반환한다.
+    stable_size 모드에서는 ReceiptTracker로 전체 후보를 한 번의 대기 구간에 확인한다.
+    """
+    if RECEIPT_MODE == "stable_size":
+        return (tracker or ReceiptTracker()).wait_until_stable(file_paths)
+    return [p for p in file_paths if is_file_ready(p)]
+
+
+def _has_data_rows(zf: zipfile.ZipFile, sheet_path: str) -> bool:
+    """
+    시트 XML 앞부분의 dimension으로 행 수를 판단한다.
+    dimension이 없으면 행 태그를 2개 찾을 때까지만 스트림을 읽는다.
     """
-    if not os.path.exists(file_path):
-        return False, f"파일이 존재하지 않습니다: {file_path}"
+    with zf.open(sheet_path) as f:
+        match = _DIMENSION_RE.search(f.read(64 * 1024))
+    if match:
+        max_row = match.group(2) or match.group(1)
+        return bool(max_row) and int(max_row) >= 2
+
+    rows_seen = 0
+    with zf.open(sheet_path) as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            if elem.tag == f"{_NS_MAIN}row":
+                rows_seen += 1
+                if rows_seen >= 2:
+                    return True
+    return False
 
-    if not file_path.lower().endswith((".xlsx", ".xls")):
-        return False, f"지원하지 않는 파일 형식입니다: {file_path}"
+
+def validate_xlsx(export: ExportFile) -> tuple[bool, str]:
+    """
+    XLSX 파일 무결성 검사. 이미 읽은 버퍼의 zip 디렉토리와
+    시트 dimension만 확인하며 워크북 객체는 만들지 않는다.
+    Returns: (성공여부, 에러메시지)
+    """
+    if not export.path.lower().endswith((".xlsx", ".xls")):
+        return False, f"지원하지 않는 파일 형식입니다: {export.path}"
 
     try:
-        wb = openpyxl.load_workbook(file_path, read_only=True)
-        ws = wb.active
-        if ws is None or ws.max_row is None or ws.max_row < 2:
-            wb.close()
-            return False, "데이터가 없는 빈 파일입니다."
-        wb.close()
+        with zipfile.ZipFile(export.open()) as zf:
+            names = set(zf.namelist())
+            for required in ("[Content_Types].xml", "xl/workbook.xml", "xl/_rels/workbook.xml.rels"):
+                if required not in names:
+                    return False, f"XLSX 구성 요소가 없습니다: {required}"
+
+            sheet_path = active_sheet_path(zf)
+            if sheet_path not in names:
+                return False, f"시트 파일이 없습니다: {sheet_path}"
+
+            if not _has_data_rows(zf, sheet_path):
+                return False, "데이터가 없는 빈 파일입니다."
         return True, ""
     except Exception as e:
         return False, f"XLSX 파일 열기 실패: {str(e)}"
@@ -73,12 +204,13 @@ def validate_xlsx(file_path: str) -> tuple[bool, str]:
 def check_duplicate(file_hash: str, conn) -> bool:
     """
     Import 테이블에서 동일 해시의 파일이 이미 처리되었는지 확인한다.
+    처리 중(PROCESSING)인 Import는 중복이 아니다. 워커가 중단된 경우 체크포인트부터 이어서 처리한다.
     Returns: True = 중복
     """
     with conn.cursor() as cur:
         cur.execute(
-            'SELECT COUNT(*) FROM "Import" WHERE "fileHash" = %s AND "status" IN (%s, %s)',
-            (file_hash, "SUCCESS", "PROCESSING"),
+            'SELECT COUNT(*) FROM "Import" WHERE "fileHash" = %s AND "status" = %s',
+            (file_hash, "SUCCESS"),
         )
         count = cur.fetchone()[0]
     return count > 0
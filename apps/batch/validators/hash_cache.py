@@ -0,0 +1,93 @@
+"""
+파일 해시 캐시
+(경로, 크기, mtime_ns, inode) → (SHA-256, 마지막 중복 확인 결과)를 워커 옆 SQLite에 보관한다.
+- 내용이 바뀌지 않은 파일은 다시 읽지 않고 해시를 재사용
+- 이미 중복으로 확인된 파일은 DB 조회 없이 바로 중복 처리
+프로세스 풀의 각 프로세스는 자기 SQLite 연결을 따로 연다.
+"""
+import logging
+import os
+import sqlite3
+import time
+from typing import NamedTuple
+
+from config import STATE_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# 이 기간 동안 갱신되지 않은 항목(아카이브로 옮겨진 파일 등)은 열 때 정리한다.
+ENTRY_TTL_SEC = 30 * 24 * 3600
+
+
+class CachedHash(NamedTuple):
+    sha256: str
+    duplicate: bool | None
+
+
+class HashCache:
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS file_hash (
+                       path TEXT PRIMARY KEY,
+                       size INTEGER NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       inode INTEGER NOT NULL,
+                       sha256 TEXT NOT NULL,
+                       duplicate INTEGER,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+            conn.execute("DELETE FROM file_hash WHERE updated_at < ?", (time.time() - ENTRY_TTL_SEC,))
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def lookup(self, file_path: str) -> CachedHash | None:
+        """파일이 마지막 기록 이후 바뀌지 않았으면 캐시된 해시를 반환한다."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+
+        row = self._connection().execute(
+            "SELECT sha256, duplicate FROM file_hash WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return CachedHash(row[0], None if row[1] is None else bool(row[1]))
+
+    def store(self, file_path: str, sha256: str, duplicate: bool | None = None):
+        """파일의 현재 상태와 해시(및 중복 확인 결과)를 기록한다."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return
+
+        conn = self._connection()
+        conn.execute(
+            """INSERT OR REPLACE INTO file_hash (path, size, mtime_ns, inode, sha256, duplicate, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino, sha256,
+                None if duplicate is None else int(duplicate), time.time(),
+            ),
+        )
+        conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
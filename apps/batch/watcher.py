@@ -0,0 +1,92 @@
+"""
+폴더 감시 모드
+EMR 내보내기 폴더를 watchdog으로 감시하여 파일이 도착하면 수 초 안에 Import를 실행한다.
+- native: OS 파일 이벤트 (Linux inotify, Windows ReadDirectoryChangesW)
+- polling: 주기적 디렉토리 스캔 (이벤트가 전달되지 않는 SMB 등 네트워크 마운트용)
+- 이벤트가 몰려도 피드별로 debounce한 뒤 한 번만 실행한다.
+고정 스케줄(BATCH_SCHEDULE_TIMES)은 누락분을 처리하는 보정 스윕으로 계속 동작한다.
+"""
+import logging
+import os
+import threading
+import time
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+
+from config import RECEIPT_MODE, WATCH_DEBOUNCE_SEC, WATCH_MODE, WATCH_POLL_INTERVAL_SEC
+
+logger = logging.getLogger("watcher")
+
+
+class DebouncedFeeds:
+    """피드별 마지막 이벤트 시각을 기록하고, 조용해진 지 debounce_sec가 지난 피드를 꺼낸다."""
+
+    def __init__(self, debounce_sec: float = WATCH_DEBOUNCE_SEC):
+        self.debounce_sec = debounce_sec
+        self._lock = threading.Lock()
+        self._last_event: dict[str, float] = {}
+
+    def touch(self, feed: str):
+        with self._lock:
+            self._last_event[feed] = time.monotonic()
+
+    def pop_due(self) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            due = [f for f, t in self._last_event.items() if now - t >= self.debounce_sec]
+            for feed in due:
+                del self._last_event[feed]
+        return due
+
+
+def is_trigger_path(path: str) -> bool:
+    """
+    Import를 깨울 파일인지 판단한다.
+    done_signal 모드에서는 .done 시그널 파일만, 그 외에는 .xlsx 파일 자체의 변경을 본다.
+    """
+    name = os.path.basename(path).lower()
+    if name.startswith("~$"):
+        return False  # 엑셀 잠금 파일
+    if RECEIPT_MODE == "done_signal":
+        return name.endswith(".xlsx.done")
+    return name.endswith(".xlsx")
+
+
+class FeedEventHandler(FileSystemEventHandler):
+    """한 피드 폴더의 생성/수정/이동 이벤트를 DebouncedFeeds에 전달한다."""
+
+    def __init__(self, feed: str, folder: str, pending: DebouncedFeeds):
+        self.feed = feed
+        self.folder = os.path.abspath(folder)
+        self.pending = pending
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = event.dest_path if event.event_type == "moved" else event.src_path
+        # 처리 후 아카이브/에러 폴더로 나가는 이동은 무시한다.
+        if os.path.dirname(os.path.abspath(path)) != self.folder:
+            return
+        if is_trigger_path(path):
+            logger.debug(f"[{self.feed}] 파일 이벤트: {event.event_type} {path}")
+            self.pending.touch(self.feed)
+
+
+def start_watching(folders: dict[str, str], pending: DebouncedFeeds):
+    """피드 폴더들에 대한 observer를 시작하고 반환한다. (호출자가 stop/join)"""
+    if WATCH_MODE == "polling":
+        observer = PollingObserver(timeout=WATCH_POLL_INTERVAL_SEC)
+    else:
+        observer = Observer()
+
+    for feed, folder in folders.items():
+        if not os.path.isdir(folder):
+            logger.warning(f"감시할 폴더가 없습니다: {folder}")
+            continue
+        observer.schedule(FeedEventHandler(feed, folder, pending), folder, recursive=False)
+        logger.info(f"폴더 감시 등록 ({WATCH_MODE}): {feed} → {folder}")
+
+    observer.start()
+    return observer
@@ -2,40 +2,69 @@
 메인 배치 워커
 EMR 엑셀 파일을 감시하고, 스케줄에 따라 Import 처리를 실행한다.
 스케줄: 10:00, 13:10, 17:00
+감시 모드(--watch / BATCH_WATCH_MODE): 파일 도착 즉시 처리, 스케줄은 보정 스윕
 """
 import glob
 import json
 import logging
 import os
 import shutil
+import socket
 import sys
 import time
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
 
-import psycopg2
 import schedule
 
+import db
 from config import (
+    ADMISSION_SYNC,
     ARCHIVE_FOLDER,
+    BATCH_CHUNK_SIZE,
     BATCH_SCHEDULE_TIMES,
-    DATABASE_URL,
+    BATCH_WORKERS,
     ERROR_FOLDER,
     FOLDERS,
+    IMPORT_QUEUE,
+    IMPORT_STALE_MINUTES,
+    PATIENT_UPSERT_MODE,
+    RECONCILE,
+    WATCH_MODE,
+)
+from importers.admission_sync import AdmissionSync
+from importers.error_sink import ImportErrorSink
+from importers.inpatient_importer import (
+    save_import_errors,
+    upsert_patients,
+    upsert_patients_bulk,
 )
-from importers.inpatient_importer import save_import_errors, upsert_patients
 from importers.outpatient_importer import (
     save_import_errors as save_outpatient_errors,
     upsert_appointments,
 )
-from parsers.inpatient_parser import parse_inpatient_file
-from parsers.outpatient_parser import parse_outpatient_file
-from validators.data_validator import validate_rows
+from importers.overlap_detector import flag_overlapping_appointments
+from importers.reconciler import reconcile_admissions, reconcile_appointments
+from job_queue import ClaimedJob, ImportQueue
+from metrics import ImportMetrics, record_results, start_metrics_server
+from parsers.inpatient_parser import iter_inpatient_rows
+from parsers.outpatient_parser import iter_outpatient_rows
+from parsers.records import InpatientRow, OutpatientRow, ParsedRow
+from snapshot_store import FeedSnapshot
+from validators.data_validator import validate_outpatient_rows, validate_rows
 from validators.file_validator import (
+    ReceiptTracker,
     check_duplicate,
     compute_sha256,
+    filter_ready_files,
     is_file_ready,
+    read_export_file,
     validate_xlsx,
 )
+from validators.hash_cache import HashCache
+from watcher import DebouncedFeeds, start_watching
 
 # 로깅 설정
 logging.basicConfig(
@@ -48,10 +77,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger("worker")
 
+# 파일 해시 캐시 (프로세스마다 자체 SQLite 연결)
+hash_cache = HashCache()
+
+# stable_size 수신 확인 상태 (감시 모드에서 실행 간에 관측 결과를 이어서 쓴다)
+receipt_tracker = ReceiptTracker()
+
+# Import 체크포인트의 처리 워커 식별자 (호스트당 워커 서비스 1개 기준)
+WORKER_HOST = socket.gethostname()
+
 
 def get_db_connection():
-    """PostgreSQL 연결을 반환한다."""
-    return psycopg2.connect(DATABASE_URL)
+    """공유 연결 풀에서 PostgreSQL 연결을 빌린다. 사용 후 release_db_connection으로 반납."""
+    return db.get_connection()
+
+
+def release_db_connection(conn):
+    db.put_connection(conn)
 
 
 def ensure_dirs():
@@ -63,9 +105,13 @@ def ensure_dirs():
 
 
 def move_to_error(file_path: str, reason: str):
-    """파일을 에러 폴더로 이동한다."""
+    """파일을 에러 폴더로 이동한다. (다른 인스턴스가 이미 옮긴 파일은 건너뜀)"""
     dest = os.path.join(ERROR_FOLDER, os.path.basename(file_path))
-    shutil.move(file_path, dest)
+    try:
+        shutil.move(file_path, dest)
+    except FileNotFoundError:
+        logger.warning(f"에러 폴더로 옮길 파일이 이미 없습니다: {file_path} (사유: {reason})")
+        return
     # done 시그널 파일도 함께 이동
     done_path = file_path + ".done"
     if os.path.exists(done_path):
@@ -74,12 +120,16 @@ def move_to_error(file_path: str, reason: str):
 
 
 def move_to_archive(file_path: str):
-    """파일을 아카이브 폴더로 이동한다."""
+    """파일을 아카이브 폴더로 이동한다. (다른 인스턴스가 이미 옮긴 파일은 건너뜀)"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     basename = os.path.basename(file_path)
     name, ext = os.path.splitext(basename)
     dest = os.path.join(ARCHIVE_FOLDER, f"{name}_{timestamp}{ext}")
-    shutil.move(file_path, dest)
+    try:
+        shutil.move(file_path, dest)
+    except FileNotFoundError:
+        logger.warning(f"아카이브할 파일이 이미 없습니다: {file_path}")
+        return
     # done 시그널 파일도 삭제
     done_path = file_path + ".done"
     if os.path.exists(done_path):
@@ -88,20 +138,133 @@ def move_to_archive(file_path: str):
 
 
 def create_import_record(conn, file_path: str, file_hash: str, file_type: str) -> str:
-    """Import 레코드를 생성하고 ID를 반환한다."""
+    """Import 레코드를 생성하고 ID를 반환한다. 처리 워커를 기록한 빈 체크포인트로 시작한다."""
     with conn.cursor() as cur:
         cur.execute(
             """INSERT INTO "Import"
-               ("id", "filePath", "fileHash", "fileType", "status", "startedAt", "createdAt")
-               VALUES (gen_random_uuid(), %s, %s, %s, 'PROCESSING', NOW(), NOW())
+               ("id", "filePath", "fileHash", "fileType", "status", "startedAt", "statsJson", "createdAt")
+               VALUES (gen_random_uuid(), %s, %s, %s, 'PROCESSING', NOW(),
+                       jsonb_build_object('checkpoint', jsonb_build_object(
+                           'rowOffset', 0, 'owner', %s::text, 'at', NOW())),
+                       NOW())
                RETURNING "id" """,
-            (file_path, file_hash, file_type),
+            (file_path, file_hash, file_type, WORKER_HOST),
         )
         import_id = cur.fetchone()[0]
     conn.commit()
     return import_id
 
 
+def save_checkpoint(conn, import_id: str, checkpoint: dict[str, Any]):
+    """
+    청크까지 처리한 위치와 누적 통계를 Import.statsJson.checkpoint에 기록한다.
+    커밋은 호출자가 청크 데이터와 같은 트랜잭션으로 수행한다 (체크포인트와 반영 데이터가 항상 일치).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """UPDATE "Import"
+               SET "statsJson" = jsonb_build_object('checkpoint',
+                       %s::jsonb || jsonb_build_object('owner', %s::text, 'at', NOW()))
+               WHERE "id" = %s""",
+            (json.dumps(checkpoint, ensure_ascii=False), WORKER_HOST, import_id),
+        )
+
+
+# 체크포인트의 마지막 갱신 시각 (체크포인트가 없는 이전 Import는 startedAt)
+_LAST_ACTIVITY = """COALESCE(("statsJson"->'checkpoint'->>'at')::timestamptz, "startedAt"::timestamptz)"""
+
+
+def find_processing_import(conn, file_hash: str) -> dict[str, Any] | None:
+    """
+    같은 해시의 PROCESSING Import를 찾는다.
+    Returns: None | {"id", "checkpoint", "resumable"}
+      resumable: 시작 시 중단으로 확인됐거나 체크포인트가 IMPORT_STALE_MINUTES 넘게 갱신되지 않음
+                 (False면 다른 워커가 처리 중)
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""SELECT "id", "statsJson"->'checkpoint',
+                       COALESCE(("statsJson"->'checkpoint'->>'interrupted')::boolean, false)
+                         OR {_LAST_ACTIVITY} < NOW() - %s * INTERVAL '1 minute'
+                FROM "Import"
+                WHERE "fileHash" = %s AND "status" = 'PROCESSING'""",
+            (IMPORT_STALE_MINUTES, file_hash),
+        )
+        row = cur.fetchone()
+    if row is None:
+        return None
+    import_id, checkpoint, resumable = row
+    return {"id": import_id, "checkpoint": checkpoint or {}, "resumable": resumable}
+
+
+def resume_import_record(conn, import_id: str, checkpoint: dict[str, Any]):
+    """중단된 Import를 이 워커가 이어받는다. (중단 표시를 지우고 처리 워커를 갱신)"""
+    checkpoint = {k: v for k, v in checkpoint.items() if k not in ("owner", "at", "interrupted")}
+    save_checkpoint(conn, import_id, checkpoint)
+    conn.commit()
+    logger.warning(f"중단된 Import 이어서 처리: {import_id} ({checkpoint.get('rowOffset', 0)}행 이후부터)")
+
+
+def start_import(conn, file_path: str, file_hash: str, file_type: str) -> tuple[str | None, dict[str, Any] | None]:
+    """
+    Import 레코드를 만들거나, 같은 파일의 중단된 Import가 있으면 이어받는다.
+    Returns: (import_id, 이어서 처리할 체크포인트 | None). 다른 워커가 처리 중이면 (None, None)
+    """
+    processing = find_processing_import(conn, file_hash)
+    if processing is None:
+        return create_import_record(conn, file_path, file_hash, file_type), None
+    if not processing["resumable"]:
+        return None, None
+    resume_import_record(conn, processing["id"], processing["checkpoint"])
+    return processing["id"], processing["checkpoint"]
+
+
+def mark_import_interrupted(conn, file_hash: str):
+    """같은 해시의 PROCESSING Import에 중단 표시를 남겨 바로 이어서 처리할 수 있게 한다."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """UPDATE "Import"
+               SET "statsJson" = jsonb_set(COALESCE("statsJson", '{}'::jsonb), '{checkpoint,interrupted}', 'true')
+               WHERE "fileHash" = %s AND "status" = 'PROCESSING'""",
+            (file_hash,),
+        )
+    conn.commit()
+
+
+def recover_interrupted_imports():
+    """
+    워커 시작 시 이전 실행에서 중단된 PROCESSING Import를 정리한다.
+    - 이 호스트가 처리하던 Import(방금 시작했으므로 처리 중일 수 없음)와 체크포인트가 오래된 Import가 대상
+    - 원본 파일이 수신 폴더에 남아 있으면 중단 표시만 남기고, 다음 배치가 체크포인트부터 이어서 처리한다
+    - 원본 파일이 없으면 이어서 처리할 수 없으므로 FAIL로 종료한다
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""SELECT "id", "filePath", "fileHash", COALESCE(("statsJson"->'checkpoint'->>'rowOffset')::int, 0)
+                    FROM "Import"
+                    WHERE "status" = 'PROCESSING'
+                      AND ("statsJson"->'checkpoint'->>'owner' = %s
+                           OR {_LAST_ACTIVITY} < NOW() - %s * INTERVAL '1 minute')""",
+                (WORKER_HOST, IMPORT_STALE_MINUTES),
+            )
+            interrupted = cur.fetchall()
+
+        for import_id, file_path, file_hash, row_offset in interrupted:
+            if os.path.exists(file_path):
+                mark_import_interrupted(conn, file_hash)
+                logger.warning(f"중단된 Import 발견: {file_path} ({row_offset}행까지 반영됨, 다음 배치에서 이어서 처리)")
+            else:
+                update_import_status(conn, import_id, "FAIL", {
+                    "error": "처리 중 워커가 중단되었고 원본 파일이 수신 폴더에 없습니다.",
+                    "rowOffset": row_offset,
+                })
+                logger.error(f"중단된 Import를 이어서 처리할 수 없음 (원본 파일 없음): {file_path}")
+    finally:
+        release_db_connection(conn)
+
+
 def update_import_status(conn, import_id: str, status: str, stats: dict | None = None):
     """Import 레코드 상태를 갱신한다."""
     stats_json = json.dumps(stats, ensure_ascii=False) if stats else None
@@ -115,211 +278,699 @@ def update_import_status(conn, import_id: str, status: str, stats: dict | None =
     conn.commit()
 
 
-def process_inpatient_file(file_path: str):
-    """입원현황 파일 하나를 처리한다."""
+def iter_chunks(rows: Iterable[ParsedRow], size: int) -> Iterator[list[ParsedRow]]:
+    """행 스트림을 size 크기의 청크로 나눈다. 마지막 청크는 더 작을 수 있다."""
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def run_chunked_import(
+    conn,
+    import_id: str,
+    rows: Iterable[ParsedRow],
+    import_chunk: Callable[..., tuple[dict[str, int], int]],
+    error_sink: ImportErrorSink,
+    metrics: ImportMetrics,
+    checkpoint: dict[str, Any] | None = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> dict[str, Any]:
+    """
+    파싱 → 검증 → upsert를 고정 크기 청크 단위로 끝까지 처리하고 청크마다 커밋한다.
+    파서가 제너레이터이므로 메모리는 청크 크기만큼만 사용하며,
+    앞쪽 청크는 파일의 나머지를 읽는 동안 이미 DB에 반영된다.
+    청크마다 처리 위치(rowOffset)와 누적 통계를 같은 트랜잭션으로 체크포인트에 남긴다.
+    파서가 행을 만드는 시간(parse)과 청크 커밋 시간(commit)은 metrics에 기록한다.
+    import_chunk(chunk, replay=False) → (upsert 통계, 오류 행 수)
+      replay=True: 체크포인트 이전의 이미 커밋된 행. DB에 쓰지 않고 파일 내 중복 검사·대사 키 등
+                   로컬 상태만 다시 쌓는다.
+    """
+    stats: dict[str, Any] = {"created": 0, "updated": 0, "conflicts": 0, "skipped": 0}
+    total_rows = 0
+    error_rows = 0
+    chunk_no = 0
+    it = metrics.timed_iter("parse", rows)
+
+    resume_offset = (checkpoint or {}).get("rowOffset", 0)
+    if resume_offset:
+        for chunk in iter_chunks(islice(it, resume_offset), chunk_size):
+            import_chunk(chunk, replay=True)
+        stats.update(checkpoint.get("stats", {}))
+        error_sink.restore(checkpoint.get("errorSink", {}))
+        total_rows = resume_offset
+        error_rows = checkpoint.get("errorRows", 0)
+        chunk_no = checkpoint.get("chunks", 0)
+        logger.info(f"체크포인트 복원: {resume_offset}행 건너뜀 (청크 {chunk_no}까지 커밋됨)")
+
+    for chunk in iter_chunks(it, chunk_size):
+        chunk_no += 1
+        chunk_stats, chunk_errors = import_chunk(chunk)
+
+        for key, value in chunk_stats.items():
+            stats[key] = stats.get(key, 0) + value
+        total_rows += len(chunk)
+        error_rows += chunk_errors
+
+        with metrics.stage("commit"):
+            save_checkpoint(conn, import_id, {
+                "rowOffset": total_rows,
+                "chunks": chunk_no,
+                "errorRows": error_rows,
+                "stats": stats,
+                "errorSink": error_sink.state(),
+            })
+            conn.commit()
+        logger.info(f"청크 {chunk_no} 커밋: {len(chunk)}행 (누적 {total_rows}행)")
+
+    stats["totalRows"] = total_rows
+    stats["errorRows"] = error_rows
+    if resume_offset:
+        stats["resumedFromRow"] = resume_offset
+    return stats
+
+
+def file_exported_at(file_path: str) -> datetime:
+    """
+    EMR이 파일을 내보낸 시각 (파일 수정 시각). 이후에 앱에서 만든 레코드는 대사 대상에서 제외한다.
+    Prisma createdAt(UTC)과 비교하므로 UTC aware datetime으로 반환한다.
+    """
+    return datetime.fromtimestamp(os.path.getmtime(file_path), tz=timezone.utc)
+
+
+def claim_file(file_path: str, file_hash: str) -> tuple[db.AdvisoryLock | None, str | None]:
+    """
+    파일 해시로 advisory lock을 잡아 이 인스턴스가 파일을 처리하도록 점유한다.
+    같은 폴더를 공유하는 다른 인스턴스와 같은 파일을 동시에 검증·이동·Import 생성하지 않게 한다.
+    Returns: (잠금, None) | (None, "IN_PROGRESS": 다른 인스턴스가 처리 중 / "GONE": 점유 사이에 파일이 옮겨짐)
+    """
+    file_lock = db.AdvisoryLock(f"file:{file_hash}")
+    if not file_lock.try_acquire():
+        logger.info(f"다른 인스턴스가 처리 중인 파일, 건너뜀: {file_path}")
+        return None, "IN_PROGRESS"
+    if not os.path.exists(file_path):
+        file_lock.release()
+        logger.info(f"다른 인스턴스가 이미 처리해 옮긴 파일, 건너뜀: {file_path}")
+        return None, "GONE"
+    return file_lock, None
+
+
+def check_cached_duplicate(conn, file_path: str) -> bool:
+    """
+    해시 캐시에 있는(바뀌지 않은) 파일이면 다시 읽지 않고 캐시된 해시로 중복 여부를 확인한다.
+    이미 중복으로 확인된 파일은 DB도 조회하지 않는다.
+    """
+    cached = hash_cache.lookup(file_path)
+    if cached is None:
+        return False
+    if cached.duplicate:
+        return True
+
+    duplicate = check_duplicate(cached.sha256, conn)
+    if duplicate:
+        hash_cache.store(file_path, cached.sha256, duplicate=True)
+    return duplicate
+
+
+def file_result(file_path: str, feed: str, status: str, stats: dict | None = None) -> dict[str, Any]:
+    """파일 1건의 처리 결과. 배치 실행 요약에 모인다."""
+    return {"file": os.path.basename(file_path), "feed": feed, "status": status, "stats": stats or {}}
+
+
+def process_inpatient_file(file_path: str, receipt_checked: bool = False) -> dict[str, Any]:
+    """
+    입원현황 파일 하나를 처리하고 결과를 반환한다.
+    receipt_checked: 배치에서 filter_ready_files로 이미 수신 확인을 마친 경우 True
+    """
     logger.info(f"=== 입원현황 처리 시작: {file_path} ===")
+    metrics = ImportMetrics()
 
     # 1. 파일 수신 확인
-    if not is_file_ready(file_path):
+    with metrics.stage("receipt"):
+        ready = receipt_checked or is_file_ready(file_path)
+    if not ready:
         logger.info(f"파일 수신 미완료, 건너뜀: {file_path}")
-        return
-
-    # 2. XLSX 무결성 검사
-    valid, err_msg = validate_xlsx(file_path)
-    if not valid:
-        move_to_error(file_path, err_msg)
-        return
+        return file_result(file_path, "INPATIENT", "NOT_READY")
 
-    # 3. SHA-256 중복 체크
-    file_hash = compute_sha256(file_path)
     conn = get_db_connection()
+    file_lock = None
     try:
-        if check_duplicate(file_hash, conn):
+        # 2. 해시 캐시로 중복 확인 (바뀌지 않은 파일은 다시 읽지 않음)
+        with metrics.stage("hashCheck"):
+            cached_duplicate = check_cached_duplicate(conn, file_path)
+        if cached_duplicate:
+            logger.warning(f"이미 처리된 파일 (중복, 해시 캐시): {file_path}")
+            move_to_archive(file_path)
+            return file_result(file_path, "INPATIENT", "DUPLICATE")
+
+        # 3. 파일 1회 읽기 (SHA-256 동시 계산) → 해시로 파일 점유 → XLSX 무결성 검사
+        try:
+            with metrics.stage("read"):
+                export = read_export_file(file_path)
+        except FileNotFoundError:
+            logger.info(f"다른 인스턴스가 이미 처리해 옮긴 파일, 건너뜀: {file_path}")
+            return file_result(file_path, "INPATIENT", "GONE")
+        with metrics.stage("claim"):
+            file_lock, skipped = claim_file(file_path, export.sha256)
+        if file_lock is None:
+            return file_result(file_path, "INPATIENT", skipped)
+
+        with metrics.stage("fileCheck"):
+            valid, err_msg = validate_xlsx(export)
+        if not valid:
+            move_to_error(file_path, err_msg)
+            return file_result(file_path, "INPATIENT", "INVALID", {"error": err_msg})
+
+        # 4. SHA-256 중복 체크
+        file_hash = export.sha256
+        with metrics.stage("fileCheck"):
+            duplicate = check_duplicate(file_hash, conn)
+            hash_cache.store(file_path, file_hash, duplicate)
+        if duplicate:
             logger.warning(f"이미 처리된 파일 (중복): {file_path}")
             move_to_archive(file_path)
-            return
+            return file_result(file_path, "INPATIENT", "DUPLICATE")
 
-        # 4. Import 레코드 생성
-        import_id = create_import_record(conn, file_path, file_hash, "INPATIENT")
+        # 5. Import 레코드 생성 (중단된 같은 파일의 Import가 있으면 체크포인트부터 이어서 처리)
+        import_id, checkpoint = start_import(conn, file_path, file_hash, "INPATIENT")
+        if import_id is None:
+            logger.warning(f"다른 워커가 처리 중인 파일, 건너뜀: {file_path}")
+            return file_result(file_path, "INPATIENT", "IN_PROGRESS")
 
         try:
-            # 5. 엑셀 파싱
-            rows = parse_inpatient_file(file_path)
-
-            if not rows:
+            # 6~9. 파싱 → 검증 → 오류 기록 → 스냅샷 비교 → Patient upsert → 입원/병상 동기화 (청크 단위)
+            snapshot = FeedSnapshot(conn, "INPATIENT", "emrPatientId")
+            seen_ids: set[str] = set()
+            file_keys: set[str] = set()  # 오류 행 포함, 파일에 있는 모든 환자번호 (대사용)
+            error_sink = ImportErrorSink(import_id)
+            header_stats: dict[str, Any] = {}  # 헤더 행·레이아웃 지문 (파서가 채움)
+            upsert = upsert_patients_bulk if PATIENT_UPSERT_MODE == "bulk" else upsert_patients
+            admission_sync = AdmissionSync(conn) if ADMISSION_SYNC == "on" else None
+
+            def import_chunk(chunk: list[InpatientRow], replay: bool = False) -> tuple[dict[str, int], int]:
+                file_keys.update(r.emrPatientId for r in chunk if r.emrPatientId)
+                with metrics.stage("validate"):
+                    valid_rows, error_rows = validate_rows(chunk, seen_ids)
+                if admission_sync is not None:
+                    admission_sync.claim_beds(valid_rows)
+                with metrics.stage("snapshot"):
+                    changed_rows = snapshot.filter(valid_rows)
+                if replay:
+                    return {}, len(error_rows)
+                if error_rows:
+                    with metrics.stage("errors"):
+                        save_import_errors(conn, import_id, error_rows, error_sink)
+                with metrics.stage("upsert"):
+                    chunk_stats = upsert(conn, changed_rows, import_id)
+                if admission_sync is not None:
+                    with metrics.stage("admissionSync"):
+                        chunk_stats.update(admission_sync.sync(conn, changed_rows, snapshot.unwritten))
+                chunk_stats["keylessRows"] = sum(1 for r in chunk if not r.emrPatientId)
+                return chunk_stats, len(error_rows)
+
+            stats = run_chunked_import(
+                conn, import_id, iter_inpatient_rows(export.open(), header_stats), import_chunk, error_sink, metrics, checkpoint,
+            )
+            stats.update(error_sink.stats())
+            stats.update(snapshot.stats())
+            stats.update(header_stats)
+
+            if stats["totalRows"] == 0:
                 update_import_status(conn, import_id, "SUCCESS", {"total": 0, "message": "데이터 없음"})
                 move_to_archive(file_path)
-                return
-
-            # 6. 데이터 검증
-            valid_rows, error_rows = validate_rows(rows)
+                return file_result(file_path, "INPATIENT", "SUCCESS", stats)
 
-            # 7. 오류 행 기록
-            if error_rows:
-                save_import_errors(conn, import_id, error_rows)
-
-            # 8. Patient upsert
-            stats = upsert_patients(conn, valid_rows, import_id)
-            stats["totalRows"] = len(rows)
-            stats["errorRows"] = len(error_rows)
-
-            # 9. 상태 갱신
-            final_status = "SUCCESS" if not error_rows else "SUCCESS"
-            if len(error_rows) == len(rows):
+            final_status = "SUCCESS"
+            if stats["errorRows"] == stats["totalRows"]:
                 final_status = "FAIL"
 
+            # 10. 대사: 센서스에서 빠진 환자 퇴원 처리 (상태 갱신과 같은 트랜잭션)
+            if final_status == "SUCCESS" and RECONCILE == "on":
+                if stats["keylessRows"]:
+                    logger.warning(f"환자번호 없는 행 {stats['keylessRows']}건이 있어 입원 대사를 건너뜀")
+                else:
+                    with metrics.stage("reconcile"):
+                        stats.update(reconcile_admissions(conn, file_keys, file_exported_at(file_path)))
+
+            # 11. 상태 갱신 (단계별 소요 시간·처리량은 statsJson.metrics)
+            stats["metrics"] = metrics.summary(stats["totalRows"])
             update_import_status(conn, import_id, final_status, stats)
+            # 이어서 처리한 Import는 앞 청크에서 반영하지 못한 행을 알 수 없으므로 스냅샷을 저장하지 않는다 (다음 실행은 전체 갱신)
+            if final_status == "SUCCESS" and checkpoint is None:
+                snapshot.save(import_id)
             move_to_archive(file_path)
 
             logger.info(f"=== 입원현황 처리 완료: {file_path} (결과: {final_status}) ===")
+            return file_result(file_path, "INPATIENT", final_status, stats)
 
         except Exception as e:
             logger.exception(f"Import 처리 중 오류: {e}")
+            conn.rollback()
             update_import_status(conn, import_id, "FAIL", {"error": str(e)})
             move_to_error(file_path, str(e))
+            return file_result(file_path, "INPATIENT", "FAIL", {"error": str(e)})
 
     finally:
-        conn.close()
+        if file_lock is not None:
+            file_lock.release()
+        release_db_connection(conn)
 
 
-def run_inpatient_batch():
-    """입원현황 폴더의 모든 엑셀 파일을 처리한다."""
+def run_inpatient_batch() -> list[dict[str, Any]]:
+    """
+    입원현황 폴더의 모든 엑셀 파일을 이름순으로 하나씩 처리하고 결과 목록을 반환한다.
+    같은 피드 안에서는 순서가 중요하므로 항상 직렬로 처리한다.
+    """
     logger.info("========== 입원현황 배치 시작 ==========")
     folder = FOLDERS["INPATIENT"]
 
     if not os.path.exists(folder):
         logger.warning(f"입원현황 폴더가 없습니다: {folder}")
-        return
+        return []
 
     files = sorted(glob.glob(os.path.join(folder, "*.xlsx")))
     if not files:
         logger.info("처리할 파일이 없습니다.")
-        return
+        return []
 
     logger.info(f"대상 파일: {len(files)}개")
+    ready = set(filter_ready_files(files, receipt_tracker))
+    results = []
     for file_path in files:
+        if file_path not in ready:
+            logger.info(f"파일 수신 미완료, 건너뜀: {file_path}")
+            results.append(file_result(file_path, "INPATIENT", "NOT_READY"))
+            continue
         try:
-            process_inpatient_file(file_path)
+            results.append(process_inpatient_file(file_path, receipt_checked=True))
         except Exception as e:
             logger.exception(f"파일 처리 실패: {file_path} - {e}")
+            results.append(file_result(file_path, "INPATIENT", "ERROR", {"error": str(e)}))
 
+    logger.info(f"해시 캐시: {hash_cache.stats()}, DB 연결 풀: {db.db_pool.stats()}")
     logger.info("========== 입원현황 배치 종료 ==========")
+    return results
 
 
-def process_outpatient_file(file_path: str):
-    """외래예약 파일 하나를 처리한다."""
+def process_outpatient_file(file_path: str, receipt_checked: bool = False) -> dict[str, Any]:
+    """
+    외래예약 파일 하나를 처리하고 결과를 반환한다.
+    receipt_checked: 배치에서 filter_ready_files로 이미 수신 확인을 마친 경우 True
+    """
     logger.info(f"=== 외래예약 처리 시작: {file_path} ===")
+    metrics = ImportMetrics()
 
     # 1. 파일 수신 확인
-    if not is_file_ready(file_path):
+    with metrics.stage("receipt"):
+        ready = receipt_checked or is_file_ready(file_path)
+    if not ready:
         logger.info(f"파일 수신 미완료, 건너뜀: {file_path}")
-        return
-
-    # 2. XLSX 무결성 검사
-    valid, err_msg = validate_xlsx(file_path)
-    if not valid:
-        move_to_error(file_path, err_msg)
-        return
+        return file_result(file_path, "OUTPATIENT", "NOT_READY")
 
-    # 3. SHA-256 중복 체크
-    file_hash = compute_sha256(file_path)
     conn = get_db_connection()
+    file_lock = None
     try:
-        if check_duplicate(file_hash, conn):
+        # 2. 해시 캐시로 중복 확인 (바뀌지 않은 파일은 다시 읽지 않음)
+        with metrics.stage("hashCheck"):
+            cached_duplicate = check_cached_duplicate(conn, file_path)
+        if cached_duplicate:
+            logger.warning(f"이미 처리된 파일 (중복, 해시 캐시): {file_path}")
+            move_to_archive(file_path)
+            return file_result(file_path, "OUTPATIENT", "DUPLICATE")
+
+        # 3. 파일 1회 읽기 (SHA-256 동시 계산) → 해시로 파일 점유 → XLSX 무결성 검사
+        try:
+            with metrics.stage("read"):
+                export = read_export_file(file_path)
+        except FileNotFoundError:
+            logger.info(f"다른 인스턴스가 이미 처리해 옮긴 파일, 건너뜀: {file_path}")
+            return file_result(file_path, "OUTPATIENT", "GONE")
+        with metrics.stage("claim"):
+            file_lock, skipped = claim_file(file_path, export.sha256)
+        if file_lock is None:
+            return file_result(file_path, "OUTPATIENT", skipped)
+
+        with metrics.stage("fileCheck"):
+            valid, err_msg = validate_xlsx(export)
+        if not valid:
+            move_to_error(file_path, err_msg)
+            return file_result(file_path, "OUTPATIENT", "INVALID", {"error": err_msg})
+
+        # 4. SHA-256 중복 체크
+        file_hash = export.sha256
+        with metrics.stage("fileCheck"):
+            duplicate = check_duplicate(file_hash, conn)
+            hash_cache.store(file_path, file_hash, duplicate)
+        if duplicate:
             logger.warning(f"이미 처리된 파일 (중복): {file_path}")
             move_to_archive(file_path)
-            return
+            return file_result(file_path, "OUTPATIENT", "DUPLICATE")
 
-        # 4. Import 레코드 생성
-        import_id = create_import_record(conn, file_path, file_hash, "OUTPATIENT")
+        # 5. Import 레코드 생성 (중단된 같은 파일의 Import가 있으면 체크포인트부터 이어서 처리)
+        import_id, checkpoint = start_import(conn, file_path, file_hash, "OUTPATIENT")
+        if import_id is None:
+            logger.warning(f"다른 워커가 처리 중인 파일, 건너뜀: {file_path}")
+            return file_result(file_path, "OUTPATIENT", "IN_PROGRESS")
 
         try:
-            # 5. 엑셀 파싱
-            rows = parse_outpatient_file(file_path)
-
-            if not rows:
+            # 6~9. 파싱 → 검증 → 오류 기록 → 스냅샷 비교 → Appointment upsert (청크 단위)
+            snapshot = FeedSnapshot(conn, "OUTPATIENT", "emrAppointmentId")
+            seen_appointment_ids: set[str] = set()
+            file_keys: set[str] = set()   # 오류 행 포함, 파일에 있는 모든 EMR예약ID (대사용)
+            file_dates: set[str] = set()  # 파일이 다루는 예약일 (대사·중복 예약 검사 범위)
+            error_sink = ImportErrorSink(import_id)
+            header_stats: dict[str, Any] = {}  # 헤더 행·레이아웃 지문 (파서가 채움)
+
+            def import_chunk(chunk: list[OutpatientRow], replay: bool = False) -> tuple[dict[str, int], int]:
+                file_keys.update(r.emrAppointmentId for r in chunk if r.emrAppointmentId)
+                with metrics.stage("validate"):
+                    valid_rows, error_rows = validate_outpatient_rows(chunk, seen_appointment_ids)
+                file_dates.update(r.appointmentDate for r in valid_rows)
+                with metrics.stage("snapshot"):
+                    changed_rows = snapshot.filter(valid_rows)
+                if replay:
+                    return {}, len(error_rows)
+                if error_rows:
+                    with metrics.stage("errors"):
+                        save_outpatient_errors(conn, import_id, error_rows, error_sink)
+                with metrics.stage("upsert"):
+                    return upsert_appointments(conn, changed_rows, import_id, snapshot.unwritten), len(error_rows)
+
+            stats = run_chunked_import(
+                conn, import_id, iter_outpatient_rows(export.open(), header_stats), import_chunk, error_sink, metrics, checkpoint,
+            )
+            stats.update(error_sink.stats())
+            stats.update(snapshot.stats())
+            stats.update(header_stats)
+
+            if stats["totalRows"] == 0:
                 update_import_status(conn, import_id, "SUCCESS", {"total": 0, "message": "데이터 없음"})
                 move_to_archive(file_path)
-                return
-
-            # 6. 오류 행과 정상 행 분리
-            error_rows = [r for r in rows if "_error" in r]
-            valid_rows = [r for r in rows if "_error" not in r]
-
-            # 7. 오류 행 기록
-            if error_rows:
-                save_outpatient_errors(conn, import_id, error_rows)
-
-            # 8. Appointment upsert
-            stats = upsert_appointments(conn, valid_rows, import_id)
-            stats["totalRows"] = len(rows)
-            stats["errorRows"] = len(error_rows)
+                return file_result(file_path, "OUTPATIENT", "SUCCESS", stats)
 
-            # 9. 상태 갱신
             final_status = "SUCCESS"
-            if len(error_rows) == len(rows):
+            if stats["errorRows"] == stats["totalRows"]:
                 final_status = "FAIL"
 
+            # 10. 대사: 파일의 예약일 범위에서 export에 없는 EMR 예약 취소 (상태 갱신과 같은 트랜잭션)
+            if final_status == "SUCCESS" and RECONCILE == "on" and file_dates:
+                with metrics.stage("reconcile"):
+                    stats.update(reconcile_appointments(
+                        conn, file_keys, min(file_dates), max(file_dates), file_exported_at(file_path),
+                    ))
+
+            # 11. 같은 의사/진료실의 시간 겹침 예약에 충돌 플래그
+            if final_status == "SUCCESS":
+                with metrics.stage("overlaps"):
+                    stats.update(flag_overlapping_appointments(conn, file_dates))
+
+            # 12. 상태 갱신 (단계별 소요 시간·처리량은 statsJson.metrics)
+            stats["metrics"] = metrics.summary(stats["totalRows"])
             update_import_status(conn, import_id, final_status, stats)
+            # 이어서 처리한 Import는 앞 청크에서 반영하지 못한 행을 알 수 없으므로 스냅샷을 저장하지 않는다 (다음 실행은 전체 갱신)
+            if final_status == "SUCCESS" and checkpoint is None:
+                snapshot.save(import_id)
             move_to_archive(file_path)
 
             logger.info(f"=== 외래예약 처리 완료: {file_path} (결과: {final_status}) ===")
+            return file_result(file_path, "OUTPATIENT", final_status, stats)
 
         except Exception as e:
             logger.exception(f"외래예약 Import 처리 중 오류: {e}")
+            conn.rollback()
             update_import_status(conn, import_id, "FAIL", {"error": str(e)})
             move_to_error(file_path, str(e))
+            return file_result(file_path, "OUTPATIENT", "FAIL", {"error": str(e)})
 
     finally:
-        conn.close()
+        if file_lock is not None:
+            file_lock.release()
+        release_db_connection(conn)
 
 
-def run_outpatient_batch():
-    """외래예약 폴더의 모든 엑셀 파일을 처리한다."""
+def run_outpatient_batch() -> list[dict[str, Any]]:
+    """
+    외래예약 폴더의 모든 엑셀 파일을 이름순으로 하나씩 처리하고 결과 목록을 반환한다.
+    같은 피드 안에서는 순서가 중요하므로 항상 직렬로 처리한다.
+    """
     logger.info("========== 외래예약 배치 시작 ==========")
     folder = FOLDERS["OUTPATIENT"]
 
     if not os.path.exists(folder):
         logger.warning(f"외래예약 폴더가 없습니다: {folder}")
-        return
+        return []
 
     files = sorted(glob.glob(os.path.join(folder, "*.xlsx")))
     if not files:
         logger.info("처리할 외래예약 파일이 없습니다.")
-        return
+        return []
 
     logger.info(f"대상 파일: {len(files)}개")
+    ready = set(filter_ready_files(files, receipt_tracker))
+    results = []
     for file_path in files:
+        if file_path not in ready:
+            logger.info(f"파일 수신 미완료, 건너뜀: {file_path}")
+            results.append(file_result(file_path, "OUTPATIENT", "NOT_READY"))
+            continue
         try:
-            process_outpatient_file(file_path)
+            results.append(process_outpatient_file(file_path, receipt_checked=True))
         except Exception as e:
             logger.exception(f"외래예약 파일 처리 실패: {file_path} - {e}")
+            results.append(file_result(file_path, "OUTPATIENT", "ERROR", {"error": str(e)}))
 
+    logger.info(f"해시 캐시: {hash_cache.stats()}, DB 연결 풀: {db.db_pool.stats()}")
     logger.info("========== 외래예약 배치 종료 ==========")
+    return results
+
+
+FEED_BATCHES: dict[str, Callable[[], list[dict[str, Any]]]] = {
+    "INPATIENT": run_inpatient_batch,
+    "OUTPATIENT": run_outpatient_batch,
+}
+
+
+def run_feed_batch(feed: str) -> list[dict[str, Any]]:
+    """
+    피드 하나의 배치를 실행한다. (프로세스 풀 작업 단위, 자체 DB 연결 사용)
+    여러 워커 인스턴스가 같은 폴더를 공유하면 피드 잠금을 잡은 인스턴스 하나만 실행한다.
+    피드 안의 파일은 순서대로 반영해야 하므로 인스턴스들은 피드 단위로 나눠 처리하고,
+    잠금을 쥔 인스턴스가 죽으면 다음 실행에서 다른 인스턴스가 이어받는다.
+    """
+    feed_lock = db.AdvisoryLock(f"feed:{feed}")
+    if not feed_lock.try_acquire():
+        logger.info(f"{feed} 배치: 다른 인스턴스가 실행 중이므로 건너뜀")
+        return []
+    try:
+        return FEED_BATCHES[feed]()
+    finally:
+        feed_lock.release()
+
+
+def summarize_results(results: list[dict[str, Any]], elapsed_sec: float) -> dict[str, Any]:
+    """파일별 결과를 피드·상태별 건수와 총 행 수로 요약한다."""
+    feeds: dict[str, dict[str, int]] = {}
+    total_rows = 0
+    for r in results:
+        counts = feeds.setdefault(r["feed"], {"files": 0})
+        counts["files"] += 1
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+        total_rows += r["stats"].get("totalRows", 0)
+    return {"files": len(results), "totalRows": total_rows, "elapsedSec": round(elapsed_sec, 2), "feeds": feeds}
+
+
+def run_all_feeds() -> dict[str, Any]:
+    """
+    모든 피드의 배치를 실행하고 실행 요약을 반환한다.
+    BATCH_WORKERS > 1이면 피드별로 별도 프로세스에서 동시에 처리한다.
+    피드 내부 파일은 각 프로세스에서 순서대로 처리되므로 오래된 스냅샷이 먼저 반영된다.
+    """
+    started = time.monotonic()
+    feeds = list(FEED_BATCHES)
+    results: list[dict[str, Any]] = []
+
+    if BATCH_WORKERS <= 1:
+        for feed in feeds:
+            results.extend(run_feed_batch(feed))
+    else:
+        with ProcessPoolExecutor(max_workers=min(BATCH_WORKERS, len(feeds))) as pool:
+            futures = {pool.submit(run_feed_batch, feed): feed for feed in feeds}
+            for future in as_completed(futures):
+                feed = futures[future]
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    logger.exception(f"{feed} 배치 프로세스 실패: {e}")
+
+    record_results(results)
+    summary = summarize_results(results, time.monotonic() - started)
+    logger.info(f"배치 실행 요약: {json.dumps(summary, ensure_ascii=False)}")
+    return summary
+
+
+FEED_PROCESSORS: dict[str, Callable[..., dict[str, Any]]] = {
+    "INPATIENT": process_inpatient_file,
+    "OUTPATIENT": process_outpatient_file,
+}
+
+# 작업 큐 (BATCH_IMPORT_QUEUE=on일 때만 연결)
+import_queue: ImportQueue | None = None
+
+
+def get_import_queue() -> ImportQueue:
+    global import_queue
+    if import_queue is None:
+        import_queue = ImportQueue()
+    return import_queue
+
+
+def enqueue_feed_files(feed: str) -> int:
+    """
+    피드 폴더에서 수신이 완료된 파일을 이름순으로 작업 큐에 넣는다. (스캐너)
+    해시는 해시 캐시로 구하므로 바뀌지 않은 파일은 다시 읽지 않는다.
+    Returns: 새로 넣은 작업 수
+    """
+    folder = FOLDERS[feed]
+    files = sorted(glob.glob(os.path.join(folder, "*.xlsx")))
+    if not files:
+        return 0
+
+    queue = get_import_queue()
+    added = 0
+    for file_path in filter_ready_files(files, receipt_tracker):
+        cached = hash_cache.lookup(file_path)
+        if cached is not None:
+            file_hash = cached.sha256
+        else:
+            file_hash = compute_sha256(file_path)
+            hash_cache.store(file_path, file_hash)
+        if queue.enqueue(feed, file_path, file_hash):
+            added += 1
+            logger.info(f"작업 큐 등록: [{feed}] {file_path}")
+    return added
+
+
+def enqueue_all_feeds() -> dict[str, Any]:
+    """모든 피드의 수신 완료 파일을 작업 큐에 넣는다. (큐 모드의 스케줄 실행 단위)"""
+    added = {feed: enqueue_feed_files(feed) for feed in FEED_BATCHES}
+    logger.info(f"작업 큐 등록 요약: {added}, 큐 상태: {get_import_queue().stats(list(FEED_BATCHES))}")
+    return added
+
+
+def handle_job(queue: ImportQueue, claimed: ClaimedJob):
+    """
+    큐에서 가져온 파일 1건을 처리하고 ack/fail한다.
+    - 파일이 이미 없으면(다른 컨슈머가 처리해 옮김) 완료 처리
+    - 처리 함수 밖으로 나온 예외(DB 연결 실패 등)와 IN_PROGRESS는 백오프 후 재시도
+    - 그 외 결과(SUCCESS/FAIL/INVALID/DUPLICATE)는 파일이 이미 아카이브·에러 폴더로 옮겨졌으므로 완료 처리
+    """
+    job = claimed.job
+    file_path = job["path"]
+    if not os.path.exists(file_path):
+        logger.info(f"파일이 이미 옮겨져 작업 완료 처리: {file_path}")
+        queue.ack(claimed)
+        return
+
+    try:
+        # 다시 가져온 작업은 이전 컨슈머가 리스를 잃은 것이므로 남은 PROCESSING Import를 바로 이어받는다.
+        if claimed.attempts > 1:
+            conn = get_db_connection()
+            try:
+                mark_import_interrupted(conn, job["hash"])
+            finally:
+                release_db_connection(conn)
+        result = FEED_PROCESSORS[job["feed"]](file_path, receipt_checked=True)
+    except Exception as e:
+        logger.exception(f"작업 처리 실패: {file_path} - {e}")
+        queue.fail(claimed, str(e))
+        return
+
+    record_results([result])
+    if result["status"] == "IN_PROGRESS":
+        queue.fail(claimed, "다른 워커가 처리 중")
+    else:
+        queue.ack(claimed)
+
+
+def run_queue_consumer(poll_interval_sec: float = 1.0):
+    """
+    작업 큐 컨슈머 루프 (--consume). 피드를 돌아가며 리스를 잡을 수 있는 피드의 맨 앞 작업을 처리한다.
+    처리량이 더 필요하면 컨슈머 프로세스를 더 띄운다 (같은 피드는 항상 한 컨슈머만 처리).
+    """
+    queue = get_import_queue()
+    feeds = list(FEED_PROCESSORS)
+    logger.info(f"작업 큐 컨슈머 시작 (피드: {', '.join(feeds)})")
+    while True:
+        handled = False
+        for feed in feeds:
+            claimed = queue.claim(feed)
+            if claimed is None:
+                continue
+            logger.info(f"작업 시작: [{feed}] {claimed.job['path']} (시도 {claimed.attempts}회)")
+            handle_job(queue, claimed)
+            handled = True
+        if not handled:
+            time.sleep(poll_interval_sec)
 
 
 def main():
-    """메인 엔트리포인트. 스케줄러를 실행한다."""
-    logger.info("서울온케어 배치 워커 시작")
+    """
+    메인 엔트리포인트. 스케줄러를 실행한다.
+    감시 모드(BATCH_WATCH_MODE 또는 --watch)에서는 파일 도착 시 해당 피드를 즉시 처리하고,
+    고정 스케줄은 누락분을 처리하는 보정 스윕으로 남는다.
+    작업 큐 모드(BATCH_IMPORT_QUEUE=on)에서는 이 프로세스가 스캐너가 되어 파일을 큐에 넣기만 하고,
+    처리는 --consume으로 띄운 컨슈머 프로세스들이 맡는다.
+    """
+    if "--consume" in sys.argv:
+        ensure_dirs()
+        start_metrics_server()
+        run_queue_consumer()
+        return
+
+    logger.info(f"서울온케어 배치 워커 시작 (동시 처리 프로세스: {BATCH_WORKERS})")
     ensure_dirs()
+    start_metrics_server()
+    recover_interrupted_imports()
+
+    queue_mode = IMPORT_QUEUE == "on"
+    run_scheduled = enqueue_all_feeds if queue_mode else run_all_feeds
 
     # 스케줄 등록
     for time_str in BATCH_SCHEDULE_TIMES:
-        schedule.every().day.at(time_str).do(run_inpatient_batch)
-        schedule.every().day.at(time_str).do(run_outpatient_batch)
-        logger.info(f"스케줄 등록: 매일 {time_str} (입원현황 + 외래예약)")
+        schedule.every().day.at(time_str).do(run_scheduled)
+        logger.info(f"스케줄 등록: 매일 {time_str} (입원현황 + 외래예약{', 작업 큐 등록' if queue_mode else ''})")
+
+    # 폴더 감시 시작
+    observer = None
+    pending = DebouncedFeeds()
+    if WATCH_MODE != "off" or "--watch" in sys.argv:
+        observer = start_watching({feed: FOLDERS[feed] for feed in FEED_BATCHES}, pending)
 
     # 시작 시 즉시 1회 실행 (개발 편의)
     if "--run-now" in sys.argv:
         logger.info("즉시 실행 모드 (--run-now)")
-        run_inpatient_batch()
-        run_outpatient_batch()
+        run_scheduled()
 
-    # 스케줄 루프
+    # 스케줄 루프 (감시 이벤트와 스케줄 실행이 같은 스레드에서 순서대로 처리된다)
     logger.info("스케줄러 대기 중...")
-    while True:
-        schedule.run_pending()
-        time.sleep(30)
+    try:
+        while True:
+            schedule.run_pending()
+            for feed in pending.pop_due():
+                if queue_mode:
+                    logger.info(f"파일 도착 감지 → {feed} 작업 큐 등록")
+                    enqueue_feed_files(feed)
+                    continue
+                logger.info(f"파일 도착 감지 → {feed} 배치 실행")
+                started = time.monotonic()
+                results = run_feed_batch(feed)
+                record_results(results)
+                summary = summarize_results(results, time.monotonic() - started)
+                logger.info(f"배치 실행 요약: {json.dumps(summary, ensure_ascii=False)}")
+            time.sleep(1 if observer else 30)
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()
 
 
 if __name__ == "__main__":